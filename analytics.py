@@ -0,0 +1,217 @@
+# analytics.py - Resumen de métricas de todas las cuentas de un usuario calculado en forma vectorizada
+
+import datetime
+import math
+
+from sqlalchemy import text
+
+try:
+    import numpy as np
+except ImportError:  # numpy está en requirements.txt; sin él se usan listas de Python (mismo resultado, más lento)
+    np = None
+
+METRICS = ('sales', 'orders', 'views', 'questions')
+WINDOW = 7
+# Días previos al rango que se cargan para que el promedio móvil y el crecimiento
+# semana contra semana del primer día tengan ventanas completas
+LOOKBACK_DAYS = 2 * WINDOW - 1
+# Rango máximo de un resumen (acota la memoria: cuentas × días × métricas)
+MAX_DAYS = 366 * 3
+
+ENGINE = 'numpy' if np is not None else 'python'
+
+
+class MetricsFrame:
+    """
+    Métricas diarias en columnas: una matriz cuentas × días por métrica
+    (ceros donde la cuenta no tiene fila ese día).
+    """
+
+    __slots__ = ('accounts', 'start', 'days', 'values')
+
+    def __init__(self, accounts, start, days):
+        self.accounts = accounts  # [(id, nickname, alias)] en el orden de las filas
+        self.start = start
+        self.days = days
+        self.values = {metric: _zeros(len(accounts), days) for metric in METRICS}
+
+    def fill(self, columns):
+        """Cargar las columnas (account_id, date, sales, orders, views, questions) del query"""
+        account_ids, dates = columns[0], columns[1]
+        if not account_ids:
+            return
+        positions = {account[0]: index for index, account in enumerate(self.accounts)}
+        rows = [positions[account_id] for account_id in account_ids]
+        cols = [(day - self.start).days for day in dates]
+        for metric, values in zip(METRICS, columns[2:]):
+            matrix = self.values[metric]
+            if np is not None:
+                matrix[rows, cols] = np.array(values, dtype=float)
+            else:
+                for row, col, value in zip(rows, cols, values):
+                    matrix[row][col] = float(value or 0)
+
+
+def load_frame(session, user_id, date_from, date_to):
+    """Cuentas activas del usuario y sus métricas del rango (+ LOOKBACK_DAYS) en un solo query"""
+    start = date_from - datetime.timedelta(days=LOOKBACK_DAYS)
+    accounts = session.execute(text(
+        'SELECT id, ml_nickname, account_alias FROM ml_accounts '
+        'WHERE user_id = :user_id AND is_active ORDER BY id'
+    ), {'user_id': user_id}).all()
+    frame = MetricsFrame([tuple(account) for account in accounts], start, (date_to - start).days + 1)
+    if not accounts:
+        return frame
+
+    rows = session.execute(text(
+        'SELECT m.ml_account_id, m.date, COALESCE(m.daily_sales, 0), COALESCE(m.daily_orders, 0), '
+        'COALESCE(m.daily_views, 0), COALESCE(m.daily_questions, 0) '
+        'FROM ml_account_metrics m JOIN ml_accounts a ON a.id = m.ml_account_id '
+        'WHERE a.user_id = :user_id AND a.is_active AND m.date BETWEEN :start AND :date_to'
+    ), {'user_id': user_id, 'start': start, 'date_to': date_to}).all()
+    # Transponer filas -> columnas
+    frame.fill(list(zip(*rows)) if rows else [(), ()])
+    return frame
+
+
+def summarize(frame, date_from):
+    """Totales, promedios móviles, crecimiento semana contra semana y participación por cuenta"""
+    offset = (date_from - frame.start).days
+    days = frame.days - offset
+    last_week = (frame.days - WINDOW, frame.days)
+    previous_week = (frame.days - 2 * WINDOW, frame.days - WINDOW)
+
+    daily = {metric: _sum_accounts(frame.values[metric], frame.days) for metric in METRICS}
+    rolling = {metric: _rolling_sum(daily[metric], WINDOW) for metric in ('sales', 'orders')}
+    # rolling[i] es la suma de los días i..i+6: el día d cierra la ventana d-6
+    sales_7d = rolling['sales'][offset - WINDOW + 1:]
+    sales_prev_7d = rolling['sales'][offset - 2 * WINDOW + 1:len(rolling['sales']) - WINDOW]
+    sales_wow = _ratio(_subtract(sales_7d, sales_prev_7d), sales_prev_7d)
+
+    series = []
+    for index in range(days):
+        day = offset + index
+        series.append({
+            'date': (frame.start + datetime.timedelta(days=day)).isoformat(),
+            'sales': round(_item(daily['sales'], day), 2),
+            'orders': int(_item(daily['orders'], day)),
+            'views': int(_item(daily['views'], day)),
+            'questions': int(_item(daily['questions'], day)),
+            'sales_7d_avg': round(_item(sales_7d, index) / WINDOW, 2),
+            'orders_7d_avg': round(_item(rolling['orders'], offset - WINDOW + 1 + index) / WINDOW, 2),
+            'sales_wow_growth': _round(sales_wow[index])
+        })
+
+    # Totales del rango por cuenta y entre cuentas
+    by_account = {metric: _sum_days(frame.values[metric], offset, frame.days) for metric in METRICS}
+    totals = {metric: float(sum(_tolist(by_account[metric]))) for metric in METRICS}
+    share = {metric: _ratio(by_account[metric], [totals[metric]] * len(frame.accounts)) for metric in ('sales', 'orders')}
+    ticket = _ratio(by_account['sales'], by_account['orders'])
+
+    account_last = _sum_days(frame.values['sales'], *last_week)
+    account_previous = _sum_days(frame.values['sales'], *previous_week)
+    account_wow = _ratio(_subtract(account_last, account_previous), account_previous)
+
+    accounts = []
+    for index, (account_id, nickname, alias) in enumerate(frame.accounts):
+        accounts.append({
+            'ml_account_id': account_id,
+            'ml_nickname': nickname,
+            'account_alias': alias,
+            'sales': round(_item(by_account['sales'], index), 2),
+            'orders': int(_item(by_account['orders'], index)),
+            'views': int(_item(by_account['views'], index)),
+            'questions': int(_item(by_account['questions'], index)),
+            'sales_share': _round(share['sales'][index], 4),
+            'orders_share': _round(share['orders'][index], 4),
+            'average_order_value': _round(ticket[index]),
+            'sales_wow_growth': _round(account_wow[index])
+        })
+    accounts.sort(key=lambda account: account['sales'], reverse=True)
+
+    week_totals = {}
+    for metric in ('sales', 'orders'):
+        current = sum(_item(daily[metric], day) for day in range(*last_week))
+        previous = sum(_item(daily[metric], day) for day in range(*previous_week))
+        week_totals[metric] = _round((current - previous) / previous if previous else None)
+
+    return {
+        'engine': ENGINE,
+        'days': days,
+        'accounts': len(frame.accounts),
+        'totals': {
+            'sales': round(totals['sales'], 2),
+            'orders': int(totals['orders']),
+            'views': int(totals['views']),
+            'questions': int(totals['questions']),
+            'average_order_value': _round(totals['sales'] / totals['orders'] if totals['orders'] else None),
+            'conversion_rate': _round(totals['orders'] / totals['views'] if totals['views'] else None, 4)
+        },
+        'week_over_week': week_totals,
+        'series': series,
+        'by_account': accounts
+    }
+
+
+# ----- Operaciones vectoriales (numpy o listas) -----
+
+def _zeros(rows, cols):
+    if np is not None:
+        return np.zeros((rows, cols))
+    return [[0.0] * cols for _ in range(rows)]
+
+
+def _sum_accounts(matrix, days):
+    """Total diario entre cuentas (suma de columnas)"""
+    if np is not None:
+        return matrix.sum(axis=0)
+    return [sum(column) for column in zip(*matrix)] if matrix else [0.0] * days
+
+
+def _sum_days(matrix, start, end):
+    """Total por cuenta en los días [start, end)"""
+    if np is not None:
+        return matrix[:, max(start, 0):end].sum(axis=1)
+    return [sum(row[max(start, 0):end]) for row in matrix]
+
+
+def _rolling_sum(values, window):
+    """Sumas de ventanas consecutivas de `window` días (len(values) - window + 1 valores)"""
+    if np is not None:
+        cumulative = np.concatenate(([0.0], np.cumsum(values)))
+        return cumulative[window:] - cumulative[:-window]
+    sums, current = [], sum(values[:window])
+    sums.append(current)
+    for index in range(window, len(values)):
+        current += values[index] - values[index - window]
+        sums.append(current)
+    return sums
+
+
+def _subtract(a, b):
+    if np is not None:
+        return np.asarray(a) - np.asarray(b)
+    return [x - y for x, y in zip(a, b)]
+
+
+def _ratio(numerator, denominator):
+    """Cociente elemento a elemento; None donde el denominador es 0"""
+    if np is not None:
+        numerator, denominator = np.asarray(numerator, dtype=float), np.asarray(denominator, dtype=float)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(denominator != 0, numerator / denominator, np.nan).tolist()
+    return [x / y if y else None for x, y in zip(numerator, denominator)]
+
+
+def _item(values, index):
+    return float(values[index])
+
+
+def _tolist(values):
+    return values.tolist() if np is not None else values
+
+
+def _round(value, digits=2):
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return None
+    return round(value, digits)
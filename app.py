@@ -5,15 +5,52 @@ import datetime
 import jwt
 import requests
 from functools import wraps
+from concurrent.futures import ThreadPoolExecutor
 import os
 from dotenv import load_dotenv
 import bcrypt
+import base64
 
-# Cargar variables de entorno
+# Cargar variables de entorno (antes de importar los módulos que leen su configuración)
 load_dotenv()
 
+from metrics_partitions import ensure_partition_for, setup_partitions
+from json_provider import init_json_provider
+from compression import init_compression
+from http_cache import etag_cached
+from live_updates import UpdateBroker, install_notify_triggers, set_transaction_traceparent, sse_events
+from cache import create_cache_from_env
+from combined_metrics import install_combined_table
+from ml_client import MLClient
+import telemetry
+from query_counter import init_query_counter
+from profiling import init_profiling
+import tracing
+import analytics
+import exports
+import item_velocity
+import ml_models
+
 app = Flask(__name__)
 
+# Serialización JSON rápida (orjson si está instalado)
+init_json_provider(app)
+
+# Compresión gzip/brotli de respuestas JSON grandes
+init_compression(app)
+
+# Métricas por request para /metrics (latencia, en curso, códigos de estado)
+telemetry.init_telemetry(app)
+
+# Conteo de queries SQL por request (X-DB-Queries/X-DB-Time en dev, aviso de N+1)
+init_query_counter(app)
+
+# Profiling opt-in de una fracción de requests (PROFILE_SAMPLE_RATE / X-Debug-Profile)
+init_profiling(app)
+
+# Spans por request y por etapa (exportables a archivo o collector OTLP)
+tracing.init_tracing(app)
+
 # Configuración CORS para permitir frontend (desarrollo y producción)
 FRONTEND_URL = os.getenv('FRONTEND_URL', 'http://localhost:3000')
 ALLOWED_ORIGINS = [
@@ -49,12 +86,36 @@ app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
 db = SQLAlchemy(app)
 
+# Caché de llamadas a ML y agregados (memoria o Redis según CACHE_BACKEND)
+cache = create_cache_from_env()
+
+# Estado del pool de conexiones en /metrics
+telemetry.registry.add_collector(telemetry.db_pool_collector(lambda: db.engine))
+ML_PROFILE_CACHE_TTL = int(os.getenv('ML_PROFILE_CACHE_TTL', '120'))
+ANALYTICS_CACHE_TTL = int(os.getenv('ANALYTICS_CACHE_TTL', '300'))
+# Sincronización de órdenes: días hacia atrás en la primera sincronización y páginas máximas por corrida
+ORDERS_SYNC_INITIAL_DAYS = int(os.getenv('ORDERS_SYNC_INITIAL_DAYS', '90'))
+ORDERS_SYNC_MAX_PAGES = int(os.getenv('ORDERS_SYNC_MAX_PAGES', '40'))
+ORDERS_SYNC_PAGE_SIZE = 50
+# Días hacia atrás en los que se revisan cambios de estado (pagada -> cancelada) de órdenes ya guardadas
+ORDERS_STATUS_WINDOW_DAYS = int(os.getenv('ORDERS_STATUS_WINDOW_DAYS', '30'))
+# Alta masiva de cuentas (agencias): cuentas por pedido y perfiles pedidos a ML en paralelo
+BULK_ACCOUNTS_MAX = int(os.getenv('BULK_ACCOUNTS_MAX', '100'))
+BULK_ACCOUNTS_CONCURRENCY = int(os.getenv('BULK_ACCOUNTS_CONCURRENCY', '8'))
+
 # Configuración de Mercado Libre
 CLIENT_ID = os.getenv('ML_CLIENT_ID', '2582847439583264')
 CLIENT_SECRET = os.getenv('ML_CLIENT_SECRET', '0lVKgECCnZh0QGjhM8xpGHKCxsVbdoLi')
 REDIRECT_URI = os.getenv('ML_REDIRECT_URI', 'https://api-test.smartselling.com.ar/loading')  # Usar API domain
 API_URL = os.getenv('API_URL', 'http://localhost:8000')
 FRONTEND_URL = os.getenv('FRONTEND_URL', 'http://localhost:3000')
+# Pantalla de autorización de ML (apuntar a ml_stub_server.py para correr sin red)
+ML_AUTH_URL = os.getenv('ML_AUTH_URL', 'https://auth.mercadolibre.com.ar/authorization')
+
+# Cliente compartido para la API de ML (pool de conexiones, timeout y single-flight)
+ml_client = MLClient()
+ml_client.observers.append(telemetry.observe_ml_request)
+ml_client.observers.append(tracing.observe_ml_request)
 
 # Modelo de Usuario
 class User(db.Model):
@@ -122,6 +183,11 @@ class MLAccount(db.Model):
     # Relación con User
     user = db.relationship('User', backref=db.backref('ml_accounts', lazy=True))
     
+    # Índice para sincronización incremental (/sync?since=)
+    __table_args__ = (
+        db.Index('ix_ml_accounts_user_updated_at', 'user_id', 'updated_at'),
+    )
+    
     def to_dict(self):
         """Convertir a diccionario para JSON"""
         return {
@@ -143,6 +209,17 @@ class MLAccount(db.Model):
             'token_expires_at': self.token_expires_at.isoformat() if self.token_expires_at else None
         }
     
+    @classmethod
+    def public_columns(cls):
+        """Columnas de to_dict() para consultas sin hidratar objetos ORM"""
+        return (
+            cls.id, cls.ml_user_id, cls.ml_nickname, cls.ml_first_name, cls.ml_last_name,
+            cls.ml_email, cls.ml_country_id, cls.ml_site_id, cls.is_active, cls.account_alias,
+            db.func.coalesce(cls.total_sales, 0).label('total_sales'),
+            cls.total_orders, cls.active_listings, cls.last_metrics_update,
+            cls.created_at, cls.token_expires_at
+        )
+    
     def __repr__(self):
         return f'<MLAccount {self.ml_nickname} ({self.ml_user_id})>'
 
@@ -150,9 +227,10 @@ class MLAccount(db.Model):
 class MLAccountMetrics(db.Model):
     __tablename__ = 'ml_account_metrics'
     
-    id = db.Column(db.Integer, primary_key=True)
+    # La clave primaria incluye date porque la tabla está particionada por mes
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     ml_account_id = db.Column(db.Integer, db.ForeignKey('ml_accounts.id'), nullable=False)
-    date = db.Column(db.Date, nullable=False)
+    date = db.Column(db.Date, primary_key=True, nullable=False)
     
     # Métricas diarias
     daily_sales = db.Column(db.Numeric(10, 2), default=0)
@@ -160,14 +238,19 @@ class MLAccountMetrics(db.Model):
     daily_views = db.Column(db.Integer, default=0)
     daily_questions = db.Column(db.Integer, default=0)
     
-    # Timestamp
+    # Timestamps
     created_at = db.Column(db.DateTime, default=datetime.datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
     
     # Relación con MLAccount
     ml_account = db.relationship('MLAccount', backref=db.backref('metrics', lazy=True))
     
-    # Índice único para evitar duplicados por día
-    __table_args__ = (db.UniqueConstraint('ml_account_id', 'date', name='_ml_account_date_uc'),)
+    # Índice único para evitar duplicados por día (incluye la clave de partición)
+    __table_args__ = (
+        db.UniqueConstraint('ml_account_id', 'date', name='_ml_account_date_uc'),
+        db.Index('ix_ml_account_metrics_account_updated_at', 'ml_account_id', 'updated_at'),
+        {'postgresql_partition_by': 'RANGE (date)'}
+    )
     
     def to_dict(self):
         """Convertir a diccionario para JSON"""
@@ -179,12 +262,463 @@ class MLAccountMetrics(db.Model):
             'daily_orders': self.daily_orders,
             'daily_views': self.daily_views,
             'daily_questions': self.daily_questions,
-            'created_at': self.created_at.isoformat() if self.created_at else None
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
         }
     
     def __repr__(self):
         return f'<MLAccountMetrics {self.ml_account_id} - {self.date}>'
 
+# Registro de cuentas ML eliminadas para la sincronización incremental
+class MLAccountTombstone(db.Model):
+    __tablename__ = 'ml_account_tombstones'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    ml_account_id = db.Column(db.Integer, nullable=False)  # Sin FK: la cuenta ya no existe
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    deleted_at = db.Column(db.DateTime, default=datetime.datetime.utcnow, nullable=False)
+    
+    __table_args__ = (
+        db.Index('ix_ml_account_tombstones_user_deleted_at', 'user_id', 'deleted_at'),
+    )
+    
+    def __repr__(self):
+        return f'<MLAccountTombstone {self.ml_account_id} ({self.deleted_at})>'
+
+# Rollups semanales/mensuales por cuenta ML (mantenidos al guardar métricas diarias)
+class MLAccountMetricsRollup(db.Model):
+    __tablename__ = 'ml_account_metrics_rollups'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    ml_account_id = db.Column(db.Integer, db.ForeignKey('ml_accounts.id', ondelete='CASCADE'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    granularity = db.Column(db.String(10), nullable=False)  # 'week' o 'month'
+    period_start = db.Column(db.Date, nullable=False)
+    
+    # Totales del período
+    sales = db.Column(db.Numeric(14, 2), default=0)
+    orders = db.Column(db.Integer, default=0)
+    views = db.Column(db.Integer, default=0)
+    questions = db.Column(db.Integer, default=0)
+    days = db.Column(db.Integer, default=0)  # Días con métricas en el período
+    
+    updated_at = db.Column(db.DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
+    
+    __table_args__ = (
+        db.UniqueConstraint('ml_account_id', 'granularity', 'period_start', name='_ml_account_rollup_uc'),
+    )
+    
+    def __repr__(self):
+        return f'<MLAccountMetricsRollup {self.ml_account_id} {self.granularity} {self.period_start}>'
+
+# Rollups semanales/mensuales por usuario (suma de todas sus cuentas ML)
+class UserMetricsRollup(db.Model):
+    __tablename__ = 'user_metrics_rollups'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    granularity = db.Column(db.String(10), nullable=False)  # 'week' o 'month'
+    period_start = db.Column(db.Date, nullable=False)
+    
+    # Totales del período
+    sales = db.Column(db.Numeric(14, 2), default=0)
+    orders = db.Column(db.Integer, default=0)
+    views = db.Column(db.Integer, default=0)
+    questions = db.Column(db.Integer, default=0)
+    days = db.Column(db.Integer, default=0)  # Filas diarias sumadas (de todas las cuentas)
+    
+    updated_at = db.Column(db.DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
+    
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'granularity', 'period_start', name='_user_rollup_uc'),
+    )
+    
+    def __repr__(self):
+        return f'<UserMetricsRollup {self.user_id} {self.granularity} {self.period_start}>'
+
+# ============= PUBLICACIONES Y ÓRDENES =============
+
+# Publicación (item) de una cuenta ML
+class MLItem(db.Model):
+    __tablename__ = 'ml_items'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    ml_account_id = db.Column(db.Integer, db.ForeignKey('ml_accounts.id', ondelete='CASCADE'), nullable=False)
+    ml_item_id = db.Column(db.String(30), unique=True, nullable=False)  # ej: MLA123456789
+    
+    title = db.Column(db.String(255), nullable=True)
+    category_id = db.Column(db.String(20), nullable=True)
+    price = db.Column(db.Numeric(12, 2), default=0)
+    currency_id = db.Column(db.String(10), nullable=True)
+    available_quantity = db.Column(db.Integer, default=0)
+    sold_quantity = db.Column(db.Integer, default=0)
+    status = db.Column(db.String(20), nullable=True)  # active, paused, closed
+    
+    # Timestamps (date_created es la fecha de publicación en ML)
+    date_created = db.Column(db.DateTime, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
+    
+    __table_args__ = (
+        db.Index('ix_ml_items_account_status', 'ml_account_id', 'status'),
+    )
+    
+    def to_dict(self):
+        """Convertir a diccionario para JSON"""
+        return {
+            'id': self.id,
+            'ml_account_id': self.ml_account_id,
+            'ml_item_id': self.ml_item_id,
+            'title': self.title,
+            'category_id': self.category_id,
+            'price': float(self.price) if self.price else 0,
+            'currency_id': self.currency_id,
+            'available_quantity': self.available_quantity,
+            'sold_quantity': self.sold_quantity,
+            'status': self.status,
+            'date_created': self.date_created.isoformat() if self.date_created else None
+        }
+    
+    def __repr__(self):
+        return f'<MLItem {self.ml_item_id}>'
+
+# Orden (venta) de una cuenta ML
+class MLOrder(db.Model):
+    __tablename__ = 'ml_orders'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    ml_account_id = db.Column(db.Integer, db.ForeignKey('ml_accounts.id', ondelete='CASCADE'), nullable=False)
+    ml_order_id = db.Column(db.BigInteger, unique=True, nullable=False)
+    
+    status = db.Column(db.String(20), nullable=True)  # paid, cancelled, ...
+    total_amount = db.Column(db.Numeric(12, 2), default=0)
+    currency_id = db.Column(db.String(10), nullable=True)
+    buyer_id = db.Column(db.BigInteger, nullable=True)
+    date_created = db.Column(db.DateTime, nullable=False)
+    
+    created_at = db.Column(db.DateTime, default=datetime.datetime.utcnow)
+    # Cambia con cada cambio de estado (marca de agua de los snapshots incrementales)
+    updated_at = db.Column(db.DateTime, default=datetime.datetime.utcnow)
+    
+    __table_args__ = (
+        db.Index('ix_ml_orders_account_date', 'ml_account_id', 'date_created'),
+        db.Index('ix_ml_orders_updated_at', 'updated_at'),
+    )
+    
+    def to_dict(self):
+        """Convertir a diccionario para JSON"""
+        return {
+            'id': self.id,
+            'ml_account_id': self.ml_account_id,
+            'ml_order_id': self.ml_order_id,
+            'status': self.status,
+            'total_amount': float(self.total_amount) if self.total_amount else 0,
+            'currency_id': self.currency_id,
+            'buyer_id': self.buyer_id,
+            'date_created': self.date_created.isoformat() if self.date_created else None
+        }
+    
+    def __repr__(self):
+        return f'<MLOrder {self.ml_order_id}>'
+
+# Línea de una orden: qué item se vendió, cuántas unidades y a qué precio
+class MLOrderItem(db.Model):
+    __tablename__ = 'ml_order_items'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    order_id = db.Column(db.Integer, db.ForeignKey('ml_orders.id', ondelete='CASCADE'), nullable=False)
+    
+    # Copiados de la orden para agregar por cuenta/item/fecha sin JOIN
+    ml_account_id = db.Column(db.Integer, nullable=False)
+    date_created = db.Column(db.DateTime, nullable=False)
+    
+    ml_item_id = db.Column(db.String(30), nullable=False)
+    quantity = db.Column(db.Integer, default=1)
+    unit_price = db.Column(db.Numeric(12, 2), default=0)
+    
+    __table_args__ = (
+        db.Index('ix_ml_order_items_account_item_date', 'ml_account_id', 'ml_item_id', 'date_created'),
+        db.Index('ix_ml_order_items_order', 'order_id'),
+    )
+    
+    def __repr__(self):
+        return f'<MLOrderItem {self.order_id} {self.ml_item_id} x{self.quantity}>'
+
+# Unidades y facturación por publicación y día (base incremental de la velocidad de ventas)
+class MLItemDailySales(db.Model):
+    __tablename__ = 'ml_item_daily_sales'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    ml_account_id = db.Column(db.Integer, db.ForeignKey('ml_accounts.id', ondelete='CASCADE'), nullable=False)
+    ml_item_id = db.Column(db.String(30), nullable=False)
+    date = db.Column(db.Date, nullable=False)
+    units = db.Column(db.Integer, default=0, nullable=False)
+    revenue = db.Column(db.Numeric(14, 2), default=0, nullable=False)
+    
+    __table_args__ = (
+        db.UniqueConstraint('ml_account_id', 'ml_item_id', 'date', name='_ml_item_daily_sales_uc'),
+    )
+    
+    def __repr__(self):
+        return f'<MLItemDailySales {self.ml_item_id} {self.date} x{self.units}>'
+
+# Velocidad de ventas precalculada por publicación (ventanas de 7/30/90 días al día as_of)
+class MLItemSalesVelocity(db.Model):
+    __tablename__ = 'ml_item_sales_velocity'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    ml_account_id = db.Column(db.Integer, db.ForeignKey('ml_accounts.id', ondelete='CASCADE'), nullable=False)
+    ml_item_id = db.Column(db.String(30), nullable=False)
+    
+    units_7d = db.Column(db.Integer, default=0)
+    revenue_7d = db.Column(db.Numeric(14, 2), default=0)
+    units_30d = db.Column(db.Integer, default=0)
+    revenue_30d = db.Column(db.Numeric(14, 2), default=0)
+    units_90d = db.Column(db.Integer, default=0)
+    revenue_90d = db.Column(db.Numeric(14, 2), default=0)
+    last_sale_date = db.Column(db.Date, nullable=True)
+    as_of = db.Column(db.Date, nullable=False)
+    
+    updated_at = db.Column(db.DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
+    
+    # La restricción única sirve también de índice para leer las publicaciones de una cuenta
+    __table_args__ = (
+        db.UniqueConstraint('ml_account_id', 'ml_item_id', name='_ml_item_sales_velocity_uc'),
+    )
+    
+    def __repr__(self):
+        return f'<MLItemSalesVelocity {self.ml_item_id} 30d={self.units_30d}>'
+
+# ============= ROLLUPS DE MÉTRICAS =============
+
+ROLLUP_GRANULARITIES = ('week', 'month')
+
+def rollup_period_start(day, granularity):
+    """Inicio del período (semana ISO desde el lunes, o mes) que contiene la fecha"""
+    if granularity == 'week':
+        return day - datetime.timedelta(days=day.weekday())
+    return day.replace(day=1)
+
+def apply_rollup_delta(account, day, sales=0, orders=0, views=0, questions=0, days=0):
+    """
+    Sumar la diferencia de una fila diaria a los rollups de la cuenta y del usuario.
+    Usa INSERT ... ON CONFLICT para que sea un único statement por nivel.
+    """
+    from sqlalchemy.dialects.postgresql import insert
+    
+    deltas = {'sales': sales, 'orders': orders, 'views': views, 'questions': questions, 'days': days}
+    now = datetime.datetime.utcnow()
+    
+    for granularity in ROLLUP_GRANULARITIES:
+        period_start = rollup_period_start(day, granularity)
+        
+        for model, keys, constraint in (
+            (MLAccountMetricsRollup, {'ml_account_id': account.id, 'user_id': account.user_id}, '_ml_account_rollup_uc'),
+            (UserMetricsRollup, {'user_id': account.user_id}, '_user_rollup_uc'),
+        ):
+            stmt = insert(model).values(
+                granularity=granularity,
+                period_start=period_start,
+                updated_at=now,
+                **keys,
+                **deltas
+            )
+            table = model.__table__
+            stmt = stmt.on_conflict_do_update(
+                constraint=constraint,
+                set_={
+                    **{name: table.c[name] + stmt.excluded[name] for name in deltas},
+                    'updated_at': now
+                }
+            )
+            db.session.execute(stmt)
+
+def upsert_daily_metrics(account, day, sales=0, orders=0, views=0, questions=0):
+    """
+    Crear o actualizar la fila diaria de una cuenta y mantener los rollups
+    aplicando solo la diferencia respecto del valor anterior.
+    """
+    from decimal import Decimal
+    
+    ensure_partition_for(db.session, day)
+    
+    # Bloquear la fila existente para que dos refrescos simultáneos no dupliquen el delta
+    daily_metrics = MLAccountMetrics.query.filter_by(
+        ml_account_id=account.id,
+        date=day
+    ).with_for_update().first()
+    
+    sales = Decimal(str(sales or 0))
+    orders = int(orders or 0)
+    views = int(views or 0)
+    questions = int(questions or 0)
+    
+    if not daily_metrics:
+        daily_metrics = MLAccountMetrics(
+            ml_account_id=account.id,
+            date=day,
+            daily_sales=sales,
+            daily_orders=orders,
+            daily_views=views,
+            daily_questions=questions
+        )
+        db.session.add(daily_metrics)
+        apply_rollup_delta(account, day, sales, orders, views, questions, days=1)
+    else:
+        apply_rollup_delta(
+            account, day,
+            sales=sales - (daily_metrics.daily_sales or 0),
+            orders=orders - (daily_metrics.daily_orders or 0),
+            views=views - (daily_metrics.daily_views or 0),
+            questions=questions - (daily_metrics.daily_questions or 0)
+        )
+        daily_metrics.daily_sales = sales
+        daily_metrics.daily_orders = orders
+        daily_metrics.daily_views = views
+        daily_metrics.daily_questions = questions
+    
+    # Los agregados del usuario cambian con cada fila diaria
+    invalidate_after_commit(f'user:{account.user_id}')
+    return daily_metrics
+
+def rebuild_metrics_rollups():
+    """
+    Completar los rollups que faltan desde las métricas diarias (backfill inicial).
+    Solo se calculan los períodos sin fila de rollup: los que ya existen pueden cubrir
+    días que la retención de particiones borró y recalcularlos perdería esa historia.
+    """
+    from sqlalchemy import text
+    
+    for granularity in ROLLUP_GRANULARITIES:
+        # Un statement por granularidad: las filas nuevas de cada cuenta se suman al usuario
+        db.session.execute(text("""
+            WITH inserted AS (
+                INSERT INTO ml_account_metrics_rollups
+                    (ml_account_id, user_id, granularity, period_start, sales, orders, views, questions, days, updated_at)
+                SELECT m.ml_account_id, a.user_id, :granularity, date_trunc(:granularity, m.date)::date,
+                       COALESCE(SUM(m.daily_sales), 0), COALESCE(SUM(m.daily_orders), 0),
+                       COALESCE(SUM(m.daily_views), 0), COALESCE(SUM(m.daily_questions), 0),
+                       COUNT(*), now() at time zone 'utc'
+                FROM ml_account_metrics m
+                JOIN ml_accounts a ON a.id = m.ml_account_id
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM ml_account_metrics_rollups r
+                    WHERE r.ml_account_id = m.ml_account_id AND r.granularity = :granularity
+                      AND r.period_start = date_trunc(:granularity, m.date)::date)
+                GROUP BY m.ml_account_id, a.user_id, date_trunc(:granularity, m.date)
+                ON CONFLICT ON CONSTRAINT _ml_account_rollup_uc DO NOTHING
+                RETURNING user_id, granularity, period_start, sales, orders, views, questions, days
+            )
+            INSERT INTO user_metrics_rollups
+                (user_id, granularity, period_start, sales, orders, views, questions, days, updated_at)
+            SELECT user_id, granularity, period_start, SUM(sales), SUM(orders), SUM(views), SUM(questions),
+                   SUM(days), now() at time zone 'utc'
+            FROM inserted
+            GROUP BY user_id, granularity, period_start
+            ON CONFLICT ON CONSTRAINT _user_rollup_uc DO UPDATE SET
+                sales = user_metrics_rollups.sales + EXCLUDED.sales,
+                orders = user_metrics_rollups.orders + EXCLUDED.orders,
+                views = user_metrics_rollups.views + EXCLUDED.views,
+                questions = user_metrics_rollups.questions + EXCLUDED.questions,
+                days = user_metrics_rollups.days + EXCLUDED.days,
+                updated_at = EXCLUDED.updated_at
+        """), {'granularity': granularity})
+    
+    db.session.commit()
+
+def remove_account_from_rollups(account):
+    """Descontar de los rollups del usuario los totales de una cuenta que se elimina"""
+    from sqlalchemy import text
+    
+    db.session.execute(text("""
+        UPDATE user_metrics_rollups u
+        SET sales = u.sales - r.sales, orders = u.orders - r.orders, views = u.views - r.views,
+            questions = u.questions - r.questions, days = u.days - r.days,
+            updated_at = now() at time zone 'utc'
+        FROM ml_account_metrics_rollups r
+        WHERE r.ml_account_id = :account_id AND u.user_id = r.user_id
+          AND u.granularity = r.granularity AND u.period_start = r.period_start
+    """), {'account_id': account.id})
+    db.session.execute(text('DELETE FROM ml_account_metrics_rollups WHERE ml_account_id = :account_id'),
+                       {'account_id': account.id})
+
+# ============= INVALIDACIÓN DE CACHÉ =============
+
+def invalidate_after_commit(*tags):
+    """Invalidar tags de caché cuando la transacción actual se confirme"""
+    db.session.info.setdefault('cache_tags', set()).update(tags)
+
+def _account_cache_tags(mapper, connection, target):
+    """Cambios en una cuenta ML: perfil/tokens y agregados del usuario"""
+    from sqlalchemy import inspect
+    from sqlalchemy.orm import object_session
+    
+    session = object_session(target)
+    if session is None:
+        return
+    
+    tags = {f'user:{target.user_id}'}
+    state = inspect(target)
+    if state.deleted or any(state.attrs[name].history.has_changes()
+                            for name in ('access_token', 'ml_user_id', 'is_active')):
+        tags.add(f'ml_user:{target.ml_user_id}')
+    session.info.setdefault('cache_tags', set()).update(tags)
+
+def _flush_cache_tags(session):
+    tags = session.info.pop('cache_tags', None)
+    if tags:
+        cache.invalidate(*tags)
+
+def _discard_cache_tags(session, previous_transaction):
+    session.info.pop('cache_tags', None)
+
+db.event.listen(MLAccount, 'after_insert', _account_cache_tags)
+db.event.listen(MLAccount, 'after_update', _account_cache_tags)
+db.event.listen(MLAccount, 'after_delete', _account_cache_tags)
+db.event.listen(db.session, 'after_commit', _flush_cache_tags)
+db.event.listen(db.session, 'after_soft_rollback', _discard_cache_tags)
+db.event.listen(db.session, 'after_begin', set_transaction_traceparent)
+
+# Columnas nuevas en tablas existentes (create_all() solo crea tablas nuevas): se agregan
+# y completan una sola vez, cuando la columna todavía no existe
+SCHEMA_COLUMNS = (
+    ('ml_account_metrics', 'updated_at', 'TIMESTAMP WITHOUT TIME ZONE',
+     "UPDATE ml_account_metrics SET updated_at = COALESCE(created_at, now() at time zone 'utc')"),
+    ('ml_orders', 'updated_at', 'TIMESTAMP WITHOUT TIME ZONE',
+     "UPDATE ml_orders SET updated_at = COALESCE(created_at, now() at time zone 'utc')"),
+)
+
+# Índices nuevos sobre tablas existentes
+SCHEMA_UPGRADES = (
+    'CREATE INDEX IF NOT EXISTS ix_ml_accounts_user_updated_at ON ml_accounts (user_id, updated_at)',
+    'CREATE INDEX IF NOT EXISTS ix_ml_account_metrics_account_updated_at ON ml_account_metrics (ml_account_id, updated_at)',
+    'CREATE INDEX IF NOT EXISTS ix_ml_orders_updated_at ON ml_orders (updated_at)',
+)
+
+def setup_database():
+    """
+    Crear tablas y objetos de base de datos que create_all() no maneja
+    (particiones de métricas, columnas/índices nuevos, triggers de NOTIFY y la tabla
+    de totales diarios por usuario). Es idempotente.
+    """
+    from sqlalchemy import text
+    
+    db.create_all()
+    partitions = setup_partitions(db.session, MLAccountMetrics.__table__)
+    for table, column, column_type, backfill in SCHEMA_COLUMNS:
+        exists = db.session.execute(text(
+            'SELECT 1 FROM information_schema.columns WHERE table_name = :table AND column_name = :column'
+        ), {'table': table, 'column': column}).first()
+        if not exists:
+            db.session.execute(text(f'ALTER TABLE {table} ADD COLUMN {column} {column_type}'))
+            db.session.execute(text(backfill))
+    for statement in SCHEMA_UPGRADES:
+        db.session.execute(text(statement))
+    install_notify_triggers(db.session)
+    install_combined_table(db.session)
+    db.session.commit()
+    return partitions
+
 # Decorador para validar JWT en rutas protegidas
 def token_required(f):
     @wraps(f)
@@ -203,8 +737,9 @@ def token_required(f):
 
         try:
             # Decodificar token
-            data = jwt.decode(token, app.config['SECRET_KEY'], algorithms=["HS256"])
-            current_user = User.query.filter_by(id=data['user_id'], token=token).first()
+            with tracing.span('auth.token_required'):
+                data = jwt.decode(token, app.config['SECRET_KEY'], algorithms=["HS256"])
+                current_user = User.query.filter_by(id=data['user_id'], token=token).first()
             
             if not current_user:
                 return jsonify({'message': 'Token is invalid or expired!'}), 401
@@ -217,22 +752,97 @@ def token_required(f):
         return f(current_user, *args, **kwargs)
     return decorated
 
+# ============= ETAGS PARA RESPUESTAS CONDICIONALES =============
+
+def ml_accounts_etag(current_user):
+    """Versión de la lista de cuentas: cantidad y últimas actualizaciones"""
+    count, last_update, last_metrics = db.session.query(
+        db.func.count(MLAccount.id),
+        db.func.max(MLAccount.updated_at),
+        db.func.max(MLAccount.last_metrics_update)
+    ).filter(MLAccount.user_id == current_user.id).one()
+    return (current_user.id, count, last_update, last_metrics)
+
+def daily_metrics_etag(current_user, account_id):
+    """Versión de las métricas diarias: cambian junto con last_metrics_update"""
+    account = db.session.query(MLAccount.last_metrics_update, MLAccount.updated_at).filter(
+        MLAccount.id == account_id,
+        MLAccount.user_id == current_user.id
+    ).first()
+    if not account:
+        return None
+    # El rango por defecto depende del día actual
+    return (current_user.id, account_id, account.last_metrics_update, account.updated_at,
+            datetime.date.today(), request.query_string.decode('utf-8'))
+
+def profile_etag(current_user):
+    """Versión del perfil: los mismos campos que devuelve /profile"""
+    return (current_user.id, current_user.username, bool(current_user.ml_access_token),
+            current_user.ml_user_id, current_user.created_at)
+
 # ============= NUEVOS ENDPOINTS MULTICUENTA =============
 
 # Obtener todas las cuentas ML del usuario
 @app.route('/ml-accounts')
 @token_required
+@etag_cached(ml_accounts_etag)
 def get_ml_accounts(current_user):
     try:
-        accounts = MLAccount.query.filter_by(user_id=current_user.id).all()
+        # Filas planas: el proveedor JSON serializa fechas y Decimal directamente
+        rows = db.session.execute(
+            db.select(*MLAccount.public_columns()).filter_by(user_id=current_user.id)
+        ).mappings().all()
         
         return jsonify({
-            'accounts': [account.to_dict() for account in accounts],
-            'total': len(accounts)
+            'accounts': [dict(row) for row in rows],
+            'total': len(rows)
         })
     except Exception as e:
         return jsonify({'message': f'Error getting ML accounts: {str(e)}'}), 500
 
+# Totales diarios de todas las cuentas activas del usuario (una fila por día, sin importar cuántas cuentas)
+@app.route('/ml-accounts/combined-metrics')
+@token_required
+def get_combined_metrics(current_user):
+    try:
+        try:
+            date_to = datetime.date.fromisoformat(request.args['to']) if request.args.get('to') else datetime.date.today()
+            date_from = (datetime.date.fromisoformat(request.args['from']) if request.args.get('from')
+                         else date_to - datetime.timedelta(days=29))
+        except ValueError:
+            return jsonify({'message': 'from/to must be ISO dates (YYYY-MM-DD)'}), 400
+        
+        from sqlalchemy import text
+        rows = db.session.execute(text("""
+            SELECT date, sales, orders, views, questions, accounts
+            FROM user_daily_metrics
+            WHERE user_id = :user_id AND date BETWEEN :date_from AND :date_to AND accounts > 0
+            ORDER BY date
+        """), {'user_id': current_user.id, 'date_from': date_from, 'date_to': date_to}).all()
+        
+        days = [{
+            'date': row.date.isoformat(),
+            'sales': float(row.sales),
+            'orders': int(row.orders),
+            'views': int(row.views),
+            'questions': int(row.questions),
+            'accounts': int(row.accounts)
+        } for row in rows]
+        
+        return jsonify({
+            'from': date_from.isoformat(),
+            'to': date_to.isoformat(),
+            'totals': {
+                'sales': round(sum(day['sales'] for day in days), 2),
+                'orders': sum(day['orders'] for day in days),
+                'views': sum(day['views'] for day in days),
+                'questions': sum(day['questions'] for day in days)
+            },
+            'days': days
+        })
+    except Exception as e:
+        return jsonify({'message': f'Error getting combined metrics: {str(e)}'}), 500
+
 # Actualizar una cuenta ML específica
 @app.route('/ml-accounts/<int:account_id>', methods=['PUT'])
 @token_required
@@ -268,6 +878,17 @@ def delete_ml_account(current_user, account_id):
         if not account:
             return jsonify({'message': 'ML account not found'}), 404
         
+        remove_account_from_rollups(account)
+        # ml_account_metrics no tiene ON DELETE CASCADE: sin esto el ORM intenta dejar sus filas sin cuenta
+        MLAccountMetrics.query.filter_by(ml_account_id=account.id).delete(synchronize_session=False)
+        
+        # Tombstone para que /sync informe la baja; se purgan los vencidos
+        now = datetime.datetime.utcnow()
+        db.session.add(MLAccountTombstone(ml_account_id=account.id, user_id=current_user.id, deleted_at=now))
+        MLAccountTombstone.query.filter(
+            MLAccountTombstone.deleted_at < now - SYNC_TOMBSTONE_RETENTION
+        ).delete(synchronize_session=False)
+        
         db.session.delete(account)
         db.session.commit()
         
@@ -286,28 +907,12 @@ def update_ml_account_data(current_user, account_id):
             return jsonify({'message': 'ML account not found'}), 404
         
         # Obtener datos actualizados de ML
-        headers = {
-            'Authorization': f'Bearer {account.access_token}',
-            'User-Agent': 'SmartSelling-App/1.0'
-        }
-        
         try:
-            user_response = requests.get(
-                f'https://api.mercadolibre.com/users/{account.ml_user_id}', 
-                headers=headers, 
-                timeout=10
-            )
+            user_response = ml_client.get(f'/users/{account.ml_user_id}', account.access_token)
             
             if user_response.status_code == 200:
-                user_data = user_response.json()
-                
                 # Actualizar datos de la cuenta
-                account.ml_nickname = user_data.get('nickname', account.ml_nickname)
-                account.ml_first_name = user_data.get('first_name', account.ml_first_name)
-                account.ml_last_name = user_data.get('last_name', account.ml_last_name)
-                account.ml_email = user_data.get('email', account.ml_email)
-                account.ml_country_id = user_data.get('country_id', account.ml_country_id)
-                account.ml_site_id = user_data.get('site_id', account.ml_site_id)
+                ml_models.UserProfile.from_json(user_response.json()).apply_to(account)
                 account.updated_at = datetime.datetime.utcnow()
                 
                 db.session.commit()
@@ -337,6 +942,8 @@ def get_account_metrics(current_user, account_id):
         
         # Llamar a la API de ML para obtener métricas en tiempo real
         metrics = fetch_ml_metrics(account.access_token, account.ml_user_id)
+        profile = metrics.pop('profile', None)
+        metrics['user_data'] = profile.to_dict() if profile else {}
         
         return jsonify({
             'account': account.to_dict(),
@@ -345,6 +952,19 @@ def get_account_metrics(current_user, account_id):
     except Exception as e:
         return jsonify({'message': f'Error getting metrics: {str(e)}'}), 500
 
+def metrics_unchanged(account, metrics):
+    """
+    True si ML contestó 304 a todas las llamadas del refresco y la cuenta
+    ya tiene métricas de hoy: se puede saltear la escritura en la base.
+    Se busca la fila diaria con la misma fecha que usa upsert_daily_metrics (local).
+    """
+    if not metrics.get('not_modified'):
+        return False
+    return db.session.query(MLAccountMetrics.id).filter_by(
+        ml_account_id=account.id,
+        date=datetime.date.today()
+    ).first() is not None
+
 # Refrescar métricas de una cuenta
 @app.route('/ml-accounts/<int:account_id>/refresh-metrics', methods=['POST'])
 @token_required
@@ -355,13 +975,24 @@ def refresh_account_metrics(current_user, account_id):
         if not account:
             return jsonify({'message': 'ML account not found'}), 404
         
-        # Obtener métricas actualizadas de ML
-        metrics = fetch_ml_metrics(account.access_token, account.ml_user_id)
+        # Obtener métricas actualizadas de ML (un refresco explícito no usa la caché)
+        cache.invalidate(f'ml_user:{account.ml_user_id}')
+        with tracing.span('ml.fetch_metrics', account_id=account.id):
+            metrics = fetch_ml_metrics(account.access_token, account.ml_user_id)
         
         # Verificar si hay error de token
         if metrics.get('error') == 'token_expired':
             return jsonify({'message': 'Token expired, please reconnect account'}), 401
         
+        # ML respondió 304 a todo y la fila de hoy ya existe: no hay nada que escribir
+        if metrics_unchanged(account, metrics):
+            return jsonify({
+                'message': 'Metrics not modified',
+                'not_modified': True,
+                'account': account.to_dict(),
+                'conditional': metrics['conditional']
+            })
+        
         # Actualizar en la base de datos
         account.total_sales = metrics.get('total_sales', 0)
         account.total_orders = metrics.get('total_orders', 0)
@@ -369,70 +1000,432 @@ def refresh_account_metrics(current_user, account_id):
         account.last_metrics_update = datetime.datetime.utcnow()
         
         # Actualizar datos del usuario si están disponibles
-        user_data = metrics.get('user_data', {})
-        if user_data:
-            account.ml_nickname = user_data.get('nickname', account.ml_nickname)
-            account.ml_first_name = user_data.get('first_name', account.ml_first_name)
-            account.ml_last_name = user_data.get('last_name', account.ml_last_name)
-            account.ml_email = user_data.get('email', account.ml_email)
-        
-        db.session.commit()
-        
-        # Guardar métricas diarias
-        today = datetime.date.today()
-        daily_metrics = MLAccountMetrics.query.filter_by(
-            ml_account_id=account.id, 
-            date=today
-        ).first()
-        
-        if not daily_metrics:
-            daily_metrics = MLAccountMetrics(
-                ml_account_id=account.id,
-                date=today,
-                daily_sales=metrics.get('total_sales', 0),
-                daily_orders=metrics.get('total_orders', 0),
-                daily_views=0,  # Por ahora 0, agregar endpoint específico después
-                daily_questions=0
+        if metrics.get('profile'):
+            metrics['profile'].apply_to(account)
+        
+        # Guardar métricas diarias (y sus rollups semanales/mensuales) en la misma transacción:
+        # el ETag de /daily-metrics sale de last_metrics_update y no puede cambiar antes que las filas
+        with tracing.span('db.upsert_daily_metrics'):
+            daily_metrics = upsert_daily_metrics(
+                account,
+                datetime.date.today(),
+                sales=metrics.get('total_sales', 0),
+                orders=metrics.get('total_orders', 0)
+                # daily_views y daily_questions quedan en 0 hasta tener endpoint específico
             )
-            db.session.add(daily_metrics)
-        else:
-            daily_metrics.daily_sales = metrics.get('total_sales', 0)
-            daily_metrics.daily_orders = metrics.get('total_orders', 0)
+        with tracing.span('db.commit'):
+            db.session.commit()
+        
+        with tracing.span('serialize'):
+            return jsonify({
+                'message': 'Metrics updated successfully',
+                'not_modified': False,
+                'account': account.to_dict(),
+                'daily_metrics': daily_metrics.to_dict(),
+                'conditional': metrics.get('conditional')
+            })
+    except Exception as e:
+        db.session.rollback()
+        tracing.log(f"Error refreshing metrics for account {account_id}: {e}")
+        return jsonify({'message': f'Error refreshing metrics: {str(e)}'}), 500
+
+# ============= ÓRDENES Y PUBLICACIONES MÁS VENDIDAS =============
+
+def ml_date_param(value):
+    """Fecha para los filtros de /orders/search"""
+    return value.strftime('%Y-%m-%dT%H:%M:%S.000-00:00')
+
+def fetch_ml_orders(account, filters):
+    """
+    Órdenes de la cuenta que cumplen filters, de la más vieja a la más nueva (paginando
+    /orders/search hasta ORDERS_SYNC_MAX_PAGES). Devuelve (órdenes, completo); None si el token venció.
+    """
+    orders = []
+    for page in range(ORDERS_SYNC_MAX_PAGES):
+        response = ml_client.get('/orders/search', account.access_token, params={
+            'seller': account.ml_user_id,
+            **filters,
+            'sort': 'date_asc',
+            'offset': page * ORDERS_SYNC_PAGE_SIZE,
+            'limit': ORDERS_SYNC_PAGE_SIZE
+        })
+        if response.status_code == 401:
+            return None
+        if response.status_code != 200:
+            raise requests.exceptions.RequestException(f'orders/search returned {response.status_code}')
         
+        search = ml_models.OrderSearch.from_json(response.json())
+        orders.extend(search.results)
+        if (page + 1) * ORDERS_SYNC_PAGE_SIZE >= search.paging.total:
+            return orders, True
+    return orders, False
+
+def store_ml_orders(account, orders):
+    """
+    Guardar órdenes nuevas (ml_models.Order) y cambios de estado, y llevar la diferencia de
+    unidades vendidas al índice de velocidad por publicación (solo cuentan las órdenes pagadas).
+    """
+    from sqlalchemy.dialects.postgresql import insert
+    
+    by_id = {order.id: order for order in orders}
+    if not by_id:
+        return {'created': 0, 'updated': 0, 'items': 0}
+    existing = {row.ml_order_id: row for row in db.session.query(
+        MLOrder.id, MLOrder.ml_order_id, MLOrder.status
+    ).filter(MLOrder.ml_order_id.in_(list(by_id)))}
+    
+    now = datetime.datetime.utcnow()
+    new_orders, titles, sales, updated = [], {}, [], 0
+    
+    def sold(order, sign):
+        return [(account.id, line.item.id, order.date_created.date(), sign * line.quantity,
+                 sign * line.quantity * line.unit_price) for line in order.lines]
+    
+    for ml_order_id, order in by_id.items():
+        for line in order.lines:
+            titles.setdefault(line.item.id, line.item.title)
+        
+        previous = existing.get(ml_order_id)
+        if previous is None:
+            new_orders.append(order)
+        elif previous.status != order.status:
+            db.session.query(MLOrder).filter_by(id=previous.id).update({'status': order.status, 'updated_at': now})
+            updated += 1
+            # Pagada -> cancelada resta sus unidades; al revés las suma
+            sign = (int(order.status in item_velocity.PAID_STATUSES)
+                    - int(previous.status in item_velocity.PAID_STATUSES))
+            if sign:
+                sales.extend(sold(order, sign))
+    
+    inserted = {}
+    if new_orders:
+        # Un INSERT para todas las órdenes; ON CONFLICT por si otra sincronización ganó la carrera
+        rows = db.session.execute(insert(MLOrder).values([{
+            'ml_account_id': account.id,
+            'ml_order_id': order.id,
+            'status': order.status,
+            'total_amount': order.total_amount,
+            'currency_id': order.currency_id,
+            'buyer_id': order.buyer_id,
+            'date_created': order.date_created,
+            'created_at': now,
+            'updated_at': now
+        } for order in new_orders]).on_conflict_do_nothing(
+            index_elements=['ml_order_id']
+        ).returning(MLOrder.id, MLOrder.ml_order_id)).all()
+        inserted = {row.ml_order_id: row.id for row in rows}
+        
+        order_items = []
+        for order in new_orders:
+            # Las que insertó otra sincronización ya sumaron sus unidades
+            if order.id not in inserted:
+                continue
+            order_items.extend({
+                'order_id': inserted[order.id],
+                'ml_account_id': account.id,
+                'date_created': order.date_created,
+                'ml_item_id': line.item.id,
+                'quantity': line.quantity,
+                'unit_price': line.unit_price
+            } for line in order.lines)
+            if order.status in item_velocity.PAID_STATUSES:
+                sales.extend(sold(order, 1))
+        if order_items:
+            db.session.execute(MLOrderItem.__table__.insert(), order_items)
+    
+    if titles:
+        db.session.execute(insert(MLItem).values([
+            {'ml_account_id': account.id, 'ml_item_id': item_id, 'title': title, 'created_at': now, 'updated_at': now}
+            for item_id, title in titles.items()
+        ]).on_conflict_do_nothing(index_elements=['ml_item_id']))
+    
+    touched = item_velocity.record_item_sales(db.session, sales)
+    item_velocity.recompute_velocity(db.session, touched)
+    return {'created': len(inserted), 'updated': updated, 'items': len(touched)}
+
+def sync_account_orders(account):
+    """
+    Traer de ML las órdenes nuevas de la cuenta y los cambios de estado de las ya guardadas,
+    y actualizar la velocidad por publicación.
+    """
+    now = datetime.datetime.utcnow()
+    last = db.session.query(db.func.max(MLOrder.date_created)).filter(MLOrder.ml_account_id == account.id).scalar()
+    # De la más vieja a la más nueva: si se corta por ORDERS_SYNC_MAX_PAGES, la próxima
+    # sincronización sigue desde la última orden guardada (la repetida se ignora)
+    since = last or now - datetime.timedelta(days=ORDERS_SYNC_INITIAL_DAYS)
+    
+    with tracing.span('ml.orders_search', account_id=account.id):
+        fetched = fetch_ml_orders(account, {'order.date_created.from': ml_date_param(since)})
+    if fetched is None:
+        return {'error': 'token_expired'}
+    orders, complete = fetched
+    
+    if last:
+        # Órdenes ya guardadas que ML modificó hace poco (ej: pagada -> cancelada)
+        with tracing.span('ml.orders_search_updated', account_id=account.id):
+            fetched = fetch_ml_orders(account, {
+                'order.date_created.to': ml_date_param(since),
+                'order.date_last_updated.from': ml_date_param(now - datetime.timedelta(days=ORDERS_STATUS_WINDOW_DAYS))
+            })
+        if fetched is None:
+            return {'error': 'token_expired'}
+        orders.extend(fetched[0])
+        complete = complete and fetched[1]
+    
+    if not complete:
+        tracing.log(f"Orders sync for account {account.id} stopped after {ORDERS_SYNC_MAX_PAGES} pages; "
+                    f"the rest will be fetched on the next sync")
+    
+    with tracing.span('db.store_orders', orders=len(orders)):
+        result = store_ml_orders(account, orders)
         db.session.commit()
+    return {'fetched': len(orders), 'complete': complete, **result}
+
+# Sincronizar órdenes de una cuenta ML (alimenta el ranking de publicaciones)
+@app.route('/ml-accounts/<int:account_id>/sync-orders', methods=['POST'])
+@token_required
+def sync_ml_account_orders(current_user, account_id):
+    try:
+        account = MLAccount.query.filter_by(id=account_id, user_id=current_user.id).first()
+        if not account:
+            return jsonify({'message': 'ML account not found'}), 404
+        
+        result = sync_account_orders(account)
+        if result.get('error') == 'token_expired':
+            return jsonify({'message': 'Token expired, please reconnect account'}), 401
         
         return jsonify({
-            'message': 'Metrics updated successfully',
-            'account': account.to_dict(),
-            'daily_metrics': daily_metrics.to_dict()
+            'message': 'Orders synced successfully',
+            'orders_fetched': result['fetched'],
+            'orders_created': result['created'],
+            'orders_updated': result['updated'],
+            'items_updated': result['items'],
+            # False: quedaron órdenes por traer, volver a sincronizar
+            'complete': result['complete']
         })
     except Exception as e:
-        return jsonify({'message': f'Error refreshing metrics: {str(e)}'}), 500
+        db.session.rollback()
+        tracing.log(f"Error syncing orders for account {account_id}: {e}")
+        return jsonify({'message': f'Error syncing orders: {str(e)}'}), 500
+
+TOP_ITEMS_DEFAULT_LIMIT = 20
+TOP_ITEMS_MAX_LIMIT = 100
 
-# Obtener métricas diarias de una cuenta
+# Publicaciones más vendidas de una cuenta (desde el índice precalculado, sin recorrer órdenes)
+@app.route('/ml-accounts/<int:account_id>/top-items')
+@token_required
+def get_top_items(current_user, account_id):
+    try:
+        account = MLAccount.query.filter_by(id=account_id, user_id=current_user.id).first()
+        if not account:
+            return jsonify({'message': 'ML account not found'}), 404
+        
+        window = request.args.get('window', 30, type=int)
+        sort = request.args.get('sort', 'revenue')
+        if window not in item_velocity.WINDOWS or sort not in ('units', 'revenue'):
+            return jsonify({'message': 'window must be 7, 30 or 90 and sort units or revenue'}), 400
+        limit = min(max(request.args.get('limit', TOP_ITEMS_DEFAULT_LIMIT, type=int), 1), TOP_ITEMS_MAX_LIMIT)
+        
+        velocity = MLItemSalesVelocity
+        order_column = getattr(velocity, f'{sort}_{window}d')
+        rows = db.session.query(
+            velocity.ml_item_id, MLItem.title, MLItem.price, MLItem.status,
+            velocity.units_7d, velocity.revenue_7d, velocity.units_30d, velocity.revenue_30d,
+            velocity.units_90d, velocity.revenue_90d, velocity.last_sale_date, velocity.as_of
+        ).outerjoin(MLItem, MLItem.ml_item_id == velocity.ml_item_id).filter(
+            velocity.ml_account_id == account.id,
+            order_column > 0
+        ).order_by(order_column.desc(), velocity.ml_item_id).limit(limit).all()
+        
+        return jsonify({
+            'ml_account_id': account.id,
+            'window': window,
+            'sort': sort,
+            'as_of': rows[0].as_of.isoformat() if rows else None,
+            'items': [{
+                'ml_item_id': row.ml_item_id,
+                'title': row.title,
+                'price': float(row.price) if row.price is not None else None,
+                'status': row.status,
+                'units_per_day': round(getattr(row, f'units_{window}d') / window, 2),
+                **{f'units_{days}d': getattr(row, f'units_{days}d') for days in item_velocity.WINDOWS},
+                **{f'revenue_{days}d': float(getattr(row, f'revenue_{days}d') or 0) for days in item_velocity.WINDOWS},
+                'last_sale_date': row.last_sale_date.isoformat() if row.last_sale_date else None
+            } for row in rows]
+        })
+    except Exception as e:
+        return jsonify({'message': f'Error getting top items: {str(e)}'}), 500
+
+# Campos de métricas diarias que se pueden pedir con ?fields=
+DAILY_METRICS_FIELDS = ('id', 'ml_account_id', 'date', 'daily_sales', 'daily_orders',
+                        'daily_views', 'daily_questions', 'created_at')
+DAILY_METRICS_DEFAULT_LIMIT = 100
+DAILY_METRICS_MAX_LIMIT = 1000
+
+def encode_metrics_cursor(date, metric_id):
+    """Cursor opaco para paginación keyset sobre (date, id)"""
+    return base64.urlsafe_b64encode(f'{date.isoformat()}:{metric_id}'.encode('utf-8')).decode('ascii')
+
+def decode_metrics_cursor(cursor):
+    """Decodificar un cursor generado por encode_metrics_cursor"""
+    date_str, metric_id = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8').split(':')
+    return datetime.date.fromisoformat(date_str), int(metric_id)
+
+def daily_metrics_column(name):
+    """Columna de métricas diarias con el mismo valor por defecto que to_dict()"""
+    if name == 'daily_sales':
+        return db.func.coalesce(MLAccountMetrics.daily_sales, 0).label('daily_sales')
+    return getattr(MLAccountMetrics, name)
+
+# Obtener métricas diarias de una cuenta (rango por fechas con paginación keyset)
 @app.route('/ml-accounts/<int:account_id>/daily-metrics')
 @token_required
+@etag_cached(daily_metrics_etag)
 def get_daily_metrics(current_user, account_id):
+    """
+    Parámetros opcionales:
+      from, to  -> rango de fechas ISO (por defecto los últimos 30 días)
+      limit     -> filas por página (máximo DAILY_METRICS_MAX_LIMIT)
+      cursor    -> next_cursor de la página anterior
+      fields    -> lista separada por comas, ej: fields=date,daily_sales
+    """
     try:
         account = MLAccount.query.filter_by(id=account_id, user_id=current_user.id).first()
         
         if not account:
             return jsonify({'message': 'ML account not found'}), 404
         
-        # Obtener métricas de los últimos 30 días
-        thirty_days_ago = datetime.date.today() - datetime.timedelta(days=30)
-        daily_metrics = MLAccountMetrics.query.filter_by(ml_account_id=account.id).filter(
-            MLAccountMetrics.date >= thirty_days_ago
-        ).order_by(MLAccountMetrics.date.desc()).all()
+        try:
+            date_to = datetime.date.fromisoformat(request.args['to']) if request.args.get('to') else None
+            date_from = (datetime.date.fromisoformat(request.args['from']) if request.args.get('from')
+                         else (date_to or datetime.date.today()) - datetime.timedelta(days=30))
+            cursor = decode_metrics_cursor(request.args['cursor']) if request.args.get('cursor') else None
+        except (ValueError, TypeError):
+            return jsonify({'message': 'Invalid from/to/cursor parameter'}), 400
+        
+        limit = request.args.get('limit', DAILY_METRICS_DEFAULT_LIMIT, type=int)
+        limit = max(1, min(limit, DAILY_METRICS_MAX_LIMIT))
+        
+        fields = DAILY_METRICS_FIELDS
+        if request.args.get('fields'):
+            fields = tuple(field.strip() for field in request.args['fields'].split(',') if field.strip())
+            invalid = [field for field in fields if field not in DAILY_METRICS_FIELDS]
+            if invalid:
+                return jsonify({'message': f'Invalid fields: {", ".join(invalid)}'}), 400
+        
+        # Seleccionar solo las columnas necesarias (date e id siempre, para el cursor)
+        selected = dict.fromkeys(('date', 'id') + fields)
+        query = db.session.query(*[daily_metrics_column(name) for name in selected]).filter(
+            MLAccountMetrics.ml_account_id == account.id,
+            MLAccountMetrics.date >= date_from
+        )
+        if date_to:
+            query = query.filter(MLAccountMetrics.date <= date_to)
+        if cursor:
+            query = query.filter(db.tuple_(MLAccountMetrics.date, MLAccountMetrics.id) < cursor)
+        
+        # Pedir una fila extra para saber si hay otra página
+        rows = query.order_by(MLAccountMetrics.date.desc(), MLAccountMetrics.id.desc()).limit(limit + 1).all()
+        has_more = len(rows) > limit
+        rows = rows[:limit]
         
         return jsonify({
             'account_id': account_id,
-            'metrics': [metric.to_dict() for metric in daily_metrics],
-            'total_records': len(daily_metrics)
+            'metrics': [{field: row._mapping[field] for field in fields} for row in rows],
+            'total_records': len(rows),
+            'next_cursor': encode_metrics_cursor(rows[-1].date, rows[-1].id) if has_more else None
         })
     except Exception as e:
         return jsonify({'message': f'Error getting daily metrics: {str(e)}'}), 500
 
+# Tiempo que se guardan los tombstones; un since más viejo requiere sincronización completa
+SYNC_TOMBSTONE_RETENTION = datetime.timedelta(days=int(os.getenv('SYNC_TOMBSTONE_RETENTION_DAYS', '30')))
+
+# Sincronización incremental: solo lo que cambió desde un timestamp
+@app.route('/sync')
+@token_required
+def sync_changes(current_user):
+    """
+    GET /sync?since=<ISO timestamp UTC>
+    Devuelve cuentas y métricas diarias creadas/actualizadas después de since
+    y los IDs de cuentas eliminadas. Sin since (o si es más viejo que la
+    retención de tombstones) devuelve un snapshot completo con full=true.
+    El cliente debe guardar server_time y enviarlo como since la próxima vez.
+    """
+    try:
+        # Tomar la marca antes de consultar para no perder cambios concurrentes
+        server_time = datetime.datetime.utcnow()
+        
+        since = None
+        if request.args.get('since'):
+            try:
+                since = datetime.datetime.fromisoformat(request.args['since'].replace('Z', '+00:00'))
+            except ValueError:
+                return jsonify({'message': 'since must be an ISO 8601 timestamp'}), 400
+            if since.tzinfo is not None:
+                since = since.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+        
+        full = since is None or since < server_time - SYNC_TOMBSTONE_RETENTION
+        
+        accounts_query = db.select(*MLAccount.public_columns(), MLAccount.updated_at).filter(
+            MLAccount.user_id == current_user.id
+        )
+        metrics_query = db.select(
+            *[daily_metrics_column(name) for name in DAILY_METRICS_FIELDS], MLAccountMetrics.updated_at
+        ).join(MLAccount, MLAccount.id == MLAccountMetrics.ml_account_id).filter(
+            MLAccount.user_id == current_user.id
+        )
+        
+        if full:
+            # Snapshot: todas las cuentas y el último mes de métricas
+            metrics_query = metrics_query.filter(
+                MLAccountMetrics.date >= datetime.date.today() - datetime.timedelta(days=30)
+            )
+            deleted_ids = []
+        else:
+            accounts_query = accounts_query.filter(MLAccount.updated_at > since)
+            metrics_query = metrics_query.filter(MLAccountMetrics.updated_at > since)
+            deleted_ids = [row.ml_account_id for row in db.session.query(MLAccountTombstone.ml_account_id).filter(
+                MLAccountTombstone.user_id == current_user.id,
+                MLAccountTombstone.deleted_at > since
+            )]
+        
+        accounts = db.session.execute(accounts_query).mappings().all()
+        metrics = db.session.execute(
+            metrics_query.order_by(MLAccountMetrics.ml_account_id, MLAccountMetrics.date)
+        ).mappings().all()
+        
+        return jsonify({
+            'server_time': server_time.isoformat(),
+            'full': full,
+            'accounts': [dict(row) for row in accounts],
+            'metrics': [dict(row) for row in metrics],
+            'deleted_account_ids': deleted_ids
+        })
+    except Exception as e:
+        return jsonify({'message': f'Error syncing changes: {str(e)}'}), 500
+
+# Distribuidor de eventos LISTEN/NOTIFY (una conexión por proceso)
+live_updates = UpdateBroker(lambda: db.engine.url.render_as_string(hide_password=False))
+
+# Stream SSE con los cambios de cuentas y métricas diarias del usuario
+@app.route('/ml-accounts/stream')
+@token_required
+def stream_ml_accounts(current_user):
+    user_id = current_user.id
+    events = live_updates.subscribe(user_id)
+    
+    def generate():
+        try:
+            yield from sse_events(events)
+        finally:
+            live_updates.unsubscribe(user_id, events)
+    
+    response = app.response_class(generate(), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'  # nginx: no bufferear el stream
+    return response
+
 # Refrescar métricas de todas las cuentas
 @app.route('/ml-accounts/refresh-all-metrics', methods=['POST'])
 @token_required
@@ -440,99 +1433,289 @@ def refresh_all_metrics(current_user):
     try:
         accounts = MLAccount.query.filter_by(user_id=current_user.id, is_active=True).all()
         updated_count = 0
-        
-        for account in accounts:
-            try:
-                metrics = fetch_ml_metrics(account.access_token, account.ml_user_id)
-                
-                account.total_sales = metrics.get('total_sales', 0)
-                account.total_orders = metrics.get('total_orders', 0)
-                account.active_listings = metrics.get('active_listings', 0)
-                account.last_metrics_update = datetime.datetime.utcnow()
-                
-                updated_count += 1
-            except Exception as e:
-                print(f"Error updating metrics for account {account.id}: {e}")
-                continue
+        unchanged_count = 0
+        
+        # Ahorro de las peticiones condicionales en todo el ciclo de refresco
+        with ml_client.track() as usage:
+            for account in accounts:
+                try:
+                    cache.invalidate(f'ml_user:{account.ml_user_id}')
+                    metrics = fetch_ml_metrics(account.access_token, account.ml_user_id)
+                    
+                    if metrics_unchanged(account, metrics):
+                        unchanged_count += 1
+                        continue
+                    
+                    account.total_sales = metrics.get('total_sales', 0)
+                    account.total_orders = metrics.get('total_orders', 0)
+                    account.active_listings = metrics.get('active_listings', 0)
+                    account.last_metrics_update = datetime.datetime.utcnow()
+                    
+                    updated_count += 1
+                except Exception as e:
+                    tracing.log(f"Error updating metrics for account {account.id}: {e}")
+                    continue
         
         db.session.commit()
         
         return jsonify({
             'message': f'Updated metrics for {updated_count} accounts',
             'updated_count': updated_count,
-            'total_accounts': len(accounts)
+            'unchanged_count': unchanged_count,
+            'total_accounts': len(accounts),
+            'conditional': usage.to_dict()
         })
     except Exception as e:
         return jsonify({'message': f'Error refreshing all metrics: {str(e)}'}), 500
 
-def fetch_ml_metrics(access_token, ml_user_id):
-    """Función auxiliar para obtener métricas de ML API"""
+# Serie temporal de métricas para analytics (día, semana o mes)
+@app.route('/analytics/series')
+@token_required
+def get_analytics_series(current_user):
     try:
-        headers = {
-            'Authorization': f'Bearer {access_token}',
-            'User-Agent': 'SmartSelling-App/1.0'
-        }
+        granularity = request.args.get('granularity', 'day')
+        if granularity not in ('day',) + ROLLUP_GRANULARITIES:
+            return jsonify({'message': 'granularity must be day, week or month'}), 400
         
-        # Obtener información del usuario ML
-        try:
-            user_response = requests.get(
-                f'https://api.mercadolibre.com/users/{ml_user_id}', 
-                headers=headers, 
-                timeout=10
-            )
-            user_data = user_response.json() if user_response.status_code == 200 else {}
-            
-            if user_response.status_code == 401:
-                print(f"Token expired for user {ml_user_id}")
-                return {'error': 'token_expired', 'user_data': {}}
-                
-        except requests.exceptions.RequestException as e:
-            print(f"Error fetching user data for {ml_user_id}: {e}")
-            user_data = {}
+        account_id = request.args.get('account_id', type=int)
+        if account_id is not None:
+            account = MLAccount.query.filter_by(id=account_id, user_id=current_user.id).first()
+            if not account:
+                return jsonify({'message': 'ML account not found'}), 404
         
-        # Obtener publicaciones activas
         try:
-            items_response = requests.get(
-                f'https://api.mercadolibre.com/users/{ml_user_id}/items/search?status=active&limit=1', 
-                headers=headers, 
-                timeout=10
-            )
-            items_data = items_response.json() if items_response.status_code == 200 else {}
-            active_listings = items_data.get('paging', {}).get('total', 0)
-        except requests.exceptions.RequestException as e:
-            print(f"Error fetching items for {ml_user_id}: {e}")
-            active_listings = 0
+            date_to = datetime.date.fromisoformat(request.args['to']) if request.args.get('to') else datetime.date.today()
+            default_days = {'day': 30, 'week': 7 * 26, 'month': 365 * 2}[granularity]
+            date_from = (datetime.date.fromisoformat(request.args['from']) if request.args.get('from')
+                         else date_to - datetime.timedelta(days=default_days))
+        except ValueError:
+            return jsonify({'message': 'from/to must be ISO dates (YYYY-MM-DD)'}), 400
+        
+        series = load_analytics_series(current_user.id, granularity, account_id, date_from, date_to)
         
-        # Para órdenes, usar endpoint más simple por ahora
+        return jsonify({
+            'granularity': granularity,
+            'account_id': account_id,
+            'from': date_from.isoformat(),
+            'to': date_to.isoformat(),
+            'series': series
+        })
+    except Exception as e:
+        return jsonify({'message': f'Error getting analytics series: {str(e)}'}), 500
+
+@cache.memoize('analytics_series', ttl=ANALYTICS_CACHE_TTL, tags=lambda user_id, *args: [f'user:{user_id}'])
+def load_analytics_series(user_id, granularity, account_id, date_from, date_to):
+    """Serie agregada de métricas (cacheada por usuario y rango)"""
+    if granularity == 'day':
+        # Nivel diario: leer directamente de ml_account_metrics
+        query = db.session.query(
+            MLAccountMetrics.date.label('period_start'),
+            db.func.sum(MLAccountMetrics.daily_sales).label('sales'),
+            db.func.sum(MLAccountMetrics.daily_orders).label('orders'),
+            db.func.sum(MLAccountMetrics.daily_views).label('views'),
+            db.func.sum(MLAccountMetrics.daily_questions).label('questions')
+        ).join(MLAccount, MLAccount.id == MLAccountMetrics.ml_account_id).filter(
+            MLAccount.user_id == user_id,
+            MLAccountMetrics.date >= date_from,
+            MLAccountMetrics.date <= date_to
+        )
+        if account_id is not None:
+            query = query.filter(MLAccountMetrics.ml_account_id == account_id)
+        rows = query.group_by(MLAccountMetrics.date).order_by(MLAccountMetrics.date).all()
+    else:
+        # Semana/mes: leer el rollup ya agregado
+        model = MLAccountMetricsRollup if account_id is not None else UserMetricsRollup
+        query = db.session.query(
+            model.period_start, model.sales, model.orders, model.views, model.questions
+        ).filter(
+            model.user_id == user_id,
+            model.granularity == granularity,
+            model.period_start >= rollup_period_start(date_from, granularity),
+            model.period_start <= date_to
+        )
+        if account_id is not None:
+            query = query.filter(model.ml_account_id == account_id)
+        rows = query.order_by(model.period_start).all()
+    
+    return [{
+        'period_start': row.period_start.isoformat(),
+        'sales': float(row.sales or 0),
+        'orders': int(row.orders or 0),
+        'views': int(row.views or 0),
+        'questions': int(row.questions or 0)
+    } for row in rows]
+
+# Resumen de analytics: totales, promedios móviles, crecimiento y participación por cuenta
+@app.route('/analytics/summary')
+@token_required
+def get_analytics_summary(current_user):
+    try:
         try:
-            # Solo obtener el conteo básico, no todas las órdenes
-            orders_response = requests.get(
-                f'https://api.mercadolibre.com/users/{ml_user_id}', 
-                headers=headers, 
-                timeout=10
-            )
-            orders_data = orders_response.json() if orders_response.status_code == 200 else {}
-            # Por ahora usar datos del perfil como aproximación
-            total_orders = orders_data.get('seller_reputation', {}).get('transactions', {}).get('completed', 0)
-            total_sales = 0  # Calcular desde órdenes reales requiere más endpoints
-        except requests.exceptions.RequestException as e:
-            print(f"Error fetching order data for {ml_user_id}: {e}")
-            total_orders = 0
-            total_sales = 0
+            date_to = datetime.date.fromisoformat(request.args['to']) if request.args.get('to') else datetime.date.today()
+            date_from = (datetime.date.fromisoformat(request.args['from']) if request.args.get('from')
+                         else date_to - datetime.timedelta(days=29))
+        except ValueError:
+            return jsonify({'message': 'from/to must be ISO dates (YYYY-MM-DD)'}), 400
+        if date_from > date_to or (date_to - date_from).days >= analytics.MAX_DAYS:
+            return jsonify({'message': f'from must be before to and the range at most {analytics.MAX_DAYS} days'}), 400
+        
+        summary = load_analytics_summary(current_user.id, date_from, date_to)
+        
+        return jsonify({
+            'from': date_from.isoformat(),
+            'to': date_to.isoformat(),
+            **summary
+        })
+    except Exception as e:
+        return jsonify({'message': f'Error getting analytics summary: {str(e)}'}), 500
+
+@cache.memoize('analytics_summary', ttl=ANALYTICS_CACHE_TTL, tags=lambda user_id, *args: [f'user:{user_id}'])
+def load_analytics_summary(user_id, date_from, date_to):
+    """Resumen vectorizado de todas las cuentas activas (cacheado por usuario y rango)"""
+    with tracing.span('analytics.load_frame', user_id=user_id):
+        frame = analytics.load_frame(db.session, user_id, date_from, date_to)
+    with tracing.span('analytics.summarize', engine=analytics.ENGINE, accounts=len(frame.accounts)):
+        return analytics.summarize(frame, date_from)
+
+# ============= EXPORTACIÓN =============
+
+def export_filters(current_user):
+    """Parámetros comunes de /export/*: (formato, cuenta, desde, hasta) o una respuesta de error"""
+    fmt = request.args.get('format', 'csv')
+    if fmt not in exports.FORMATS:
+        return None, (jsonify({'message': 'format must be csv or ndjson'}), 400)
+    
+    account_id = request.args.get('account_id', type=int)
+    if account_id is not None:
+        account = MLAccount.query.filter_by(id=account_id, user_id=current_user.id).first()
+        if not account:
+            return None, (jsonify({'message': 'ML account not found'}), 404)
+    
+    try:
+        date_from = datetime.date.fromisoformat(request.args['from']) if request.args.get('from') else None
+        date_to = datetime.date.fromisoformat(request.args['to']) if request.args.get('to') else None
+    except ValueError:
+        return None, (jsonify({'message': 'from/to must be ISO dates (YYYY-MM-DD)'}), 400)
+    
+    return (fmt, account_id, date_from, date_to), None
+
+# Historial completo de métricas diarias (CSV o NDJSON en streaming)
+@app.route('/export/metrics')
+@token_required
+def export_metrics(current_user):
+    filters, error = export_filters(current_user)
+    if error:
+        return error
+    fmt, account_id, date_from, date_to = filters
+    
+    columns = ('ml_account_id', 'ml_nickname', 'date', 'daily_sales', 'daily_orders', 'daily_views', 'daily_questions')
+    statement = db.select(
+        MLAccountMetrics.ml_account_id, MLAccount.ml_nickname, MLAccountMetrics.date,
+        MLAccountMetrics.daily_sales, MLAccountMetrics.daily_orders,
+        MLAccountMetrics.daily_views, MLAccountMetrics.daily_questions
+    ).join(MLAccount, MLAccount.id == MLAccountMetrics.ml_account_id).where(MLAccount.user_id == current_user.id)
+    if account_id is not None:
+        statement = statement.where(MLAccountMetrics.ml_account_id == account_id)
+    if date_from:
+        statement = statement.where(MLAccountMetrics.date >= date_from)
+    if date_to:
+        statement = statement.where(MLAccountMetrics.date <= date_to)
+    statement = statement.order_by(MLAccountMetrics.ml_account_id, MLAccountMetrics.date)
+    
+    return exports.export_response(db.session, statement, columns, fmt, 'metrics', app.json.dumps)
+
+# Órdenes espejadas de ML (CSV o NDJSON en streaming)
+@app.route('/export/orders')
+@token_required
+def export_orders(current_user):
+    filters, error = export_filters(current_user)
+    if error:
+        return error
+    fmt, account_id, date_from, date_to = filters
+    
+    columns = ('ml_account_id', 'ml_order_id', 'status', 'total_amount', 'currency_id', 'buyer_id', 'date_created')
+    statement = db.select(
+        MLOrder.ml_account_id, MLOrder.ml_order_id, MLOrder.status, MLOrder.total_amount,
+        MLOrder.currency_id, MLOrder.buyer_id, MLOrder.date_created
+    ).join(MLAccount, MLAccount.id == MLOrder.ml_account_id).where(MLAccount.user_id == current_user.id)
+    if account_id is not None:
+        statement = statement.where(MLOrder.ml_account_id == account_id)
+    if date_from:
+        statement = statement.where(MLOrder.date_created >= date_from)
+    if date_to:
+        statement = statement.where(MLOrder.date_created < date_to + datetime.timedelta(days=1))
+    statement = statement.order_by(MLOrder.date_created, MLOrder.id)
+    
+    return exports.export_response(db.session, statement, columns, fmt, 'orders', app.json.dumps)
+
+@cache.memoize('ml_user_profile', ttl=ML_PROFILE_CACHE_TTL,
+               tags=lambda access_token, ml_user_id: [f'ml_user:{ml_user_id}'],
+               cache_if=lambda result: result[0] == 200)
+def fetch_ml_user_profile(access_token, ml_user_id):
+    """Perfil del usuario ML: (status_code, ml_models.UserProfile o None). Solo se cachean los 200."""
+    response = ml_client.get(f'/users/{ml_user_id}', access_token)
+    return response.status_code, (ml_models.UserProfile.from_json(response.json()) if response.status_code == 200 else None)
+
+@cache.memoize('ml_active_listings', ttl=ML_PROFILE_CACHE_TTL,
+               tags=lambda access_token, ml_user_id: [f'ml_user:{ml_user_id}'],
+               cache_if=lambda result: result[0] == 200)
+def fetch_ml_active_listings(access_token, ml_user_id):
+    """Cantidad de publicaciones activas: (status_code, total). Solo se cachean los 200."""
+    response = ml_client.get(f'/users/{ml_user_id}/items/search', access_token,
+                             params={'status': 'active', 'limit': 1})
+    if response.status_code != 200:
+        return response.status_code, 0
+    return response.status_code, ml_models.Paging.from_json(response.json().get('paging')).total
+
+def fetch_ml_metrics(access_token, ml_user_id):
+    """
+    Función auxiliar para obtener métricas de ML API (sub-llamadas cacheadas).
+    not_modified=True si ML respondió 304 a todas las llamadas: nada cambió.
+    """
+    try:
+        # Medir las peticiones condicionales (ETag/Last-Modified) de este fetch
+        with ml_client.track() as usage:
+            # Obtener información del usuario ML
+            try:
+                with tracing.span('ml.user_profile', ml_user_id=str(ml_user_id)):
+                    status_code, profile = fetch_ml_user_profile(access_token, ml_user_id)
+                
+                if status_code == 401:
+                    tracing.log(f"Token expired for user {ml_user_id}")
+                    return {'error': 'token_expired', 'profile': None}
+                    
+            except requests.exceptions.RequestException as e:
+                tracing.log(f"Error fetching user data for {ml_user_id}: {e}")
+                profile = None
+            
+            # Obtener publicaciones activas
+            try:
+                with tracing.span('ml.active_listings', ml_user_id=str(ml_user_id)):
+                    _, active_listings = fetch_ml_active_listings(access_token, ml_user_id)
+            except requests.exceptions.RequestException as e:
+                tracing.log(f"Error fetching items for {ml_user_id}: {e}")
+                active_listings = 0
+        
+        # Para órdenes, usar los datos del perfil como aproximación
+        # (el mismo /users/{id} de arriba, no hace falta pedirlo dos veces)
+        total_orders = profile.completed_transactions if profile else 0
+        total_sales = 0  # Calcular desde órdenes reales requiere más endpoints
         
         return {
             'total_sales': float(total_sales),
             'total_orders': int(total_orders),
             'active_listings': int(active_listings),
-            'user_data': user_data
+            'profile': profile,
+            'not_modified': usage.all_not_modified,
+            'conditional': usage.to_dict()
         }
     except Exception as e:
-        print(f"Error fetching ML metrics: {e}")
+        tracing.log(f"Error fetching ML metrics: {e}")
         return {
             'total_sales': 0.0,
             'total_orders': 0,
             'active_listings': 0,
-            'user_data': {}
+            'profile': None
         }
 
 # Ruta de inicio
@@ -569,12 +1752,23 @@ def home():
             'login': 'POST /login',
             'profile': 'GET /profile (requiere token)',
             'ml_accounts': 'GET /ml-accounts (requiere token)',
+            'combined_metrics': 'GET /ml-accounts/combined-metrics?from=&to= (requiere token)',
+            'ml_accounts_bulk': 'POST /ml-accounts/bulk (requiere token)',
+            'analytics_series': 'GET /analytics/series?granularity=day|week|month (requiere token)',
+            'analytics_summary': 'GET /analytics/summary?from=&to= (requiere token)',
+            'export_metrics': 'GET /export/metrics?format=csv|ndjson (requiere token)',
+            'export_orders': 'GET /export/orders?format=csv|ndjson (requiere token)',
+            'sync_orders': 'POST /ml-accounts/<id>/sync-orders (requiere token)',
+            'top_items': 'GET /ml-accounts/<id>/top-items?window=7|30|90&sort=units|revenue (requiere token)',
+            'ml_accounts_stream': 'GET /ml-accounts/stream (SSE, requiere token)',
+            'sync': 'GET /sync?since=<timestamp> (requiere token)',
             'ml_auth': 'GET /mercadolibre/auth (requiere token)',
             'ml_callback': 'GET /mercadolibre/callback (requiere token)',
             'ml_loading': 'GET /loading (callback ML)',
             'ml_data': 'GET /mercadolibre/data (requiere token)',
             'ml_refresh': 'POST /mercadolibre/refresh (requiere token)',
-            'logout': 'POST /logout (requiere token)'
+            'logout': 'POST /logout (requiere token)',
+            'metrics': 'GET /metrics (formato Prometheus)'
         },
         'config': {
             'ml_client_id': CLIENT_ID,
@@ -688,6 +1882,7 @@ def login():
 # Perfil del usuario (ruta protegida)
 @app.route('/profile', methods=['GET'])
 @token_required
+@etag_cached(profile_etag)
 def profile(current_user):
     return jsonify({
         'user_id': current_user.id,
@@ -701,7 +1896,7 @@ def profile(current_user):
 @app.route('/mercadolibre/auth')
 @token_required
 def ml_auth(current_user):
-    auth_url = f"https://auth.mercadolibre.com.ar/authorization?response_type=code&client_id={CLIENT_ID}&redirect_uri={REDIRECT_URI}"
+    auth_url = f"{ML_AUTH_URL}?response_type=code&client_id={CLIENT_ID}&redirect_uri={REDIRECT_URI}"
     return jsonify({
         'auth_url': auth_url,
         'message': 'Redirect user to this URL to authorize Mercado Libre access'
@@ -718,7 +1913,6 @@ def ml_callback(current_user):
             return jsonify({'message': 'No authorization code provided'}), 400
 
         # Intercambiar código por tokens
-        url = 'https://api.mercadolibre.com/oauth/token'
         payload = {
             'grant_type': 'authorization_code',
             'client_id': CLIENT_ID,
@@ -727,7 +1921,7 @@ def ml_callback(current_user):
             'redirect_uri': REDIRECT_URI
         }
 
-        response = requests.post(url, data=payload)
+        response = ml_client.post('/oauth/token', data=payload)
         
         if response.status_code != 200:
             return jsonify({
@@ -761,27 +1955,24 @@ def ml_callback(current_user):
             })
         
         # Obtener información del usuario de ML
-        headers = {'Authorization': f'Bearer {data["access_token"]}'}
-        user_response = requests.get(f'https://api.mercadolibre.com/users/{ml_user_id}', headers=headers)
+        user_response = ml_client.get(f'/users/{ml_user_id}', data['access_token'])
         
-        user_info = {}
-        if user_response.status_code == 200:
-            user_info = user_response.json()
+        profile = ml_models.UserProfile.from_json(user_response.json() if user_response.status_code == 200 else {})
 
         # Crear nueva cuenta ML
         new_account = MLAccount(
             user_id=current_user.id,
             ml_user_id=ml_user_id,
-            ml_nickname=user_info.get('nickname', f'ml_{ml_user_id}'),
-            ml_first_name=user_info.get('first_name'),
-            ml_last_name=user_info.get('last_name'),
-            ml_email=user_info.get('email'),
-            ml_country_id=user_info.get('country_id'),
-            ml_site_id=user_info.get('site_id'),
+            ml_nickname=profile.nickname or f'ml_{ml_user_id}',
+            ml_first_name=profile.first_name,
+            ml_last_name=profile.last_name,
+            ml_email=profile.email,
+            ml_country_id=profile.country_id,
+            ml_site_id=profile.site_id,
             access_token=data['access_token'],
             refresh_token=data['refresh_token'],
             is_active=True,
-            account_alias=f"Cuenta ML - {user_info.get('nickname', ml_user_id)}"
+            account_alias=f"Cuenta ML - {profile.nickname or ml_user_id}"
         )
         
         db.session.add(new_account)
@@ -822,7 +2013,6 @@ def ml_loading():
                                  error="No se recibió código de autorización")
 
         # Intercambiar código por tokens
-        url = 'https://api.mercadolibre.com/oauth/token'
         payload = {
             'grant_type': 'authorization_code',
             'client_id': CLIENT_ID,
@@ -831,7 +2021,7 @@ def ml_loading():
             'redirect_uri': REDIRECT_URI
         }
 
-        response = requests.post(url, data=payload)
+        response = ml_client.post('/oauth/token', data=payload)
         
         if response.status_code != 200:
             return render_template('loading.html', 
@@ -888,24 +2078,24 @@ def save_ml_tokens(current_user):
             
             account = existing_account
         else:
-            # Obtener datos del usuario ML
-            headers = {'Authorization': f'Bearer {access_token}'}
+            # Obtener datos del usuario ML (cliente compartido, con timeout)
             try:
-                user_response = requests.get(f'https://api.mercadolibre.com/users/{ml_user_id}', headers=headers)
+                user_response = ml_client.get(f'/users/{ml_user_id}', access_token)
                 user_data = user_response.json() if user_response.status_code == 200 else {}
             except:
                 user_data = {}
+            profile = ml_models.UserProfile.from_json(user_data)
             
             # Crear nueva cuenta ML
             account = MLAccount(
                 user_id=current_user.id,
                 ml_user_id=ml_user_id,
-                ml_nickname=user_data.get('nickname', f'Cuenta ML {ml_user_id}'),
-                ml_first_name=user_data.get('first_name'),
-                ml_last_name=user_data.get('last_name'),
-                ml_email=user_data.get('email'),
-                ml_country_id=user_data.get('country_id'),
-                ml_site_id=user_data.get('site_id'),
+                ml_nickname=profile.nickname or f'Cuenta ML {ml_user_id}',
+                ml_first_name=profile.first_name,
+                ml_last_name=profile.last_name,
+                ml_email=profile.email,
+                ml_country_id=profile.country_id,
+                ml_site_id=profile.site_id,
                 access_token=access_token,
                 refresh_token=refresh_token,
                 token_expires_at=datetime.datetime.utcnow() + datetime.timedelta(hours=6),
@@ -931,6 +2121,178 @@ def save_ml_tokens(current_user):
         db.session.rollback()
         return jsonify({'message': f'Error saving ML account: {str(e)}'}), 500
 
+def fetch_ml_token_owner(access_token):
+    """Perfil de la cuenta dueña del token (/users/me): (status_code, UserProfile o None). Sin caché."""
+    response = ml_client.get('/users/me', access_token)
+    return response.status_code, (ml_models.UserProfile.from_json(response.json()) if response.status_code == 200 else None)
+
+def fetch_ml_token_owners(accounts):
+    """
+    Dueño de cada token en paralelo con el cliente compartido (pool y timeout).
+    accounts: [(ml_user_id, access_token)] -> {ml_user_id: (status_code, UserProfile o None)}.
+    status_code es None si la llamada falló (timeout, conexión).
+    """
+    def fetch(carrier, ml_user_id, access_token):
+        with tracing.continue_trace(carrier, 'ml.fetch_token_owner', **{'ml.user_id': ml_user_id}):
+            try:
+                return fetch_ml_token_owner(access_token)
+            except requests.exceptions.RequestException as e:
+                tracing.log(f"Error fetching user data for {ml_user_id}: {e}")
+                return None, None
+    
+    workers = max(1, min(BULK_ACCOUNTS_CONCURRENCY, len(accounts)))
+    # Cada hilo continúa la traza del request: los spans de las llamadas a ML quedan dentro
+    carrier = tracing.inject()
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='ml-profiles') as executor:
+        futures = {ml_user_id: executor.submit(fetch, carrier, ml_user_id, access_token)
+                   for ml_user_id, access_token in accounts}
+        return {ml_user_id: future.result() for ml_user_id, future in futures.items()}
+
+def validate_bulk_account(entry, seen):
+    """Error de una entrada de /ml-accounts/bulk, o None si es válida"""
+    if not isinstance(entry, dict) or not entry.get('access_token'):
+        return 'Access token required'
+    ml_user_id = str(entry.get('user_id', ''))
+    if not ml_user_id.isdigit():
+        return 'ML User ID required'
+    if ml_user_id in seen:
+        return 'Duplicated ML User ID in request'
+    columns = {'access_token': MLAccount.access_token, 'refresh_token': MLAccount.refresh_token,
+               'alias': MLAccount.account_alias}
+    for name, column in columns.items():
+        value = entry.get(name)
+        if value is not None and (not isinstance(value, str) or len(value) > column.type.length):
+            return f'Invalid {name}'
+    return None
+
+# Vincular muchas cuentas ML de una vez (agencias): un INSERT para todas
+@app.route('/ml-accounts/bulk', methods=['POST'])
+@token_required
+def bulk_link_ml_accounts(current_user):
+    """
+    Body: {"accounts": [{"user_id", "access_token", "refresh_token", "alias"}, ...]}
+    Devuelve un resultado por cuenta, en el mismo orden: created, updated o error.
+    """
+    from sqlalchemy.dialects.postgresql import insert
+    
+    try:
+        entries = (request.get_json(silent=True) or {}).get('accounts')
+        if not isinstance(entries, list) or not entries:
+            return jsonify({'message': 'accounts list required'}), 400
+        if len(entries) > BULK_ACCOUNTS_MAX:
+            return jsonify({'message': f'At most {BULK_ACCOUNTS_MAX} accounts per request'}), 400
+        
+        results = [None] * len(entries)
+        valid, seen = [], set()
+        for index, entry in enumerate(entries):
+            error = validate_bulk_account(entry, seen)
+            ml_user_id = str(entry.get('user_id', '')) if isinstance(entry, dict) else ''
+            if error:
+                results[index] = {'index': index, 'ml_user_id': ml_user_id or None, 'status': 'error', 'message': error}
+                continue
+            seen.add(ml_user_id)
+            valid.append((index, ml_user_id, entry))
+        
+        with tracing.span('ml.users_me', accounts=len(valid)):
+            profiles = fetch_ml_token_owners([(ml_user_id, entry['access_token']) for _, ml_user_id, entry in valid])
+        
+        now = datetime.datetime.utcnow()
+        rows, linked = [], []
+        for index, ml_user_id, entry in valid:
+            status_code, profile = profiles[ml_user_id]
+            # El token tiene que ser de la cuenta indicada: si no, se podría vincular un
+            # user_id ajeno con un token propio. Sin respuesta de ML no se puede verificar.
+            error = None
+            if status_code == 401:
+                error = 'Token rejected by Mercado Libre'
+            elif profile is None:
+                error = 'Could not verify the token with Mercado Libre, retry later'
+            elif profile.id != ml_user_id:
+                error = 'Token belongs to another Mercado Libre account'
+            if error:
+                results[index] = {'index': index, 'ml_user_id': ml_user_id, 'status': 'error', 'message': error}
+                continue
+            rows.append({
+                'user_id': current_user.id,
+                'ml_user_id': ml_user_id,
+                'ml_nickname': profile.nickname or f'Cuenta ML {ml_user_id}',
+                'ml_first_name': profile.first_name,
+                'ml_last_name': profile.last_name,
+                'ml_email': profile.email,
+                'ml_country_id': profile.country_id,
+                'ml_site_id': profile.site_id,
+                'access_token': entry['access_token'],
+                'refresh_token': entry.get('refresh_token'),
+                'token_expires_at': now + datetime.timedelta(hours=6),
+                'is_active': True,
+                'account_alias': entry.get('alias') or f'Cuenta ML - {profile.nickname or ml_user_id}',
+                'created_at': now,
+                'updated_at': now
+            })
+            linked.append((index, ml_user_id))
+        
+        stored = {}
+        if rows:
+            statement = insert(MLAccount).values(rows)
+            # Cuentas ya vinculadas: solo tokens y reactivación (como save-tokens), y nunca
+            # si pertenecen a otro usuario (esas filas no vuelven en RETURNING)
+            statement = statement.on_conflict_do_update(
+                index_elements=['ml_user_id'],
+                set_={
+                    'access_token': statement.excluded.access_token,
+                    'refresh_token': statement.excluded.refresh_token,
+                    'token_expires_at': statement.excluded.token_expires_at,
+                    'is_active': True,
+                    'updated_at': statement.excluded.updated_at
+                },
+                where=MLAccount.user_id == statement.excluded.user_id
+            ).returning(MLAccount.id, MLAccount.ml_user_id, db.literal_column('(xmax = 0)').label('created'))
+            with tracing.span('db.insert_accounts', accounts=len(rows)):
+                stored = {row.ml_user_id: row for row in db.session.execute(statement)}
+        
+        updated = [ml_user_id for ml_user_id, row in stored.items() if not row.created]
+        if stored:
+            # El INSERT no pasa por los eventos del ORM: invalidar la caché a mano
+            # (user_daily_metrics la mantiene el trigger de ml_accounts al reactivar)
+            invalidate_after_commit(f'user:{current_user.id}', *(f'ml_user:{ml_user_id}' for ml_user_id in updated))
+            
+            # Compatibilidad con la versión anterior: tokens de la primera cuenta en el usuario
+            if not current_user.ml_access_token:
+                first = next(row for row in rows if row['ml_user_id'] in stored)
+                current_user.ml_access_token = first['access_token']
+                current_user.ml_refresh_token = first['refresh_token']
+                current_user.ml_user_id = first['ml_user_id']
+        
+        db.session.commit()
+        
+        accounts = {row['ml_user_id']: dict(row) for row in db.session.execute(
+            db.select(*MLAccount.public_columns()).where(MLAccount.id.in_([row.id for row in stored.values()]))
+        ).mappings()} if stored else {}
+        for index, ml_user_id in linked:
+            if ml_user_id not in stored:
+                results[index] = {'index': index, 'ml_user_id': ml_user_id, 'status': 'error',
+                                  'message': 'This ML account is already linked to another user'}
+                continue
+            results[index] = {
+                'index': index,
+                'ml_user_id': ml_user_id,
+                'status': 'created' if stored[ml_user_id].created else 'updated',
+                'account': accounts[ml_user_id]
+            }
+        
+        created = sum(1 for result in results if result['status'] == 'created')
+        return jsonify({
+            'message': f'Linked {len(stored)} of {len(entries)} ML accounts',
+            'created': created,
+            'updated': len(stored) - created,
+            'failed': len(entries) - len(stored),
+            'results': results
+        })
+    except Exception as e:
+        db.session.rollback()
+        tracing.log(f"Error in bulk ML account link for user {current_user.id}: {e}")
+        return jsonify({'message': f'Error linking ML accounts: {str(e)}'}), 500
+
 # Ruta protegida que usa el token de Mercado Libre para consultar datos
 @app.route('/mercadolibre/data')
 @token_required
@@ -939,12 +2301,8 @@ def ml_data(current_user):
         if not current_user.ml_access_token:
             return jsonify({'message': 'Mercado Libre not linked'}), 400
 
-        headers = {
-            'Authorization': f'Bearer {current_user.ml_access_token}'
-        }
-
         # Obtener datos del perfil de ML
-        ml_response = requests.get('https://api.mercadolibre.com/users/me', headers=headers)
+        ml_response = ml_client.get('/users/me', current_user.ml_access_token)
 
         if ml_response.status_code == 401:
             return jsonify({
@@ -973,7 +2331,6 @@ def ml_refresh_token(current_user):
         if not current_user.ml_refresh_token:
             return jsonify({'message': 'No refresh token available'}), 400
 
-        url = 'https://api.mercadolibre.com/oauth/token'
         payload = {
             'grant_type': 'refresh_token',
             'client_id': CLIENT_ID,
@@ -981,7 +2338,7 @@ def ml_refresh_token(current_user):
             'refresh_token': current_user.ml_refresh_token
         }
 
-        response = requests.post(url, data=payload)
+        response = ml_client.post('/oauth/token', data=payload)
         
         if response.status_code != 200:
             return jsonify({
@@ -1042,8 +2399,8 @@ def init_database():
     """
     try:
         with app.app_context():
-            # Crear todas las tablas
-            db.create_all()
+            # Crear tablas, particiones y triggers
+            partitions = setup_database()
             
             # Verificar tablas creadas
             from sqlalchemy import text
@@ -1056,6 +2413,7 @@ def init_database():
             return jsonify({
                 'message': 'Database initialized successfully',
                 'tables_created': table_names,
+                'metrics_partitions': partitions,
                 'database_url': f'postgresql://{DB_USER}:***@{DB_HOST}:{DB_PORT}/{DB_NAME}'
             })
     except Exception as e:
@@ -1083,15 +2441,24 @@ def health_check():
         'database': db_status,
         'environment': os.getenv('FLASK_ENV', 'production'),
         'ml_client_configured': bool(CLIENT_ID and CLIENT_SECRET),
+        'cache': cache.info(),
+        'ml_api': ml_client.stats(),
         'frontend_url': FRONTEND_URL,
         'api_url': API_URL,
         'timestamp': datetime.datetime.utcnow().isoformat()
     })
 
+# Métricas para Prometheus (por proceso: con varios workers, scrapear cada uno)
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    if not telemetry.authorized(request):
+        return jsonify({'message': 'Unauthorized'}), 401
+    return app.response_class(telemetry.registry.render(), content_type=telemetry.CONTENT_TYPE)
+
 if __name__ == '__main__':
     with app.app_context():
         try:
-            db.create_all()
+            setup_database()
             print("Database tables created successfully!")
             print(f"Database: postgresql://{DB_USER}:***@{DB_HOST}:{DB_PORT}/{DB_NAME}")
             print(f"ML Client ID: {CLIENT_ID}")
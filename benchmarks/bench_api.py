@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+"""
+Benchmarks de los endpoints más usados de la API
+Corre contra un PostgreSQL local (variables DB_*) y la API de ML falsa
+(ml_stub_server.py levantado en el mismo proceso), así que no usa red.
+
+Uso:
+    DB_NAME=smartselling_bench python benchmarks/bench_api.py --accounts 10
+    python benchmarks/bench_api.py --save-baseline benchmarks/baseline.json
+    python benchmarks/bench_api.py --baseline benchmarks/baseline.json --threshold 0.15
+
+Escribe los resultados en JSON (--output) y termina con código 1 si algún
+caso empeora su mediana más que --threshold respecto de --baseline.
+"""
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from decimal import Decimal
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+from ml_stub_server import FIRST_USER_ID, access_token_for, start_stub_server
+
+DEFAULT_OUTPUT = os.path.join(ROOT, 'benchmarks', 'results', 'bench_api.json')
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    index = min(int(round(fraction * (len(ordered) - 1))), len(ordered) - 1)
+    return ordered[index]
+
+
+def run_case(name, func, iterations, warmup, setup=None):
+    """Medir func (sin contar setup) y devolver estadísticas en milisegundos"""
+    timings = []
+    for i in range(warmup + iterations):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        func()
+        elapsed = (time.perf_counter() - start) * 1000
+        if i >= warmup:
+            timings.append(elapsed)
+
+    result = {
+        'iterations': iterations,
+        'min_ms': round(min(timings), 3),
+        'median_ms': round(statistics.median(timings), 3),
+        'p95_ms': round(percentile(timings, 0.95), 3),
+        'mean_ms': round(statistics.mean(timings), 3),
+        'stdev_ms': round(statistics.stdev(timings), 3) if len(timings) > 1 else 0.0
+    }
+    print(f"  {name:<42} mediana {result['median_ms']:8.2f} ms   p95 {result['p95_ms']:8.2f} ms")
+    return result
+
+
+def expect_ok(response):
+    if response.status_code >= 400:
+        raise RuntimeError(f'{response.request.path} -> {response.status_code}: {response.get_data(as_text=True)[:300]}')
+    return response
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline, threshold):
+    """Casos cuya mediana empeoró más que threshold (fracción) contra la línea base"""
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get('results', {}).get(name)
+        if not previous:
+            continue
+        change = current['median_ms'] / previous['median_ms'] - 1 if previous['median_ms'] else 0
+        current['change_vs_baseline'] = round(change, 4)
+        if change > threshold:
+            regressions.append((name, previous['median_ms'], current['median_ms'], change))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmarks de la API de SmartSelling')
+    parser.add_argument('--accounts', type=int, default=10, help='cuentas ML del usuario de prueba')
+    parser.add_argument('--days', type=int, default=90, help='días de métricas por cuenta')
+    parser.add_argument('--iterations', type=int, default=30)
+    parser.add_argument('--warmup', type=int, default=3)
+    parser.add_argument('--ml-latency-ms', type=float, default=0.0, help='latencia simulada de la API de ML')
+    parser.add_argument('--output', default=DEFAULT_OUTPUT)
+    parser.add_argument('--baseline', help='JSON de una corrida anterior para detectar regresiones')
+    parser.add_argument('--threshold', type=float, default=0.15, help='regresión máxima tolerada (0.15 = 15%%)')
+    parser.add_argument('--save-baseline', help='guardar además los resultados como línea base')
+    args = parser.parse_args()
+
+    # El stub tiene que estar levantado antes de importar la app (ML_API_URL se lee al importar)
+    stub_url, stub_server = start_stub_server({'users': max(args.accounts, 1), 'latency_ms': args.ml_latency_ms})
+    os.environ['ML_API_URL'] = stub_url
+
+    import jwt
+    from app import app, db, User, MLAccount, MLAccountMetrics, setup_database
+    from metrics_partitions import ensure_partitions
+
+    results = {}
+    with app.app_context():
+        setup_database()
+
+        # ----- Datos de prueba -----
+        username = f'bench_{int(time.time())}'
+        user = User(username=username)
+        user.set_password('bench-password')
+        db.session.add(user)
+        db.session.flush()
+        user.token = jwt.encode({
+            'user_id': user.id,
+            'exp': datetime.datetime.utcnow() + datetime.timedelta(days=1)
+        }, app.config['SECRET_KEY'], algorithm='HS256')
+
+        accounts = []
+        for index in range(args.accounts):
+            ml_user_id = FIRST_USER_ID + index
+            accounts.append(MLAccount(
+                user_id=user.id, ml_user_id=str(ml_user_id), ml_nickname=f'STUBSELLER{ml_user_id}',
+                access_token=access_token_for(ml_user_id), is_active=True,
+                token_expires_at=datetime.datetime.utcnow() + datetime.timedelta(hours=6)
+            ))
+        db.session.add_all(accounts)
+        db.session.flush()
+
+        today = datetime.date.today()
+        ensure_partitions(db.session, start=today - datetime.timedelta(days=args.days))
+        db.session.execute(MLAccountMetrics.__table__.insert(), [
+            {'ml_account_id': account.id, 'date': today - datetime.timedelta(days=day),
+             'daily_sales': Decimal(1000 + day), 'daily_orders': day % 9, 'daily_views': 100 + day,
+             'daily_questions': day % 4}
+            for account in accounts for day in range(1, args.days + 1)
+        ])
+        db.session.commit()
+
+        account_ids = [account.id for account in accounts]
+        headers = {'x-access-token': user.token}
+        client = app.test_client()
+        first = account_ids[0]
+
+        def new_sale():
+            # Cambia el perfil en el stub: el próximo refresco no recibe 304
+            requests.post(f'{stub_url}/_stub/users/{FIRST_USER_ID}/sale', timeout=5)
+
+        print(f'🏁 {args.accounts} cuentas × {args.days} días, {args.iterations} iteraciones '
+              f'(+{args.warmup} de calentamiento), latencia ML {args.ml_latency_ms} ms')
+
+        try:
+            results['token_required (/profile)'] = run_case(
+                'token_required (/profile)',
+                lambda: expect_ok(client.get('/profile', headers=headers)),
+                args.iterations, args.warmup)
+            results['GET /ml-accounts'] = run_case(
+                'GET /ml-accounts',
+                lambda: expect_ok(client.get('/ml-accounts', headers=headers)),
+                args.iterations, args.warmup)
+            results['GET /daily-metrics (30 días)'] = run_case(
+                'GET /daily-metrics (30 días)',
+                lambda: expect_ok(client.get(f'/ml-accounts/{first}/daily-metrics', headers=headers)),
+                args.iterations, args.warmup)
+            results['POST /refresh-metrics (cambió)'] = run_case(
+                'POST /refresh-metrics (cambió)',
+                lambda: expect_ok(client.post(f'/ml-accounts/{first}/refresh-metrics', headers=headers)),
+                args.iterations, args.warmup, setup=new_sale)
+            results['POST /refresh-metrics (304)'] = run_case(
+                'POST /refresh-metrics (304)',
+                lambda: expect_ok(client.post(f'/ml-accounts/{first}/refresh-metrics', headers=headers)),
+                args.iterations, args.warmup)
+            results[f'POST /refresh-all-metrics ({args.accounts} cuentas)'] = run_case(
+                f'POST /refresh-all-metrics ({args.accounts} cuentas)',
+                lambda: expect_ok(client.post('/ml-accounts/refresh-all-metrics', headers=headers)),
+                max(args.iterations // 3, 3), 1)
+
+            # Serialización de objetos ORM ya cargados (sin base)
+            metrics = MLAccountMetrics.query.filter(MLAccountMetrics.ml_account_id.in_(account_ids)).limit(1000).all()
+            results[f'to_dict() × {len(metrics)}'] = run_case(
+                f'to_dict() × {len(metrics)}',
+                lambda: app.json.dumps([metric.to_dict() for metric in metrics]),
+                args.iterations, args.warmup)
+        finally:
+            # Limpiar los datos de prueba
+            db.session.rollback()
+            db.session.execute(db.text('DELETE FROM ml_account_metrics WHERE ml_account_id = ANY(:ids)'), {'ids': account_ids})
+            db.session.execute(db.text('DELETE FROM ml_account_metrics_rollups WHERE ml_account_id = ANY(:ids)'), {'ids': account_ids})
+            db.session.execute(db.text('DELETE FROM user_metrics_rollups WHERE user_id = :id'), {'id': user.id})
+            db.session.execute(db.text('DELETE FROM ml_accounts WHERE id = ANY(:ids)'), {'ids': account_ids})
+            db.session.execute(db.text('DELETE FROM users WHERE id = :id'), {'id': user.id})
+            db.session.commit()
+            stub_server.shutdown()
+
+    report = {
+        'meta': {
+            'timestamp': datetime.datetime.utcnow().isoformat() + 'Z',
+            'git_revision': git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'accounts': args.accounts,
+            'days': args.days,
+            'ml_latency_ms': args.ml_latency_ms
+        },
+        'results': results
+    }
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            regressions = compare(results, json.load(f), args.threshold)
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f'💾 Resultados: {args.output}')
+    if args.save_baseline:
+        with open(args.save_baseline, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f'📌 Línea base guardada: {args.save_baseline}')
+
+    if regressions:
+        print(f'❌ Regresiones mayores a {args.threshold:.0%}:')
+        for name, before, after, change in regressions:
+            print(f'   {name}: {before:.2f} ms -> {after:.2f} ms (+{change:.0%})')
+        sys.exit(1)
+    if args.baseline:
+        print(f'✅ Sin regresiones mayores a {args.threshold:.0%}')
+
+
+if __name__ == '__main__':
+    main()
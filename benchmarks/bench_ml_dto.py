@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark de respuestas de ML: dicts completos contra ml_models (slots)
+Simula un refresh-all que decodifica y retiene el perfil de cada cuenta y una
+sincronización de órdenes, y mide tiempo (mejor de N) y memoria retenida (tracemalloc).
+El efecto del decoder (json stdlib contra orjson) y el de los DTO (con el mismo decoder)
+se informan por separado.
+
+Uso: python benchmarks/bench_ml_dto.py [--accounts 5000] [--orders 2000] [--repeat 5]
+No necesita red ni base de datos: los cuerpos JSON se construyen en memoria
+"""
+
+import argparse
+import gc
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import ml_models
+from ml_client import orjson
+
+
+def user_body(user_id):
+    """Cuerpo de /users/{id} con los bloques que devuelve ML además de los que usamos"""
+    return json.dumps({
+        'id': user_id,
+        'nickname': f'SELLER{user_id}',
+        'registration_date': '2021-03-10T12:00:00.000-04:00',
+        'first_name': 'Vendedor',
+        'last_name': str(user_id),
+        'gender': '',
+        'country_id': 'AR',
+        'email': f'seller{user_id}@example.com',
+        'identification': {'number': str(20000000 + user_id), 'type': 'DNI'},
+        'address': {'address': 'Av. Siempreviva 742', 'city': 'Palermo', 'state': 'AR-C', 'zip_code': '1425'},
+        'phone': {'area_code': '11', 'extension': '', 'number': '45551234', 'verified': False},
+        'alternative_phone': {'area_code': '', 'extension': '', 'number': ''},
+        'user_type': 'normal',
+        'tags': ['normal', 'credits_profile', 'messages_as_seller', 'messages_as_buyer'],
+        'logo': None,
+        'points': 125,
+        'site_id': 'MLA',
+        'permalink': f'http://perfil.mercadolibre.com.ar/SELLER{user_id}',
+        'seller_experience': 'ADVANCED',
+        'bill_data': {'accept_credit_note': 'Y'},
+        'seller_reputation': {
+            'level_id': '5_green',
+            'power_seller_status': 'platinum',
+            'transactions': {
+                'canceled': 12, 'completed': 1500 + user_id % 300, 'period': 'historic',
+                'ratings': {'negative': 0.01, 'neutral': 0.02, 'positive': 0.97}, 'total': 1512
+            },
+            'metrics': {
+                'sales': {'period': '60 days', 'completed': 320},
+                'claims': {'period': '60 days', 'rate': 0.004, 'value': 1},
+                'delayed_handling_time': {'period': '60 days', 'rate': 0.01, 'value': 3},
+                'cancellations': {'period': '60 days', 'rate': 0, 'value': 0}
+            }
+        },
+        'buyer_reputation': {'canceled_transactions': 0, 'tags': [], 'transactions': {
+            'canceled': {'paid': None, 'total': None}, 'completed': None, 'not_yet_rated': {
+                'paid': None, 'total': None, 'units': None}, 'period': 'historic', 'total': None,
+            'unrated': {'paid': None, 'total': None}}},
+        'status': {'billing': {'allow': True, 'codes': []}, 'buy': {'allow': True, 'codes': [], 'immediate_payment': {
+            'reasons': [], 'required': False}}, 'confirmed_email': True, 'shopping_cart': {'buy': 'allowed', 'sell': 'allowed'},
+            'immediate_payment': False, 'list': {'allow': True, 'codes': [], 'immediate_payment': {
+                'reasons': [], 'required': False}}, 'mercadoenvios': 'accepted', 'mercadopago_account_type': 'personal',
+            'mercadopago_tc_accepted': True, 'required_action': '', 'sell': {'allow': True, 'codes': [],
+            'immediate_payment': {'reasons': [], 'required': False}}, 'site_status': 'active', 'user_type': 'simple_registration'},
+        'secure_email': f'seller{user_id}@mail.mercadolibre.com',
+        'company': {'brand_name': None, 'city_tax_id': '', 'corporate_name': '', 'identification': '', 'state_tax_id': ''},
+        'credit': {'consumed': 0, 'credit_level_id': 'MLA5', 'rank': 'newbie'},
+        'context': {'device': 'web-desktop', 'flow': 'registration', 'source': 'mercadolibre'}
+    }).encode('utf-8')
+
+
+def orders_body(offset, limit):
+    """Página de /orders/search con órdenes de una línea (como las del stub, con más campos)"""
+    results = []
+    for index in range(offset, offset + limit):
+        results.append({
+            'id': 2000000000 + index,
+            'status': 'paid',
+            'status_detail': None,
+            'date_created': '2025-01-15T10:30:00.000-03:00',
+            'date_closed': '2025-01-15T10:31:00.000-03:00',
+            'last_updated': '2025-01-15T10:31:00.000-03:00',
+            'total_amount': 15999.9,
+            'paid_amount': 15999.9,
+            'currency_id': 'ARS',
+            'tags': ['paid', 'not_delivered'],
+            'seller': {'id': 100000},
+            'buyer': {'id': 900000 + index % 5000, 'nickname': f'BUYER{index % 5000}'},
+            'shipping': {'id': 40000000000 + index},
+            'payments': [{'id': 60000000000 + index, 'status': 'approved', 'transaction_amount': 15999.9,
+                          'payment_method_id': 'account_money', 'installments': 1}],
+            'order_items': [{
+                'item': {'id': f'MLA{1000000 + index % 400}', 'title': f'Producto {index % 400}',
+                         'category_id': 'MLA1055', 'variation_id': None, 'seller_sku': None,
+                         'variation_attributes': [], 'warranty': 'Garantía de fábrica: 6 meses', 'condition': 'new'},
+                'quantity': 1 + index % 3,
+                'unit_price': 5333.3,
+                'full_unit_price': 5333.3,
+                'currency_id': 'ARS',
+                'sale_fee': 799.99,
+                'listing_type_id': 'gold_special'
+            }]
+        })
+    return json.dumps({'results': results, 'paging': {'total': 100000, 'offset': offset, 'limit': limit}}).encode('utf-8')
+
+
+def dict_profiles(bodies, loads):
+    return [loads(body) for body in bodies]
+
+
+def dto_profiles(bodies, loads):
+    return [ml_models.UserProfile.from_json(loads(body)) for body in bodies]
+
+
+def dict_orders(pages, loads):
+    orders = []
+    for body in pages:
+        orders.extend(loads(body)['results'])
+    return orders
+
+
+def dto_orders(pages, loads):
+    orders = []
+    for body in pages:
+        orders.extend(ml_models.OrderSearch.from_json(loads(body)).results)
+    return orders
+
+
+def bench(label, func, data, repeat):
+    """Mejor tiempo de func(data) y memoria que queda retenida en el resultado"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(data)
+        best = min(best, time.perf_counter() - start)
+
+    gc.collect()
+    tracemalloc.start()
+    result = func(data)
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    print(f'  {label:<38} {best * 1000:8.1f} ms  retenido {retained / 1024 / 1024:7.2f} MB  pico {peak / 1024 / 1024:7.2f} MB')
+    return best, retained
+
+
+def ratio(before, after, better, worse):
+    """'2.0x más rápido' o '1.5x más lento' según el sentido de la diferencia"""
+    after = max(after, 1e-9)
+    return f'{before / after:.1f}x {better}' if before >= after else f'{after / max(before, 1e-9):.1f}x {worse}'
+
+
+def effect(label, before, after):
+    time_ratio = ratio(before[0], after[0], 'más rápido', 'más lento')
+    memory_ratio = ratio(before[1], after[1], 'menos memoria', 'más memoria')
+    print(f'    {label}: {time_ratio}, {memory_ratio}')
+
+
+def compare(title, data, dict_path, dto_path, repeat):
+    """
+    Separar los dos efectos: el decoder (json stdlib contra orjson, ambos a dict) y los DTO
+    (dict contra ml_models con el mismo decoder)
+    """
+    print(title)
+    loads = orjson.loads if orjson is not None else json.loads
+    decoder = 'orjson' if orjson is not None else 'json stdlib'
+    stdlib = bench('dict (json stdlib)', lambda data: dict_path(data, json.loads), data, repeat)
+    dicts = stdlib
+    if orjson is not None:
+        dicts = bench('dict (orjson)', lambda data: dict_path(data, orjson.loads), data, repeat)
+        effect('decoder', stdlib, dicts)
+    dtos = bench(f'ml_models ({decoder})', lambda data: dto_path(data, loads), data, repeat)
+    effect(f'DTO ({decoder} en ambos)', dicts, dtos)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de respuestas de ML: dicts vs ml_models')
+    parser.add_argument('--accounts', type=int, default=5000)
+    parser.add_argument('--orders', type=int, default=2000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    profiles = [user_body(100000 + index) for index in range(args.accounts)]
+    pages = [orders_body(offset, min(50, args.orders - offset)) for offset in range(0, args.orders, 50)]
+
+    print(f"📊 ML responses (mejor de {args.repeat}), orjson: {'sí' if orjson else 'no instalado'}")
+    compare(f'Perfiles /users/{{id}} retenidos ({args.accounts} cuentas)', profiles, dict_profiles, dto_profiles, args.repeat)
+    # Las órdenes en ml_models ya traen fechas y Decimal parseados (el camino dict lo hace después)
+    compare(f'Órdenes /orders/search ({args.orders} órdenes)', pages, dict_orders, dto_orders, args.repeat)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark de serialización de métricas diarias
+Compara el camino clásico (objetos ORM + to_dict + json stdlib)
+contra filas de columnas + FastJSONProvider (orjson si está instalado)
+
+Uso: python benchmarks/bench_serialization.py [--rows 10000] [--repeat 5]
+No necesita base de datos: las filas se construyen en memoria
+"""
+
+import argparse
+import datetime
+import json
+import os
+import sys
+import time
+from decimal import Decimal
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy.engine import result as sa_result
+
+from app import app, MLAccountMetrics, DAILY_METRICS_FIELDS
+import json_provider
+
+
+def build_data(rows):
+    """Construir las mismas filas como objetos ORM y como Row de SQLAlchemy"""
+    today = datetime.date.today()
+    created = datetime.datetime.utcnow()
+    values = [
+        (i, 1, today - datetime.timedelta(days=i), Decimal(f'{1000 + i}.50'), 5 + i % 7, 100 + i % 50, i % 3, created)
+        for i in range(rows)
+    ]
+
+    # Objetos ORM transitorios: mismo costo de instanciación que al hidratar una consulta
+    objects = [MLAccountMetrics(**dict(zip(DAILY_METRICS_FIELDS, row))) for row in values]
+
+    # Filas de columnas tal como las devuelve db.session.query(*columnas)
+    metadata = sa_result.SimpleResultMetaData(DAILY_METRICS_FIELDS)
+    rows_out = [sa_result.Row(metadata, metadata._processors, metadata._key_to_index, row) for row in values]
+    return objects, rows_out
+
+
+def bench(label, func, repeat):
+    """Ejecutar func varias veces y devolver el mejor tiempo"""
+    best = float('inf')
+    size = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        size = len(func())
+        best = min(best, time.perf_counter() - start)
+    print(f'  {label:<45} {best * 1000:8.1f} ms  ({size / 1024:.0f} KB)')
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de serialización de métricas')
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    objects, rows = build_data(args.rows)
+    provider = app.json
+
+    print(f'📊 Serializando {args.rows} filas de métricas (mejor de {args.repeat})')
+    print(f"   orjson: {'sí' if json_provider.orjson else 'no instalado'}")
+
+    with app.app_context():
+        classic = bench(
+            'to_dict() + json stdlib',
+            lambda: json.dumps({'metrics': [metric.to_dict() for metric in objects]}),
+            args.repeat
+        )
+        bench(
+            'to_dict() + FastJSONProvider',
+            lambda: provider.dumps({'metrics': [metric.to_dict() for metric in objects]}),
+            args.repeat
+        )
+        fast = bench(
+            'filas de columnas + FastJSONProvider',
+            lambda: provider.response({'metrics': [dict(row._mapping) for row in rows]}).get_data(),
+            args.repeat
+        )
+
+    print(f'⚡ Mejora: {classic / fast:.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""
+Prueba de carga con sesiones de dashboard como las del frontend React
+Cada usuario virtual repite: login -> /profile -> /ml-accounts ->
+/ml-accounts/<id>/metrics por cuenta -> refresh-all-metrics (según --refresh-ratio)
+
+Corre contra un servidor local apuntado al stub de ML:
+    python ml_stub_server.py --port 8900 --latency-ms 80 &
+    ML_API_URL=http://127.0.0.1:8900 gunicorn -w 4 app:app -b 127.0.0.1:8000 &
+    python benchmarks/load_test.py --users 50 --accounts 3 --duration 60
+
+Si el stub no está levantado en --stub-url, se levanta dentro de este proceso.
+Reporta p50/p95/p99 y throughput por endpoint (y JSON con --output).
+"""
+
+import argparse
+import datetime
+import json
+import os
+import random
+import sys
+import threading
+import time
+from collections import defaultdict
+from urllib.parse import urlsplit
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+from ml_stub_server import FIRST_USER_ID, start_stub_server
+
+PASSWORD = 'LoadTest123!'
+
+
+class Stats:
+    """Latencias y errores por endpoint (thread-safe)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.statuses = defaultdict(lambda: defaultdict(int))
+        self.sessions = 0
+
+    def record(self, endpoint, elapsed, status):
+        with self._lock:
+            self.latencies[endpoint].append(elapsed)
+            self.statuses[endpoint][status] += 1
+            if status == 'error' or status >= 400:
+                self.errors[endpoint] += 1
+
+    def session_done(self):
+        with self._lock:
+            self.sessions += 1
+
+    def report(self, duration):
+        with self._lock:
+            endpoints = {}
+            for endpoint, values in sorted(self.latencies.items()):
+                ordered = sorted(values)
+                endpoints[endpoint] = {
+                    'requests': len(ordered),
+                    'errors': self.errors[endpoint],
+                    'throughput_rps': round(len(ordered) / duration, 2),
+                    'p50_ms': round(percentile(ordered, 0.50) * 1000, 2),
+                    'p95_ms': round(percentile(ordered, 0.95) * 1000, 2),
+                    'p99_ms': round(percentile(ordered, 0.99) * 1000, 2),
+                    'max_ms': round(ordered[-1] * 1000, 2),
+                    'statuses': {str(status): count for status, count in self.statuses[endpoint].items()}
+                }
+            total = sum(item['requests'] for item in endpoints.values())
+            return {
+                'duration_s': round(duration, 2),
+                'sessions': self.sessions,
+                'requests': total,
+                'errors': sum(item['errors'] for item in endpoints.values()),
+                'throughput_rps': round(total / duration, 2) if duration else 0,
+                'endpoints': endpoints
+            }
+
+
+def percentile(ordered, fraction):
+    if not ordered:
+        return 0.0
+    return ordered[min(int(round(fraction * (len(ordered) - 1))), len(ordered) - 1)]
+
+
+class VirtualUser:
+    """Un vendedor con su sesión HTTP (cookie de login) y sus cuentas ML"""
+
+    def __init__(self, base_url, username, seller_ids, stats, timeout):
+        self.base_url = base_url.rstrip('/')
+        self.username = username
+        self.seller_ids = seller_ids
+        self.stats = stats
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.account_ids = []
+
+    def call(self, method, path, endpoint=None, record=True, **kwargs):
+        started = time.perf_counter()
+        status = 'error'
+        try:
+            response = self.session.request(method, f'{self.base_url}{path}', timeout=self.timeout, **kwargs)
+            status = response.status_code
+            return response
+        except requests.exceptions.RequestException:
+            return None
+        finally:
+            if record:
+                self.stats.record(endpoint or f'{method} {path}', time.perf_counter() - started, status)
+
+    def setup(self):
+        """Registrar el usuario y vincular sus cuentas ML a través del stub (no se mide)"""
+        self.call('POST', '/register', record=False, json={'username': self.username, 'password': PASSWORD})
+        for seller_id in self.seller_ids:
+            response = self.call('GET', f'/mercadolibre/callback?code=TG-stub-{seller_id}', record=False)
+            if response is None or response.status_code != 200:
+                raise RuntimeError(f'No se pudo vincular la cuenta {seller_id}: '
+                                   f'{response.status_code if response is not None else "sin respuesta"}')
+            self.account_ids.append(response.json()['account']['id'])
+
+    def teardown(self):
+        for account_id in self.account_ids:
+            self.call('DELETE', f'/ml-accounts/{account_id}', record=False)
+
+    def dashboard_session(self, refresh_ratio):
+        """El mismo orden de requests que hace el frontend al abrir el dashboard"""
+        self.session.cookies.clear()
+        self.call('POST', '/login', 'POST /login', json={'username': self.username, 'password': PASSWORD})
+        self.call('GET', '/profile', 'GET /profile')
+        response = self.call('GET', '/ml-accounts', 'GET /ml-accounts')
+        accounts = response.json().get('accounts', []) if response is not None and response.ok else []
+        for account in accounts:
+            self.call('GET', f'/ml-accounts/{account["id"]}/metrics', 'GET /ml-accounts/<id>/metrics')
+        if random.random() < refresh_ratio:
+            self.call('POST', '/ml-accounts/refresh-all-metrics', 'POST /ml-accounts/refresh-all-metrics')
+        self.stats.session_done()
+
+
+def ensure_stub(stub_url, sellers_needed):
+    """Usar el stub si ya corre; si no, levantarlo en este proceso"""
+    try:
+        config = requests.get(f'{stub_url}/_stub/config', timeout=2).json()
+        if config['users'] < sellers_needed:
+            requests.post(f'{stub_url}/_stub/config', json={'users': sellers_needed}, timeout=2)
+        return None
+    except requests.exceptions.RequestException:
+        parts = urlsplit(stub_url)
+        _, server = start_stub_server({'users': sellers_needed}, host=parts.hostname, port=parts.port or 80)
+        print(f'🧪 Stub de ML levantado en {stub_url} (el servidor tiene que tener ML_API_URL={stub_url})')
+        return server
+
+
+def print_report(report):
+    print(f"\n📈 {report['sessions']} sesiones, {report['requests']} requests en {report['duration_s']}s "
+          f"-> {report['throughput_rps']} req/s, {report['errors']} errores")
+    print(f"{'endpoint':<42} {'req':>7} {'req/s':>8} {'p50':>9} {'p95':>9} {'p99':>9} {'err':>5}")
+    for endpoint, item in report['endpoints'].items():
+        print(f"{endpoint:<42} {item['requests']:>7} {item['throughput_rps']:>8} "
+              f"{item['p50_ms']:>7.1f}ms {item['p95_ms']:>7.1f}ms {item['p99_ms']:>7.1f}ms {item['errors']:>5}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Prueba de carga de sesiones de dashboard')
+    parser.add_argument('--base-url', default=os.getenv('LOAD_TEST_URL', 'http://127.0.0.1:8000'))
+    parser.add_argument('--stub-url', default=os.getenv('ML_API_URL', 'http://127.0.0.1:8900'))
+    parser.add_argument('--users', type=int, default=20, help='usuarios concurrentes')
+    parser.add_argument('--accounts', type=int, default=2, help='cuentas ML por usuario')
+    parser.add_argument('--duration', type=float, default=60, help='segundos de carga')
+    parser.add_argument('--ramp-up', type=float, default=5, help='segundos para arrancar todos los usuarios')
+    parser.add_argument('--think-ms', type=float, default=1000, help='pausa media entre sesiones')
+    parser.add_argument('--refresh-ratio', type=float, default=1.0, help='fracción de sesiones con refresh-all')
+    parser.add_argument('--timeout', type=float, default=30)
+    parser.add_argument('--keep-data', action='store_true', help='no desvincular las cuentas al terminar')
+    parser.add_argument('--output', help='guardar el reporte en JSON')
+    args = parser.parse_args()
+
+    stub_server = ensure_stub(args.stub_url, args.users * args.accounts)
+    stats = Stats()
+    run_id = int(time.time())
+    users = [
+        VirtualUser(args.base_url, f'load_{run_id}_{index}',
+                    [FIRST_USER_ID + index * args.accounts + k for k in range(args.accounts)],
+                    stats, args.timeout)
+        for index in range(args.users)
+    ]
+
+    print(f'🔧 Preparando {args.users} usuarios × {args.accounts} cuentas en {args.base_url}...')
+    for user in users:
+        user.setup()
+
+    stop = threading.Event()
+
+    def run(user, delay):
+        if stop.wait(delay):
+            return
+        while not stop.is_set():
+            user.dashboard_session(args.refresh_ratio)
+            stop.wait(random.expovariate(1000 / args.think_ms) if args.think_ms > 0 else 0)
+
+    print(f'🚀 Carga durante {args.duration}s (ramp-up {args.ramp_up}s, pausa media {args.think_ms}ms)')
+    threads = [
+        threading.Thread(target=run, args=(user, args.ramp_up * index / max(len(users), 1)), daemon=True)
+        for index, user in enumerate(users)
+    ]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    time.sleep(args.duration)
+    stop.set()
+    for thread in threads:
+        thread.join(args.timeout)
+    elapsed = time.perf_counter() - started
+
+    report = stats.report(elapsed)
+    report['config'] = {key: value for key, value in vars(args).items() if key != 'output'}
+    report['timestamp'] = datetime.datetime.utcnow().isoformat() + 'Z'
+    print_report(report)
+
+    if not args.keep_data:
+        for user in users:
+            user.teardown()
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f'💾 Reporte: {args.output}')
+    if stub_server is not None:
+        stub_server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,275 @@
+# cache.py - Capa de caché con backend en memoria (LRU + TTL) u opcionalmente Redis
+
+import hashlib
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+try:
+    import redis
+except ImportError:  # redis es opcional, solo se necesita con CACHE_BACKEND=redis
+    redis = None
+
+# Configuración de caché
+CACHE_BACKEND = os.getenv('CACHE_BACKEND', 'memory')  # memory | redis | none
+CACHE_REDIS_URL = os.getenv('CACHE_REDIS_URL', 'redis://localhost:6379/0')
+CACHE_MAX_ENTRIES = int(os.getenv('CACHE_MAX_ENTRIES', '2048'))
+CACHE_DEFAULT_TTL = int(os.getenv('CACHE_DEFAULT_TTL', '60'))  # segundos
+CACHE_KEY_PREFIX = os.getenv('CACHE_KEY_PREFIX', 'smartselling:')
+
+# Valor centinela para distinguir "no está" de un None cacheado
+MISSING = object()
+
+
+class CacheStats:
+    """Contadores de hits/misses/evictions (thread-safe)"""
+
+    FIELDS = ('hits', 'misses', 'sets', 'evictions', 'invalidations', 'errors')
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = dict.fromkeys(self.FIELDS, 0)
+
+    def incr(self, name, amount=1):
+        with self._lock:
+            self._counts[name] += amount
+
+    def snapshot(self):
+        with self._lock:
+            counts = dict(self._counts)
+        lookups = counts['hits'] + counts['misses']
+        counts['hit_ratio'] = round(counts['hits'] / lookups, 4) if lookups else 0.0
+        return counts
+
+
+class MemoryBackend:
+    """LRU con expiración por entrada, local al proceso"""
+
+    name = 'memory'
+
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES, stats=None):
+        self.max_entries = max_entries
+        self.stats = stats
+        self._data = OrderedDict()
+        # Generaciones de tags fuera del LRU: si se desalojaran volverían a 0
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return MISSING
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._data[key]
+                return MISSING
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                if self.stats:
+                    self.stats.incr('evictions')
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def get_counter(self, key):
+        with self._lock:
+            return self._counters.get(key, 0)
+
+    def incr(self, key):
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + 1
+            return self._counters[key]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._counters.clear()
+
+    def info(self):
+        with self._lock:
+            return {'entries': len(self._data), 'max_entries': self.max_entries}
+
+
+class RedisBackend:
+    """Backend Redis compartido entre workers (valores serializados con pickle)"""
+
+    name = 'redis'
+
+    def __init__(self, url=CACHE_REDIS_URL, stats=None):
+        if redis is None:
+            raise RuntimeError('CACHE_BACKEND=redis requires the redis package (pip install redis)')
+        self.client = redis.Redis.from_url(url)
+        self.stats = stats
+
+    def get(self, key):
+        raw = self.client.get(key)
+        return MISSING if raw is None else pickle.loads(raw)
+
+    def set(self, key, value, ttl=None):
+        self.client.set(key, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL), ex=ttl or None)
+
+    def delete(self, key):
+        self.client.delete(key)
+
+    def get_counter(self, key):
+        # Un contador desalojado por Redis arranca en un valor nuevo, nunca en uno ya usado
+        self.client.set(key, time.time_ns(), nx=True)
+        return int(self.client.get(key) or 0)
+
+    def incr(self, key):
+        self.client.set(key, time.time_ns(), nx=True)
+        return self.client.incr(key)
+
+    def clear(self):
+        for key in self.client.scan_iter(match=f'{CACHE_KEY_PREFIX}*'):
+            self.client.delete(key)
+
+    def info(self):
+        stats = self.client.info('stats')
+        return {'entries': self.client.dbsize(), 'evicted_keys': stats.get('evicted_keys', 0)}
+
+
+class NullBackend:
+    """Caché desactivada (CACHE_BACKEND=none)"""
+
+    name = 'none'
+
+    def get(self, key):
+        return MISSING
+
+    def set(self, key, value, ttl=None):
+        pass
+
+    def delete(self, key):
+        pass
+
+    def get_counter(self, key):
+        return 0
+
+    def incr(self, key):
+        return 0
+
+    def clear(self):
+        pass
+
+    def info(self):
+        return {}
+
+
+class Cache:
+    """
+    Fachada de caché con invalidación por tags.
+    Cada tag tiene un número de generación que forma parte de la clave:
+    invalidar un tag incrementa su generación y deja huérfanas sus entradas
+    (que expiran solas por TTL o salen por LRU).
+    """
+
+    def __init__(self, backend, default_ttl=CACHE_DEFAULT_TTL, prefix=CACHE_KEY_PREFIX):
+        self.backend = backend
+        self.default_ttl = default_ttl
+        self.prefix = prefix
+        self.stats = backend.stats if getattr(backend, 'stats', None) else CacheStats()
+        backend.stats = self.stats
+
+    def _generation(self, tag):
+        return self.backend.get_counter(f'{self.prefix}tag:{tag}')
+
+    def make_key(self, namespace, args, kwargs, tags=()):
+        """Clave estable a partir de los argumentos y la generación de cada tag"""
+        raw = repr((args, sorted(kwargs.items()), [(tag, self._generation(tag)) for tag in tags]))
+        return f'{self.prefix}{namespace}:{hashlib.sha1(raw.encode("utf-8")).hexdigest()}'
+
+    def get(self, key):
+        try:
+            value = self.backend.get(key)
+        except Exception as e:
+            print(f"Cache get error ({self.backend.name}): {e}")
+            self.stats.incr('errors')
+            value = MISSING
+        self.stats.incr('misses' if value is MISSING else 'hits')
+        return value
+
+    def set(self, key, value, ttl=None):
+        try:
+            self.backend.set(key, value, ttl if ttl is not None else self.default_ttl)
+            self.stats.incr('sets')
+        except Exception as e:
+            print(f"Cache set error ({self.backend.name}): {e}")
+            self.stats.incr('errors')
+
+    def delete(self, key):
+        self.backend.delete(key)
+
+    def invalidate(self, *tags):
+        """Invalidar todas las entradas asociadas a los tags"""
+        for tag in tags:
+            try:
+                self.backend.incr(f'{self.prefix}tag:{tag}')
+                self.stats.incr('invalidations')
+            except Exception as e:
+                print(f"Cache invalidate error ({self.backend.name}): {e}")
+                self.stats.incr('errors')
+
+    def memoize(self, namespace, ttl=None, tags=None, cache_if=None):
+        """
+        Decorador: cachea el resultado según los argumentos de la función.
+        tags(*args, **kwargs) -> lista de tags para invalidar después.
+        cache_if(result) -> False para no guardar (ej: respuestas con error).
+        """
+        def decorator(f):
+            @wraps(f)
+            def decorated(*args, **kwargs):
+                entry_tags = tags(*args, **kwargs) if tags else ()
+                try:
+                    key = self.make_key(namespace, args, kwargs, entry_tags)
+                except Exception as e:
+                    print(f"Cache key error ({self.backend.name}): {e}")
+                    self.stats.incr('errors')
+                    return f(*args, **kwargs)
+
+                value = self.get(key)
+                if value is not MISSING:
+                    return value
+
+                value = f(*args, **kwargs)
+                if cache_if is None or cache_if(value):
+                    self.set(key, value, ttl)
+                return value
+
+            decorated.uncached = f
+            return decorated
+        return decorator
+
+    def info(self):
+        """Estadísticas para /health y /metrics"""
+        try:
+            backend_info = self.backend.info()
+        except Exception as e:
+            backend_info = {'error': str(e)}
+        return {'backend': self.backend.name, **self.stats.snapshot(), **backend_info}
+
+
+def create_cache_from_env():
+    """Crear la caché según CACHE_BACKEND"""
+    stats = CacheStats()
+    if CACHE_BACKEND == 'redis':
+        backend = RedisBackend(CACHE_REDIS_URL, stats=stats)
+    elif CACHE_BACKEND == 'none':
+        backend = NullBackend()
+        backend.stats = stats
+    else:
+        backend = MemoryBackend(CACHE_MAX_ENTRIES, stats=stats)
+    return Cache(backend)
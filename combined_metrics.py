@@ -0,0 +1,182 @@
+# combined_metrics.py - Totales diarios por usuario (todas sus cuentas activas) en una tabla mantenida por triggers
+
+from sqlalchemy import text
+
+COMBINED_TABLE = 'user_daily_metrics'
+
+# Una fila por (usuario, día). No se recalcula entera: los triggers de ml_account_metrics y
+# ml_accounts le suman la diferencia de cada statement con INSERT ... ON CONFLICT, así que
+# cualquier escritura (ORM, SQL a mano, COPY) la mantiene al día y el costo no depende del
+# tamaño de ml_account_metrics. accounts cuenta las cuentas activas con fila ese día; los
+# días que quedan en 0 no se borran, el endpoint los filtra.
+COMBINED_TABLE_DDL = f"""
+    CREATE TABLE IF NOT EXISTS {COMBINED_TABLE} (
+        user_id INTEGER NOT NULL REFERENCES users (id) ON DELETE CASCADE,
+        date DATE NOT NULL,
+        sales NUMERIC(14, 2) NOT NULL DEFAULT 0,
+        orders BIGINT NOT NULL DEFAULT 0,
+        views BIGINT NOT NULL DEFAULT 0,
+        questions BIGINT NOT NULL DEFAULT 0,
+        accounts INTEGER NOT NULL DEFAULT 0,
+        updated_at TIMESTAMP WITHOUT TIME ZONE,
+        PRIMARY KEY (user_id, date)
+    )
+"""
+
+_ADD_ON_CONFLICT = f"""
+    ON CONFLICT (user_id, date) DO UPDATE SET
+        sales = {COMBINED_TABLE}.sales + EXCLUDED.sales,
+        orders = {COMBINED_TABLE}.orders + EXCLUDED.orders,
+        views = {COMBINED_TABLE}.views + EXCLUDED.views,
+        questions = {COMBINED_TABLE}.questions + EXCLUDED.questions,
+        accounts = {COMBINED_TABLE}.accounts + EXCLUDED.accounts,
+        updated_at = EXCLUDED.updated_at
+"""
+
+# Filas diarias con signo: +1 las nuevas, -1 las viejas (un UPDATE resta la versión anterior y suma la nueva)
+_SIGNED_ROWS = {
+    'new': "SELECT ml_account_id, date, daily_sales, daily_orders, daily_views, daily_questions, 1 AS sign FROM new_rows",
+    'old': "SELECT ml_account_id, date, daily_sales, daily_orders, daily_views, daily_questions, -1 AS sign FROM old_rows",
+}
+
+
+def _apply_rows(rows):
+    """
+    Sumar al total de cada usuario las filas diarias (con signo) de sus cuentas activas.
+    FOR SHARE: si otra transacción está activando o desactivando la cuenta, se espera a que
+    confirme y se suma según el estado final (el trigger de ml_accounts hace el resto).
+    """
+    return f"""
+        PERFORM 1 FROM ml_accounts WHERE id IN (SELECT ml_account_id FROM ({rows}) r) FOR SHARE;
+        INSERT INTO {COMBINED_TABLE} (user_id, date, sales, orders, views, questions, accounts, updated_at)
+        SELECT a.user_id, r.date,
+               SUM(r.sign * COALESCE(r.daily_sales, 0)), SUM(r.sign * COALESCE(r.daily_orders, 0)),
+               SUM(r.sign * COALESCE(r.daily_views, 0)), SUM(r.sign * COALESCE(r.daily_questions, 0)),
+               SUM(r.sign), now() at time zone 'utc'
+        FROM ({rows}) r
+        JOIN ml_accounts a ON a.id = r.ml_account_id AND a.is_active
+        GROUP BY a.user_id, r.date
+        {_ADD_ON_CONFLICT};
+    """
+
+
+# Los triggers de ml_account_metrics son por statement con tablas de transición: un COPY o
+# un INSERT de muchas filas hace un solo INSERT ... SELECT agrupado. Postgres no permite
+# tablas de transición en triggers de más de un evento, por eso son tres.
+COMBINED_TRIGGERS_DDL = (
+    f"""
+    CREATE OR REPLACE FUNCTION user_daily_metrics_apply() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP = 'INSERT' THEN
+            {_apply_rows(_SIGNED_ROWS['new'])}
+        ELSIF TG_OP = 'DELETE' THEN
+            {_apply_rows(_SIGNED_ROWS['old'])}
+        ELSE
+            {_apply_rows(_SIGNED_ROWS['new'] + ' UNION ALL ' + _SIGNED_ROWS['old'])}
+        END IF;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql
+    """,
+    "DROP TRIGGER IF EXISTS user_daily_metrics_insert ON ml_account_metrics",
+    """
+    CREATE TRIGGER user_daily_metrics_insert
+    AFTER INSERT ON ml_account_metrics REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION user_daily_metrics_apply()
+    """,
+    "DROP TRIGGER IF EXISTS user_daily_metrics_update ON ml_account_metrics",
+    """
+    CREATE TRIGGER user_daily_metrics_update
+    AFTER UPDATE ON ml_account_metrics REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION user_daily_metrics_apply()
+    """,
+    "DROP TRIGGER IF EXISTS user_daily_metrics_delete ON ml_account_metrics",
+    """
+    CREATE TRIGGER user_daily_metrics_delete
+    AFTER DELETE ON ml_account_metrics REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION user_daily_metrics_apply()
+    """,
+    # Activar, desactivar, cambiar de dueño o borrar una cuenta suma o resta todas sus filas
+    f"""
+    CREATE OR REPLACE FUNCTION user_daily_metrics_account() RETURNS trigger AS $$
+    BEGIN
+        IF OLD.is_active THEN
+            INSERT INTO {COMBINED_TABLE} (user_id, date, sales, orders, views, questions, accounts, updated_at)
+            SELECT OLD.user_id, m.date, -COALESCE(m.daily_sales, 0), -COALESCE(m.daily_orders, 0),
+                   -COALESCE(m.daily_views, 0), -COALESCE(m.daily_questions, 0), -1, now() at time zone 'utc'
+            FROM ml_account_metrics m
+            WHERE m.ml_account_id = OLD.id
+            {_ADD_ON_CONFLICT};
+        END IF;
+        IF TG_OP = 'UPDATE' AND NEW.is_active THEN
+            INSERT INTO {COMBINED_TABLE} (user_id, date, sales, orders, views, questions, accounts, updated_at)
+            SELECT NEW.user_id, m.date, COALESCE(m.daily_sales, 0), COALESCE(m.daily_orders, 0),
+                   COALESCE(m.daily_views, 0), COALESCE(m.daily_questions, 0), 1, now() at time zone 'utc'
+            FROM ml_account_metrics m
+            WHERE m.ml_account_id = NEW.id
+            {_ADD_ON_CONFLICT};
+        END IF;
+        IF TG_OP = 'DELETE' THEN
+            RETURN OLD;
+        END IF;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql
+    """,
+    "DROP TRIGGER IF EXISTS user_daily_metrics_account_update ON ml_accounts",
+    """
+    CREATE TRIGGER user_daily_metrics_account_update
+    AFTER UPDATE OF is_active, user_id ON ml_accounts
+    FOR EACH ROW
+    WHEN (OLD.is_active IS DISTINCT FROM NEW.is_active OR OLD.user_id IS DISTINCT FROM NEW.user_id)
+    EXECUTE FUNCTION user_daily_metrics_account()
+    """,
+    # BEFORE: las filas diarias todavía existen; las que se borren después ya no encuentran la cuenta
+    "DROP TRIGGER IF EXISTS user_daily_metrics_account_delete ON ml_accounts",
+    """
+    CREATE TRIGGER user_daily_metrics_account_delete
+    BEFORE DELETE ON ml_accounts
+    FOR EACH ROW WHEN (OLD.is_active)
+    EXECUTE FUNCTION user_daily_metrics_account()
+    """,
+)
+
+
+def install_combined_table(session):
+    """
+    Crear la tabla y sus triggers (idempotente). Reemplaza la vista materializada de versiones
+    anteriores; si la tabla es nueva se completa desde ml_account_metrics.
+    """
+    legacy = session.execute(text('SELECT 1 FROM pg_matviews WHERE matviewname = :name'),
+                             {'name': COMBINED_TABLE}).first()
+    if legacy:
+        session.execute(text(f'DROP MATERIALIZED VIEW {COMBINED_TABLE}'))
+    exists = session.execute(text('SELECT to_regclass(:name)'), {'name': COMBINED_TABLE}).scalar()
+    session.execute(text(COMBINED_TABLE_DDL))
+    if not exists:
+        rebuild_combined_metrics(session)
+    for statement in COMBINED_TRIGGERS_DDL:
+        session.execute(text(statement))
+
+
+def rebuild_combined_metrics(session):
+    """
+    Completar la tabla desde ml_account_metrics (backfill al crearla; después la mantienen los
+    triggers). Solo se reemplazan los días que siguen en ml_account_metrics: los anteriores ya
+    los borró la retención de particiones y sus totales se conservan, como en los rollups.
+    """
+    since = session.execute(text('SELECT MIN(date) FROM ml_account_metrics')).scalar()
+    if since is None:
+        return
+    session.execute(text(f'DELETE FROM {COMBINED_TABLE} WHERE date >= :since'), {'since': since})
+    session.execute(text(f"""
+        INSERT INTO {COMBINED_TABLE} (user_id, date, sales, orders, views, questions, accounts, updated_at)
+        SELECT a.user_id, m.date,
+               COALESCE(SUM(m.daily_sales), 0), COALESCE(SUM(m.daily_orders), 0),
+               COALESCE(SUM(m.daily_views), 0), COALESCE(SUM(m.daily_questions), 0),
+               COUNT(*), now() at time zone 'utc'
+        FROM ml_account_metrics m
+        JOIN ml_accounts a ON a.id = m.ml_account_id
+        WHERE a.is_active AND m.date >= :since
+        GROUP BY a.user_id, m.date
+    """), {'since': since})
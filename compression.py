@@ -0,0 +1,87 @@
+# compression.py - Compresión gzip/brotli de respuestas JSON
+
+import gzip
+import os
+import zlib
+
+from flask import request
+
+try:
+    import brotli
+except ImportError:  # brotli es opcional, sin él solo se ofrece gzip
+    brotli = None
+
+# Configuración de compresión
+COMPRESS_MIN_SIZE = int(os.getenv('COMPRESS_MIN_SIZE', '1024'))  # bytes
+COMPRESS_GZIP_LEVEL = int(os.getenv('COMPRESS_GZIP_LEVEL', '6'))
+COMPRESS_BROTLI_QUALITY = int(os.getenv('COMPRESS_BROTLI_QUALITY', '4'))
+COMPRESS_MIMETYPES = ('application/json', 'text/html', 'text/plain', 'text/csv')
+
+
+def available_encodings():
+    """Codificaciones soportadas en orden de preferencia"""
+    return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def compress_body(data, encoding):
+    """Comprimir un cuerpo de respuesta con la codificación indicada"""
+    if encoding == 'br':
+        return brotli.compress(data, quality=COMPRESS_BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=COMPRESS_GZIP_LEVEL)
+
+
+def compress_stream(chunks, encoding):
+    """
+    Comprimir una respuesta en streaming chunk por chunk.
+    Cada chunk se vacía (sync flush) para que el cliente lo reciba sin esperar al final.
+    """
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=COMPRESS_BROTLI_QUALITY)
+        for chunk in chunks:
+            data = compressor.process(chunk) + compressor.flush()
+            if data:
+                yield data
+        yield compressor.finish()
+        return
+
+    # wbits=31: formato gzip (encabezado + CRC) en vez de zlib crudo
+    compressor = zlib.compressobj(COMPRESS_GZIP_LEVEL, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def compress_response(response):
+    """after_request: comprimir respuestas grandes si el cliente lo acepta"""
+    if (response.status_code < 200 or response.status_code in (204, 304)
+            or response.direct_passthrough or response.is_streamed
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESS_MIMETYPES):
+        return response
+
+    response.vary.add('Accept-Encoding')
+
+    data = response.get_data()
+    if len(data) < COMPRESS_MIN_SIZE:
+        return response
+
+    encoding = request.accept_encodings.best_match(available_encodings())
+    if not encoding:
+        return response
+
+    response.set_data(compress_body(data, encoding))
+    response.headers['Content-Encoding'] = encoding
+
+    # Un ETag fuerte identifica bytes exactos: cada codificación necesita el suyo
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(f'{etag}-{encoding}')
+
+    return response
+
+
+def init_compression(app):
+    """Registrar la compresión de respuestas en la aplicación Flask"""
+    app.after_request(compress_response)
@@ -18,7 +18,7 @@ sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 def create_tables():
     """Crear todas las tablas de la base de datos"""
     try:
-        from app import app, db, User, MLAccount, MLAccountMetrics
+        from app import app, db, User, MLAccount, MLAccountMetrics, setup_database
         
         print("🚀 SmartSelling - Migración de Base de Datos")
         print("=" * 50)
@@ -38,12 +38,28 @@ def create_tables():
             print("✅ Conexión exitosa")
             print("")
             
-            # Crear todas las tablas
-            print("📋 Creando tablas...")
-            db.create_all()
+            # Crear todas las tablas, particiones de métricas diarias y triggers de NOTIFY
+            print("📋 Creando tablas, particiones y triggers...")
+            partitions = setup_database()
             print("✅ Tablas creadas exitosamente")
             print("")
             
+            # Particionado mensual de ml_account_metrics
+            if partitions['migrated']:
+                print("   ✅ ml_account_metrics migrada a tabla particionada")
+            print(f"   ✅ {len(partitions['partitions'])} particiones vigentes")
+            if partitions['dropped']:
+                print(f"   🗑️  {len(partitions['dropped'])} particiones eliminadas por retención")
+            print("")
+            
+            # Rollups semanales/mensuales de los períodos que todavía no tienen (los existentes
+            # conservan la historia de particiones ya borradas por retención)
+            print("📈 Completando rollups de métricas (solo períodos sin calcular)...")
+            from app import rebuild_metrics_rollups
+            rebuild_metrics_rollups()
+            print("✅ Rollups actualizados")
+            print("")
+            
             # Verificar tablas creadas
             print("📝 Verificando tablas creadas:")
             tables = db.session.execute(text(
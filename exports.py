@@ -0,0 +1,81 @@
+# exports.py - Exportación en streaming (CSV / NDJSON) desde un cursor del lado del servidor
+
+import csv
+import io
+import os
+
+from flask import Response, request, stream_with_context
+
+from compression import available_encodings, compress_stream
+
+# Filas por lote leídas del cursor y enviadas como un chunk HTTP
+EXPORT_BATCH_SIZE = int(os.getenv('EXPORT_BATCH_SIZE', '2000'))
+
+FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+
+def iter_batches(session, statement, batch_size=EXPORT_BATCH_SIZE):
+    """
+    Ejecutar con cursor del lado del servidor (yield_per) y devolver lotes de filas.
+    Solo hay un lote en memoria a la vez, sin importar cuántas filas tenga el resultado.
+    """
+    result = session.execute(statement.execution_options(yield_per=batch_size))
+    try:
+        for batch in result.partitions():
+            yield batch
+    finally:
+        result.close()
+
+
+def csv_chunks(columns, batches):
+    """Encabezado y un chunk CSV por lote"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator='\n')
+    writer.writerow(columns)
+    for batch in batches:
+        writer.writerows((_csv_value(value) for value in row) for row in batch)
+        yield buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+
+def ndjson_chunks(columns, batches, dumps):
+    """Un objeto JSON por línea, un chunk por lote"""
+    for batch in batches:
+        lines = [dumps(dict(zip(columns, row))) for row in batch]
+        yield ('\n'.join(lines) + '\n').encode('utf-8')
+
+
+def _csv_value(value):
+    # Fechas en ISO 8601; Decimal y números tal cual (str() no pierde precisión)
+    return value.isoformat() if hasattr(value, 'isoformat') else value
+
+
+def export_response(session, statement, columns, fmt, filename, dumps):
+    """
+    Respuesta en streaming con las filas de statement en CSV o NDJSON.
+    Se comprime al vuelo (gzip o brotli) si el cliente lo acepta.
+    """
+    batches = iter_batches(session, statement)
+    if fmt == 'csv':
+        chunks = csv_chunks(columns, batches)
+    else:
+        chunks = ndjson_chunks(columns, batches, dumps)
+
+    headers = {
+        'Content-Disposition': f'attachment; filename="{filename}.{fmt}"',
+        'X-Accel-Buffering': 'no',  # nginx: no acumular la respuesta completa
+        'Vary': 'Accept-Encoding'
+    }
+    encoding = request.accept_encodings.best_match(available_encodings())
+    if encoding:
+        chunks = compress_stream(chunks, encoding)
+        headers['Content-Encoding'] = encoding
+
+    # stream_with_context mantiene la sesión de base abierta mientras se genera
+    return Response(stream_with_context(chunks), mimetype=FORMATS[fmt], headers=headers)
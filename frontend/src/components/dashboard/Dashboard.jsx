@@ -1,4 +1,4 @@
-import React, { useState, useMemo, useEffect } from 'react'
+import React, { useState, useMemo, useEffect, useRef } from 'react'
 import {
   Grid,
   Card,
@@ -31,7 +31,7 @@ import QuickActions from './QuickActions'
 import DebugPanel from '../debug/DebugPanel'
 import MLConnectionTest from '../debug/MLConnectionTest'
 import toast from 'react-hot-toast'
-import { API_URL, apiRequest } from '../../config/api'
+import { API_URL, apiRequest, subscribeToAccountUpdates } from '../../config/api'
 
 function Dashboard() {
   const { user } = useAuth()
@@ -39,12 +39,44 @@ function Dashboard() {
   const [loading, setLoading] = useState(true)
   const [selectedAccounts, setSelectedAccounts] = useState('all')
   const [refreshing, setRefreshing] = useState(false)
+  // Si el stream no está conectado los cambios no llegan solos: hay que volver a pedir la lista
+  const streamConnected = useRef(false)
 
   // Cargar cuentas al montar el componente
   useEffect(() => {
     fetchAccounts()
   }, [])
 
+  // Aplicar los cambios que llegan por el stream sin volver a pedir /ml-accounts
+  useEffect(() => {
+    return subscribeToAccountUpdates((update) => {
+      if (update.type !== 'account') return
+
+      setAccounts((current) => {
+        if (update.op === 'delete') {
+          return current.filter(account => account.id !== update.account_id)
+        }
+        if (!current.some(account => account.id === update.account_id)) {
+          // Cuenta nueva: traer la lista completa una vez
+          fetchAccounts()
+          return current
+        }
+        return current.map(account => account.id === update.account_id ? {
+          ...account,
+          ml_nickname: update.ml_nickname,
+          account_alias: update.account_alias,
+          is_active: update.is_active,
+          total_sales: update.total_sales || 0,
+          total_orders: update.total_orders,
+          active_listings: update.active_listings,
+          last_metrics_update: update.last_metrics_update
+        } : account)
+      })
+    }, null, (connected) => {
+      streamConnected.current = connected
+    })
+  }, [])
+
   const fetchAccounts = async () => {
     try {
       console.log('🔄 Fetching accounts from:', `${API_URL}/ml-accounts`);
@@ -108,8 +140,11 @@ function Dashboard() {
       })
 
       if (response.ok) {
+        // Los totales nuevos llegan por el stream de /ml-accounts/stream; sin stream, recargar
+        if (!streamConnected.current) {
+          await fetchAccounts()
+        }
         toast.success('Métricas actualizadas')
-        await fetchAccounts()
       } else {
         toast.error('Error al actualizar métricas')
       }
@@ -85,6 +85,32 @@ export const apiRequest = async (endpoint, options = {}) => {
   }
 }
 
+// Suscripción a cambios en vivo de las cuentas ML (Server-Sent Events)
+// onEvent recibe { type: 'account' | 'daily_metrics', ...delta }
+// onStatus(connected) avisa cuando el stream se abre o se corta
+export const subscribeToAccountUpdates = (onEvent, onError, onStatus) => {
+  const source = new EventSource(`${API_URL}/ml-accounts/stream`, { withCredentials: true })
+
+  const handle = (event) => {
+    try {
+      onEvent(JSON.parse(event.data))
+    } catch (e) {
+      console.error('Invalid stream event:', event.data)
+    }
+  }
+
+  source.addEventListener('account', handle)
+  source.addEventListener('daily_metrics', handle)
+  source.onopen = () => onStatus && onStatus(true)
+  source.onerror = (event) => {
+    if (onStatus) onStatus(source.readyState === EventSource.OPEN)
+    if (onError) onError(event)
+  }
+
+  // Devolver función para cerrar la suscripción
+  return () => source.close()
+}
+
 console.log('🔧 API Configuration:', {
   Environment: isDevelopment ? 'Development' : 'Production',
   API_URL,
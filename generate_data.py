@@ -0,0 +1,370 @@
+#!/usr/bin/env python3
+"""
+Generador de datos sintéticos para pruebas de escala
+Carga con COPY usuarios, cuentas ML, años de métricas diarias, publicaciones
+y órdenes con una distribución parecida a la real:
+  - cuentas por usuario y tamaño de cada cuenta con cola larga (Pareto):
+    pocas agencias con muchas cuentas y pocos vendedores grandes concentran las ventas
+  - popularidad de publicaciones tipo Zipf dentro de cada cuenta
+  - estacionalidad semanal y anual, tendencia por cuenta y ruido log-normal
+  - cuentas que empezaron a vender en distintos momentos del historial
+
+Uso (contra una base de desarrollo o benchmark, nunca producción):
+    DB_NAME=smartselling_bench python generate_data.py --users 20000 --accounts 100000 --years 3
+    python generate_data.py --users 100 --accounts 300 --years 1 --orders-days 60 --rollups
+
+Todos los usuarios generados tienen la contraseña --password (para load_test.py).
+"""
+
+import argparse
+import csv
+import datetime
+import io
+import math
+import random
+import time
+
+import bcrypt
+
+# Cuentas por lote: cada lote se genera en memoria, se copia y se confirma
+DEFAULT_CHUNK = 500
+# Primeros IDs numéricos de ML para cuentas y órdenes sintéticas (lejos de los reales)
+FIRST_ML_USER_ID = 900000000
+FIRST_ML_ORDER_ID = 9000000000000
+
+NOTIFY_TRIGGERS = (
+    ('ml_accounts', 'ml_accounts_notify'),
+    ('ml_account_metrics', 'ml_account_metrics_notify'),
+)
+
+# Ventas relativas por día de la semana (lunes = 0) y por mes (pico en noviembre/diciembre)
+WEEKDAY_FACTORS = (1.05, 1.0, 1.0, 1.02, 1.08, 0.85, 0.75)
+MONTH_FACTORS = (0.85, 0.85, 0.95, 0.95, 1.05, 0.95, 1.0, 0.95, 0.95, 1.0, 1.2, 1.35)
+
+CATEGORIES = ('MLA1051', 'MLA1648', 'MLA1276', 'MLA1574', 'MLA1499', 'MLA1430', 'MLA1000', 'MLA1132')
+ITEM_STATUSES = ('active', 'active', 'active', 'active', 'paused', 'closed')
+
+
+class TableCopy:
+    """Filas de una tabla acumuladas como CSV en memoria y enviadas con COPY"""
+
+    def __init__(self, table, columns):
+        self.table = table
+        self.columns = columns
+        self.rows = 0
+        self.total = 0
+        self._reset()
+
+    def _reset(self):
+        self.buffer = io.StringIO()
+        self.writer = csv.writer(self.buffer, lineterminator='\n')
+
+    def add(self, row):
+        # None -> campo vacío sin comillas, que COPY (FORMAT csv) carga como NULL
+        self.writer.writerow(row)
+        self.rows += 1
+
+    def flush(self, session):
+        if not self.rows:
+            return 0
+        self.buffer.seek(0)
+        cursor = session.connection().connection.cursor()
+        cursor.copy_expert(
+            f'COPY {self.table} ({", ".join(self.columns)}) FROM STDIN WITH (FORMAT csv)',
+            self.buffer
+        )
+        copied = self.rows
+        self.total += copied
+        self.rows = 0
+        self._reset()
+        return copied
+
+
+def poisson(rng, lam):
+    """Muestra de Poisson (Knuth para lambdas chicos, aproximación normal para grandes)"""
+    if lam <= 0:
+        return 0
+    if lam > 30:
+        return max(0, int(round(rng.gauss(lam, math.sqrt(lam)))))
+    limit, k, p = math.exp(-lam), 0, 1.0
+    while True:
+        p *= rng.random()
+        if p <= limit:
+            return k
+        k += 1
+
+
+def zipf_weights(n, exponent=1.1):
+    """Pesos acumulados Zipf para elegir publicaciones con random.choices(cum_weights=...)"""
+    cumulative, total = [], 0.0
+    for rank in range(1, n + 1):
+        total += 1.0 / rank ** exponent
+        cumulative.append(total)
+    return cumulative
+
+
+def day_factors(days):
+    """Factor de estacionalidad (semana × mes) para cada día del historial"""
+    return [WEEKDAY_FACTORS[day.weekday()] * MONTH_FACTORS[day.month - 1] for day in days]
+
+
+def next_ids(session):
+    """Próximos IDs libres: se asignan explícitamente para poder copiar las FKs en el mismo lote"""
+    from sqlalchemy import text
+
+    ids = {}
+    for table in ('users', 'ml_accounts', 'ml_account_metrics', 'ml_items', 'ml_orders', 'ml_order_items'):
+        ids[table] = session.execute(text(f'SELECT COALESCE(MAX(id), 0) + 1 FROM {table}')).scalar()
+    ids['ml_user_id'] = max(FIRST_ML_USER_ID, session.execute(text(
+        "SELECT COALESCE(MAX(ml_user_id::bigint), 0) + 1 FROM ml_accounts WHERE ml_user_id ~ '^[0-9]{1,18}$'"
+    )).scalar())
+    ids['ml_order_id'] = max(FIRST_ML_ORDER_ID, session.execute(text(
+        'SELECT COALESCE(MAX(ml_order_id), 0) + 1 FROM ml_orders'
+    )).scalar())
+    return ids
+
+
+def reset_sequences(session, tables):
+    from sqlalchemy import text
+
+    for table in tables:
+        session.execute(text(
+            f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), "
+            f'COALESCE((SELECT MAX(id) FROM {table}), 0) + 1, false)'
+        ))
+
+
+def set_notify_triggers(session, enabled):
+    """Los triggers de NOTIFY dispararían un evento por fila copiada"""
+    from sqlalchemy import text
+
+    action = 'ENABLE' if enabled else 'DISABLE'
+    for table, trigger in NOTIFY_TRIGGERS:
+        session.execute(text(f'ALTER TABLE {table} {action} TRIGGER {trigger}'))
+    session.commit()
+
+
+def assign_accounts(rng, user_ids, total_accounts):
+    """Una cuenta por usuario y el resto repartido con pesos Pareto (agencias con muchas cuentas)"""
+    owners = list(user_ids)
+    extra = total_accounts - len(owners)
+    if extra > 0:
+        cumulative, total = [], 0.0
+        for _ in user_ids:
+            total += rng.paretovariate(1.16)
+            cumulative.append(total)
+        owners.extend(rng.choices(user_ids, cum_weights=cumulative, k=extra))
+    rng.shuffle(owners)
+    return owners
+
+
+def generate_account(rng, args, account_id, user_id, ml_user_id, days, factors, ids, tables, now):
+    """Historial completo de una cuenta: publicaciones, métricas diarias y órdenes recientes"""
+    # Tamaño del vendedor: cola larga (la mayoría vende poco, unos pocos muchísimo)
+    scale = min(rng.paretovariate(1.16), args.max_scale)
+    base_orders = args.orders_per_day * scale
+    ticket = rng.lognormvariate(math.log(args.avg_ticket), 0.6)
+    conversion = rng.uniform(0.01, 0.05)  # órdenes por visita
+    growth = max(rng.gauss(0.15, 0.3), -0.9)  # tendencia anual (acotada: base negativa daría complejos)
+    # Parte de las cuentas empieza a vender en algún momento del historial
+    start_index = 0 if rng.random() < 0.6 else rng.randrange(len(days))
+
+    # Publicaciones con precio alrededor del ticket y popularidad Zipf
+    item_count = max(1, min(int(rng.paretovariate(1.3) * 5 * math.sqrt(scale)), args.max_items))
+    items = []
+    for rank in range(item_count):
+        items.append({
+            'id': ids['ml_items'] + rank,
+            'ml_item_id': f'MLA{ids["ml_items"] + rank + 8000000000}',
+            'price': round(ticket * rng.lognormvariate(0, 0.4), 2),
+            'status': ITEM_STATUSES[rng.randrange(len(ITEM_STATUSES))] if rank else 'active',
+            'sold': int(rng.paretovariate(1.5) * 10 / (rank + 1)),
+            'date_created': days[start_index]
+        })
+    ids['ml_items'] += item_count
+    weights = zipf_weights(item_count)
+
+    orders_from = len(days) - args.orders_days
+    total_sales, total_orders = 0.0, 0
+    for index in range(start_index, len(days)):
+        day = days[index]
+        years = (index - len(days)) / 365.0
+        expected = base_orders * factors[index] * (1 + growth) ** years * rng.lognormvariate(0, 0.25)
+        daily_orders = poisson(rng, expected)
+
+        if index >= orders_from:
+            # Órdenes con sus líneas; las ventas del día salen de las órdenes pagadas
+            daily_sales = 0.0
+            for _ in range(daily_orders):
+                created = datetime.datetime.combine(day, datetime.time()) + datetime.timedelta(
+                    seconds=rng.randrange(86400))
+                order_id = ids['ml_orders']
+                ids['ml_orders'] += 1
+                lines = 1 if rng.random() < 0.85 else rng.randint(2, 3)
+                order_total = 0.0
+                for item in rng.choices(items, cum_weights=weights, k=lines):
+                    quantity = 1 if rng.random() < 0.8 else rng.randint(2, 5)
+                    item['sold'] += quantity
+                    order_total += item['price'] * quantity
+                    tables['ml_order_items'].add((
+                        ids['ml_order_items'], order_id, account_id, created, item['ml_item_id'],
+                        quantity, f'{item["price"]:.2f}'
+                    ))
+                    ids['ml_order_items'] += 1
+                status = 'paid' if rng.random() < 0.94 else 'cancelled'
+                if status == 'paid':
+                    daily_sales += order_total
+                tables['ml_orders'].add((
+                    order_id, account_id, ids['ml_order_id'], status, f'{order_total:.2f}', 'ARS',
+                    rng.randrange(10000000, 999999999), created, now, now
+                ))
+                ids['ml_order_id'] += 1
+        else:
+            daily_sales = daily_orders * ticket * rng.lognormvariate(0, 0.2)
+
+        views = int(daily_orders / conversion * rng.uniform(0.8, 1.2)) + rng.randrange(5)
+        questions = poisson(rng, views * 0.01)
+        stamp = datetime.datetime.combine(day, datetime.time(23, 59))
+        tables['ml_account_metrics'].add((
+            ids['ml_account_metrics'], account_id, day, f'{daily_sales:.2f}', daily_orders, views, questions,
+            stamp, stamp
+        ))
+        ids['ml_account_metrics'] += 1
+        total_sales += daily_sales
+        total_orders += daily_orders
+
+    for item in items:
+        tables['ml_items'].add((
+            item['id'], account_id, item['ml_item_id'], f'Producto sintético {item["ml_item_id"]}',
+            CATEGORIES[item['id'] % len(CATEGORIES)], f'{item["price"]:.2f}', 'ARS',
+            rng.randrange(0, 200), item['sold'], item['status'], item['date_created'], now, now
+        ))
+
+    active_listings = sum(1 for item in items if item['status'] == 'active')
+    tables['ml_accounts'].add((
+        account_id, user_id, str(ml_user_id), f'SYNTH{ml_user_id}', 'Vendedor', f'Sintético {ml_user_id}',
+        f'synth{ml_user_id}@example.com', 'AR', 'MLA', f'APP_USR-synthetic-{ml_user_id}', None,
+        now + datetime.timedelta(hours=6), True, None, f'{total_sales:.2f}', total_orders, active_listings,
+        now, now - datetime.timedelta(days=len(days) - start_index), now
+    ))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generar datos sintéticos con COPY para pruebas de escala')
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--accounts', type=int, default=3000, help='total de cuentas ML (>= --users)')
+    parser.add_argument('--years', type=float, default=2, help='años de métricas diarias por cuenta')
+    parser.add_argument('--orders-days', type=int, default=90, help='últimos días con órdenes e items vendidos')
+    parser.add_argument('--orders-per-day', type=float, default=2.0, help='órdenes diarias de una cuenta típica')
+    parser.add_argument('--avg-ticket', type=float, default=8000.0, help='ticket medio (ARS)')
+    parser.add_argument('--max-scale', type=float, default=300.0, help='tope del tamaño relativo de una cuenta')
+    parser.add_argument('--max-items', type=int, default=2000, help='tope de publicaciones por cuenta')
+    parser.add_argument('--password', default='Synthetic123!')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--chunk', type=int, default=DEFAULT_CHUNK, help='cuentas por lote de COPY')
+    parser.add_argument('--rollups', action='store_true', help='recalcular rollups y velocidad por publicación al terminar (los totales combinados los mantienen los triggers)')
+    args = parser.parse_args()
+    if args.accounts < args.users:
+        parser.error('--accounts tiene que ser mayor o igual que --users')
+
+    from sqlalchemy import text
+    from app import app, db, rebuild_metrics_rollups, setup_database
+    from metrics_partitions import ensure_partitions
+    from item_velocity import rebuild_item_sales
+
+    rng = random.Random(args.seed)
+    now = datetime.datetime.utcnow().replace(microsecond=0)
+    today = datetime.date.today()
+    days = [today - datetime.timedelta(days=offset) for offset in range(int(args.years * 365), 0, -1)]
+    factors = day_factors(days)
+    # Un solo hash bcrypt para todos: hashear por usuario tardaría minutos
+    password_hash = bcrypt.hashpw(args.password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+
+    with app.app_context():
+        session = db.session
+        setup_database()
+        ensure_partitions(session, start=days[0])
+        session.commit()
+        ids = next_ids(session)
+        session.commit()
+
+        print(f'🧪 {args.users} usuarios, {args.accounts} cuentas, {len(days)} días de métricas, '
+              f'{args.orders_days} días de órdenes (seed {args.seed})')
+        started = time.perf_counter()
+
+        tables = {
+            'users': TableCopy('users', ('id', 'username', 'password_hash', 'created_at')),
+            'ml_accounts': TableCopy('ml_accounts', (
+                'id', 'user_id', 'ml_user_id', 'ml_nickname', 'ml_first_name', 'ml_last_name', 'ml_email',
+                'ml_country_id', 'ml_site_id', 'access_token', 'refresh_token', 'token_expires_at',
+                'is_active', 'account_alias', 'total_sales', 'total_orders', 'active_listings',
+                'last_metrics_update', 'created_at', 'updated_at')),
+            'ml_items': TableCopy('ml_items', (
+                'id', 'ml_account_id', 'ml_item_id', 'title', 'category_id', 'price', 'currency_id',
+                'available_quantity', 'sold_quantity', 'status', 'date_created', 'created_at', 'updated_at')),
+            'ml_account_metrics': TableCopy('ml_account_metrics', (
+                'id', 'ml_account_id', 'date', 'daily_sales', 'daily_orders', 'daily_views', 'daily_questions',
+                'created_at', 'updated_at')),
+            'ml_orders': TableCopy('ml_orders', (
+                'id', 'ml_account_id', 'ml_order_id', 'status', 'total_amount', 'currency_id', 'buyer_id',
+                'date_created', 'created_at', 'updated_at')),
+            'ml_order_items': TableCopy('ml_order_items', (
+                'id', 'order_id', 'ml_account_id', 'date_created', 'ml_item_id', 'quantity', 'unit_price')),
+        }
+        # Orden de COPY dentro de cada lote (respeta las FKs)
+        batch_order = ('ml_accounts', 'ml_items', 'ml_account_metrics', 'ml_orders', 'ml_order_items')
+
+        user_ids = list(range(ids['users'], ids['users'] + args.users))
+        for user_id in user_ids:
+            tables['users'].add((user_id, f'synthetic_{user_id}@example.com', password_hash, now))
+        tables['users'].flush(session)
+        session.commit()
+        ids['users'] += args.users
+
+        owners = assign_accounts(rng, user_ids, args.accounts)
+        set_notify_triggers(session, enabled=False)
+        try:
+            for offset in range(0, len(owners), args.chunk):
+                for user_id in owners[offset:offset + args.chunk]:
+                    generate_account(rng, args, ids['ml_accounts'], user_id, ids['ml_user_id'],
+                                     days, factors, ids, tables, now)
+                    ids['ml_accounts'] += 1
+                    ids['ml_user_id'] += 1
+                for table in batch_order:
+                    tables[table].flush(session)
+                session.commit()
+
+                done = min(offset + args.chunk, len(owners))
+                elapsed = time.perf_counter() - started
+                rows = sum(table.total for table in tables.values())
+                print(f'  {done}/{len(owners)} cuentas, {rows:,} filas '
+                      f'({rows / elapsed:,.0f} filas/s)')
+        finally:
+            session.rollback()
+            set_notify_triggers(session, enabled=True)
+
+        reset_sequences(session, tables)
+        session.commit()
+
+        if args.rollups:
+            print('🔁 Recalculando rollups y velocidad de ventas por publicación...')
+            rebuild_metrics_rollups()
+            rebuild_item_sales(session)
+
+        # Estadísticas frescas para el planner antes de medir nada
+        print('📊 ANALYZE...')
+        connection = db.engine.connect().execution_options(isolation_level='AUTOCOMMIT')
+        try:
+            for table in tables:
+                connection.execute(text(f'ANALYZE {table}'))
+        finally:
+            connection.close()
+
+    elapsed = time.perf_counter() - started
+    print(f'✅ Listo en {elapsed:.1f}s')
+    for name, table in tables.items():
+        print(f'   {name:<20} {table.total:>14,} filas')
+
+
+if __name__ == '__main__':
+    main()
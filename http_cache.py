@@ -0,0 +1,69 @@
+# http_cache.py - ETag fuertes y respuestas condicionales (304) para endpoints GET
+
+import hashlib
+from functools import wraps
+
+from flask import make_response, request
+
+from compression import available_encodings
+
+# Los clientes revalidan siempre, pero pueden reutilizar su copia con un 304
+DEFAULT_CACHE_CONTROL = 'private, no-cache'
+
+
+def compute_etag(*parts):
+    """ETag fuerte a partir de los valores que determinan el contenido de la respuesta"""
+    digest = hashlib.sha1('|'.join(str(part) for part in parts).encode('utf-8')).hexdigest()
+    return digest[:32]
+
+
+def matching_etag(etag):
+    """
+    Variante del ETag de If-None-Match que esta petición recibiría en un 200: la base
+    (cuerpo sin comprimir) o la de la codificación negociada (compress_response le agrega
+    el sufijo). None si el cliente no tiene ninguna; el 304 tiene que repetir la que tiene.
+    """
+    if_none_match = request.if_none_match
+    if not if_none_match:
+        return None
+    candidates = [etag]
+    encoding = request.accept_encodings.best_match(available_encodings())
+    if encoding:
+        candidates.append(f'{etag}-{encoding}')
+    return next((candidate for candidate in candidates if if_none_match.contains(candidate)), None)
+
+
+def etag_cached(etag_func, cache_control=DEFAULT_CACHE_CONTROL):
+    """
+    Decorador para rutas GET protegidas con token_required.
+    etag_func(current_user, *args, **kwargs) devuelve las partes del ETag
+    (o None para no usar caché) y debe ser mucho más barata que la vista:
+    si el cliente ya tiene la versión actual se responde 304 sin construir el cuerpo.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated(current_user, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return f(current_user, *args, **kwargs)
+
+            parts = etag_func(current_user, *args, **kwargs)
+            if parts is None:
+                return f(current_user, *args, **kwargs)
+
+            etag = compute_etag(request.path, *parts)
+            matched = matching_etag(etag)
+            if matched:
+                # compress_response no toca los 304: el ETag y Vary se ponen acá
+                response = make_response('', 304)
+                response.set_etag(matched)
+                response.vary.add('Accept-Encoding')
+            else:
+                response = make_response(f(current_user, *args, **kwargs))
+                if response.status_code != 200:
+                    return response
+                response.set_etag(etag)
+
+            response.headers['Cache-Control'] = cache_control
+            return response
+        return decorated
+    return decorator
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+Índice de velocidad de ventas por publicación (unidades y facturación a 7/30/90 días)
+Se mantiene en forma incremental: cada sincronización de órdenes suma sus líneas
+a ml_item_daily_sales y recalcula solo las publicaciones tocadas. Un job diario
+corre las ventanas: recalcula las publicaciones con ventas que salieron de alguna
+ventana y borra las que ya no vendieron en 90 días.
+
+Mantenimiento diario (cron):
+    python item_velocity.py
+Backfill completo desde ml_order_items:
+    python item_velocity.py rebuild
+"""
+
+import datetime
+import os
+import sys
+
+from dotenv import load_dotenv
+from sqlalchemy import text
+
+WINDOWS = (7, 30, 90)
+PAID_STATUSES = ('paid',)
+
+_WINDOW_COLUMNS = ', '.join(f'units_{days}d, revenue_{days}d' for days in WINDOWS)
+_WINDOW_SUMS = ', '.join(
+    f'COALESCE(SUM(units) FILTER (WHERE date > CAST(:as_of AS date) - {days}), 0), '
+    f'COALESCE(SUM(revenue) FILTER (WHERE date > CAST(:as_of AS date) - {days}), 0)'
+    for days in WINDOWS
+)
+_WINDOW_UPDATES = ', '.join(
+    f'units_{days}d = EXCLUDED.units_{days}d, revenue_{days}d = EXCLUDED.revenue_{days}d' for days in WINDOWS
+)
+
+RECOMPUTE_SQL = f"""
+    INSERT INTO ml_item_sales_velocity
+        (ml_account_id, ml_item_id, {_WINDOW_COLUMNS}, last_sale_date, as_of, updated_at)
+    SELECT ml_account_id, ml_item_id, {_WINDOW_SUMS}, MAX(date), :as_of, now() at time zone 'utc'
+    FROM ml_item_daily_sales
+    WHERE date > CAST(:as_of AS date) - {max(WINDOWS)} AND date <= :as_of
+      AND (ml_account_id, ml_item_id) IN (
+          SELECT * FROM unnest(CAST(:account_ids AS integer[]), CAST(:item_ids AS varchar[])))
+    GROUP BY ml_account_id, ml_item_id
+    ON CONFLICT (ml_account_id, ml_item_id) DO UPDATE SET
+        {_WINDOW_UPDATES}, last_sale_date = EXCLUDED.last_sale_date,
+        as_of = EXCLUDED.as_of, updated_at = EXCLUDED.updated_at
+"""
+
+
+def record_item_sales(session, lines):
+    """
+    Sumar líneas vendidas (o restar, con cantidades negativas para órdenes canceladas)
+    a los totales diarios. lines: [(ml_account_id, ml_item_id, fecha, unidades, facturación)].
+    Devuelve las publicaciones tocadas para recompute_velocity().
+    """
+    totals = {}
+    for account_id, item_id, day, units, revenue in lines:
+        key = (account_id, item_id, day)
+        current = totals.get(key, (0, 0))
+        totals[key] = (current[0] + units, current[1] + revenue)
+    if not totals:
+        return set()
+
+    session.execute(text("""
+        INSERT INTO ml_item_daily_sales (ml_account_id, ml_item_id, date, units, revenue)
+        VALUES (:account_id, :item_id, :date, :units, :revenue)
+        ON CONFLICT (ml_account_id, ml_item_id, date) DO UPDATE SET
+            units = ml_item_daily_sales.units + EXCLUDED.units,
+            revenue = ml_item_daily_sales.revenue + EXCLUDED.revenue
+    """), [
+        {'account_id': account_id, 'item_id': item_id, 'date': day, 'units': units, 'revenue': revenue}
+        for (account_id, item_id, day), (units, revenue) in totals.items()
+    ])
+    return {(account_id, item_id) for account_id, item_id, _ in totals}
+
+
+def recompute_velocity(session, keys, as_of=None):
+    """Recalcular las ventanas de las publicaciones dadas desde sus totales diarios"""
+    if not keys:
+        return 0
+    as_of = as_of or datetime.date.today()
+    keys = sorted(keys)
+    account_ids = [account_id for account_id, _ in keys]
+    item_ids = [item_id for _, item_id in keys]
+    session.execute(text(RECOMPUTE_SQL), {'as_of': as_of, 'account_ids': account_ids, 'item_ids': item_ids})
+    # Publicaciones que quedaron sin ventas en la ventana más larga
+    session.execute(text("""
+        DELETE FROM ml_item_sales_velocity
+        WHERE (ml_account_id, ml_item_id) IN (
+            SELECT * FROM unnest(CAST(:account_ids AS integer[]), CAST(:item_ids AS varchar[])))
+          AND NOT EXISTS (
+            SELECT 1 FROM ml_item_daily_sales d
+            WHERE d.ml_account_id = ml_item_sales_velocity.ml_account_id
+              AND d.ml_item_id = ml_item_sales_velocity.ml_item_id
+              AND d.date > CAST(:as_of AS date) - :days AND d.units <> 0)
+    """), {'as_of': as_of, 'days': max(WINDOWS), 'account_ids': account_ids, 'item_ids': item_ids})
+    return len(keys)
+
+
+def roll_windows(session, as_of=None):
+    """
+    Avanzar las ventanas hasta as_of (hoy): solo se recalculan las publicaciones con
+    ventas en días que salieron de alguna ventana desde su último cálculo.
+    """
+    as_of = as_of or datetime.date.today()
+    crossed = ' OR '.join(
+        f'(d.date > v.as_of - {days} AND d.date <= CAST(:as_of AS date) - {days})' for days in WINDOWS
+    )
+    keys = {tuple(row) for row in session.execute(text(f"""
+        SELECT DISTINCT v.ml_account_id, v.ml_item_id
+        FROM ml_item_sales_velocity v
+        JOIN ml_item_daily_sales d ON d.ml_account_id = v.ml_account_id AND d.ml_item_id = v.ml_item_id
+        WHERE v.as_of < :as_of AND ({crossed})
+    """), {'as_of': as_of})}
+    recomputed = recompute_velocity(session, keys, as_of)
+
+    # El resto no cambió: solo se marca como vigente a la fecha
+    session.execute(text('UPDATE ml_item_sales_velocity SET as_of = :as_of WHERE as_of < :as_of'),
+                    {'as_of': as_of})
+    removed = session.execute(text(
+        'DELETE FROM ml_item_sales_velocity WHERE last_sale_date <= CAST(:as_of AS date) - :days'
+    ), {'as_of': as_of, 'days': max(WINDOWS)}).rowcount
+    session.commit()
+    return {'recomputed': recomputed, 'removed': removed}
+
+
+def rebuild_item_sales(session, as_of=None):
+    """Recalcular totales diarios y velocidad desde ml_order_items (backfill inicial)"""
+    as_of = as_of or datetime.date.today()
+    session.execute(text('DELETE FROM ml_item_sales_velocity'))
+    session.execute(text('DELETE FROM ml_item_daily_sales'))
+    session.execute(text("""
+        INSERT INTO ml_item_daily_sales (ml_account_id, ml_item_id, date, units, revenue)
+        SELECT i.ml_account_id, i.ml_item_id, i.date_created::date,
+               SUM(i.quantity), SUM(i.quantity * i.unit_price)
+        FROM ml_order_items i
+        JOIN ml_orders o ON o.id = i.order_id
+        WHERE o.status = ANY(:statuses)
+        GROUP BY i.ml_account_id, i.ml_item_id, i.date_created::date
+    """), {'statuses': list(PAID_STATUSES)})
+    session.execute(text(f"""
+        INSERT INTO ml_item_sales_velocity
+            (ml_account_id, ml_item_id, {_WINDOW_COLUMNS}, last_sale_date, as_of, updated_at)
+        SELECT ml_account_id, ml_item_id, {_WINDOW_SUMS}, MAX(date), :as_of, now() at time zone 'utc'
+        FROM ml_item_daily_sales
+        WHERE date > CAST(:as_of AS date) - {max(WINDOWS)} AND date <= :as_of
+        GROUP BY ml_account_id, ml_item_id
+    """), {'as_of': as_of})
+    session.commit()
+
+
+def main():
+    """Correr las ventanas (cron diario) o reconstruir todo con 'rebuild'"""
+    load_dotenv()
+    sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+    import tracing
+    from app import app, db
+
+    command = 'rebuild' if len(sys.argv) > 1 and sys.argv[1] == 'rebuild' else 'roll_windows'
+    with app.app_context(), tracing.continue_trace(tracing.environ_carrier(), f'cron item_velocity.{command}'):
+        if command == 'rebuild':
+            rebuild_item_sales(db.session)
+            print('✅ Velocidad de ventas reconstruida desde ml_order_items')
+        else:
+            result = roll_windows(db.session)
+            print(f"📦 Ventanas al {datetime.date.today()}: {result['recomputed']} publicaciones recalculadas, "
+                  f"{result['removed']} sin ventas en {max(WINDOWS)} días")
+    tracing.flush()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+# json_provider.py - Serialización JSON rápida para las respuestas de la API
+
+import datetime
+import json
+from decimal import Decimal
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # orjson es opcional, sin él se usa json de la stdlib
+    orjson = None
+
+
+def _default(value):
+    """Tipos que no son JSON nativo: fechas en ISO 8601 y Decimal como float"""
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """
+    Proveedor JSON de Flask: usa orjson si está instalado.
+    Serializa date/datetime en ISO 8601 (no en formato HTTP como Flask)
+    y Decimal como float, así las filas de la base se pueden devolver tal cual.
+    """
+
+    # Ordenar claves cuesta tiempo y ningún cliente depende del orden
+    sort_keys = False
+
+    def dumps(self, obj, **kwargs):
+        if orjson is not None and not kwargs:
+            return orjson.dumps(obj, default=_default, option=orjson.OPT_NON_STR_KEYS).decode('utf-8')
+        kwargs.setdefault('default', _default)
+        kwargs.setdefault('ensure_ascii', self.ensure_ascii)
+        kwargs.setdefault('sort_keys', self.sort_keys)
+        return json.dumps(obj, **kwargs)
+
+    def loads(self, s, **kwargs):
+        if orjson is not None and not kwargs:
+            return orjson.loads(s)
+        return json.loads(s, **kwargs)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+
+        if orjson is not None:
+            # Evitar el paso por str: orjson ya devuelve bytes
+            body = orjson.dumps(obj, default=_default, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_APPEND_NEWLINE)
+        else:
+            body = f'{self.dumps(obj)}\n'
+
+        return self._app.response_class(body, mimetype=self.mimetype)
+
+
+def init_json_provider(app):
+    """Registrar FastJSONProvider en la aplicación Flask"""
+    app.json = FastJSONProvider(app)
+    return app.json
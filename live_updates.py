@@ -0,0 +1,211 @@
+# live_updates.py - Actualizaciones en vivo de cuentas ML vía Postgres LISTEN/NOTIFY + SSE
+
+import json
+import queue
+import select
+import threading
+import time
+
+import psycopg2
+from sqlalchemy import text
+
+import tracing
+
+# Canal de NOTIFY usado por los triggers de ml_accounts y ml_account_metrics
+CHANNEL = 'ml_account_updates'
+
+# Segundos entre comentarios keep-alive del stream SSE
+HEARTBEAT_SECONDS = 15
+
+# Eventos pendientes por suscriptor antes de descartar (cliente lento)
+SUBSCRIBER_QUEUE_SIZE = 100
+
+# Setting de Postgres con el traceparent de la transacción que escribe; los triggers lo
+# agregan al NOTIFY y el hilo LISTEN continúa esa traza
+TRACEPARENT_SETTING = 'smartselling.traceparent'
+
+# Triggers que publican un delta pequeño (sin tokens) en cada cambio de fila.
+# Los emite la base, así que cubren refrescos, workers y webhooks por igual.
+NOTIFY_TRIGGERS_DDL = (
+    f"""
+    CREATE OR REPLACE FUNCTION notify_ml_account_update() RETURNS trigger AS $$
+    DECLARE
+        account ml_accounts%ROWTYPE;
+    BEGIN
+        IF TG_OP = 'DELETE' THEN
+            account := OLD;
+        ELSE
+            account := NEW;
+        END IF;
+        PERFORM pg_notify('{CHANNEL}', json_build_object(
+            'type', 'account',
+            'op', lower(TG_OP),
+            'user_id', account.user_id,
+            'account_id', account.id,
+            'ml_nickname', account.ml_nickname,
+            'account_alias', account.account_alias,
+            'is_active', account.is_active,
+            'total_sales', account.total_sales,
+            'total_orders', account.total_orders,
+            'active_listings', account.active_listings,
+            'last_metrics_update', account.last_metrics_update,
+            'traceparent', current_setting('{TRACEPARENT_SETTING}', true)
+        )::text);
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql
+    """,
+    "DROP TRIGGER IF EXISTS ml_accounts_notify ON ml_accounts",
+    """
+    CREATE TRIGGER ml_accounts_notify
+    AFTER INSERT OR UPDATE OR DELETE ON ml_accounts
+    FOR EACH ROW EXECUTE FUNCTION notify_ml_account_update()
+    """,
+    f"""
+    CREATE OR REPLACE FUNCTION notify_ml_account_metrics_update() RETURNS trigger AS $$
+    BEGIN
+        PERFORM pg_notify('{CHANNEL}', json_build_object(
+            'type', 'daily_metrics',
+            'op', lower(TG_OP),
+            'user_id', (SELECT user_id FROM ml_accounts WHERE id = NEW.ml_account_id),
+            'account_id', NEW.ml_account_id,
+            'date', NEW.date,
+            'daily_sales', NEW.daily_sales,
+            'daily_orders', NEW.daily_orders,
+            'daily_views', NEW.daily_views,
+            'daily_questions', NEW.daily_questions,
+            'traceparent', current_setting('{TRACEPARENT_SETTING}', true)
+        )::text);
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql
+    """,
+    "DROP TRIGGER IF EXISTS ml_account_metrics_notify ON ml_account_metrics",
+    """
+    CREATE TRIGGER ml_account_metrics_notify
+    AFTER INSERT OR UPDATE ON ml_account_metrics
+    FOR EACH ROW EXECUTE FUNCTION notify_ml_account_metrics_update()
+    """,
+)
+
+
+def install_notify_triggers(session):
+    """Crear (o reemplazar) los triggers de NOTIFY; idempotente"""
+    for statement in NOTIFY_TRIGGERS_DDL:
+        session.execute(text(statement))
+
+
+def set_transaction_traceparent(session, transaction, connection):
+    """
+    Listener after_begin: guardar el traceparent del span actual en la transacción (SET LOCAL)
+    para que los NOTIFY que emita lleven la traza. Sin exporter no se agrega el round trip.
+    """
+    if tracing.TRACING_EXPORTER == 'none':
+        return
+    carrier = tracing.inject()
+    if carrier:
+        connection.execute(text('SELECT set_config(:name, :value, true)'),
+                           {'name': TRACEPARENT_SETTING, 'value': carrier['traceparent']})
+
+
+class UpdateBroker:
+    """
+    Una sola conexión LISTEN por proceso que reparte cada NOTIFY
+    a las colas de los suscriptores del usuario correspondiente.
+    """
+
+    def __init__(self, dsn_factory):
+        self._dsn_factory = dsn_factory
+        self._subscribers = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def subscribe(self, user_id):
+        """Registrar un suscriptor y devolver su cola de eventos"""
+        events = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        with self._lock:
+            self._subscribers.setdefault(user_id, set()).add(events)
+            if self._thread is None or not self._thread.is_alive():
+                # El DSN se resuelve acá, dentro del request: el hilo no tiene contexto de la app
+                dsn = self._dsn_factory()
+                self._thread = threading.Thread(target=self._listen, args=(dsn,), name='ml-updates-listener',
+                                                daemon=True)
+                self._thread.start()
+        return events
+
+    def unsubscribe(self, user_id, events):
+        """Quitar un suscriptor (al cerrarse el stream)"""
+        with self._lock:
+            subscribers = self._subscribers.get(user_id)
+            if subscribers:
+                subscribers.discard(events)
+                if not subscribers:
+                    del self._subscribers[user_id]
+
+    def subscriber_count(self):
+        with self._lock:
+            return sum(len(subscribers) for subscribers in self._subscribers.values())
+
+    def publish(self, payload):
+        """Entregar un evento a los suscriptores de su usuario"""
+        with self._lock:
+            subscribers = list(self._subscribers.get(payload.get('user_id'), ()))
+        for events in subscribers:
+            try:
+                events.put_nowait(payload)
+            except queue.Full:
+                # Cliente que no consume: se descarta el evento, el próximo lo pone al día
+                pass
+
+    def _listen(self, dsn):
+        """Hilo de fondo: LISTEN con reconexión"""
+        backoff = 1
+        while True:
+            connection = None
+            try:
+                connection = psycopg2.connect(dsn)
+                connection.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+                with connection.cursor() as cursor:
+                    cursor.execute(f'LISTEN {CHANNEL}')
+                backoff = 1
+
+                while True:
+                    if select.select([connection], [], [], HEARTBEAT_SECONDS) == ([], [], []):
+                        continue
+                    connection.poll()
+                    while connection.notifies:
+                        notify = connection.notifies.pop(0)
+                        try:
+                            payload = json.loads(notify.payload)
+                        except ValueError:
+                            print(f"Invalid notify payload on {CHANNEL}: {notify.payload[:200]}")
+                            continue
+                        carrier = {'traceparent': payload.pop('traceparent', None)}
+                        with tracing.continue_trace(carrier, 'live_updates.notify', **{
+                                'notify.type': payload.get('type'), 'notify.op': payload.get('op')}):
+                            self.publish(payload)
+            except Exception as e:
+                print(f"Live updates listener error, reconnecting in {backoff}s: {e}")
+                time.sleep(backoff)
+                backoff = min(backoff * 2, 30)
+            finally:
+                if connection is not None:
+                    connection.close()
+
+
+def format_sse(data, event=None):
+    """Formatear un mensaje Server-Sent Events"""
+    message = f'event: {event}\n' if event else ''
+    return f'{message}data: {json.dumps(data, default=str)}\n\n'
+
+
+def sse_events(events, heartbeat=HEARTBEAT_SECONDS):
+    """Generador del stream SSE: eventos de la cola y keep-alive periódico"""
+    yield format_sse({'status': 'connected'}, event='ready')
+    while True:
+        try:
+            payload = events.get(timeout=heartbeat)
+        except queue.Empty:
+            yield ': keep-alive\n\n'
+            continue
+        yield format_sse(payload, event=payload.get('type', 'message'))
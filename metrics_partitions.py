@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""
+Particionado mensual de ml_account_metrics
+Crea particiones futuras, migra la tabla existente a particionada
+y aplica la política de retención eliminando particiones completas
+"""
+
+import datetime
+import os
+import re
+import sys
+
+from dotenv import load_dotenv
+from sqlalchemy import text
+
+# .env antes de leer la configuración: como cron este módulo se ejecuta sin pasar por app.py
+load_dotenv()
+
+# Configuración de particionado (meses)
+METRICS_TABLE = 'ml_account_metrics'
+METRICS_PARTITIONS_AHEAD = int(os.getenv('METRICS_PARTITIONS_AHEAD', '3'))
+# 0 = conservar todo el historial
+METRICS_RETENTION_MONTHS = int(os.getenv('METRICS_RETENTION_MONTHS', '0'))
+
+_PARTITION_RE = re.compile(r'^%s_y(\d{4})m(\d{2})$' % METRICS_TABLE)
+
+
+def month_start(day):
+    """Primer día del mes de la fecha dada"""
+    return datetime.date(day.year, day.month, 1)
+
+
+def add_months(day, months):
+    """Sumar (o restar) meses a un primer día de mes"""
+    index = day.year * 12 + (day.month - 1) + months
+    return datetime.date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(day):
+    """Nombre de la partición mensual que contiene la fecha"""
+    start = month_start(day)
+    return f'{METRICS_TABLE}_y{start.year:04d}m{start.month:02d}'
+
+
+def is_partitioned(session):
+    """True si ml_account_metrics ya es una tabla particionada"""
+    relkind = session.execute(text(
+        "SELECT c.relkind FROM pg_class c "
+        "JOIN pg_namespace n ON n.oid = c.relnamespace "
+        "WHERE n.nspname = current_schema() AND c.relname = :name"
+    ), {'name': METRICS_TABLE}).scalar()
+    return relkind == 'p'
+
+
+def list_partitions(session):
+    """Listar las particiones mensuales existentes como {primer_dia_mes: nombre}"""
+    rows = session.execute(text(
+        "SELECT child.relname FROM pg_inherits i "
+        "JOIN pg_class parent ON parent.oid = i.inhparent "
+        "JOIN pg_class child ON child.oid = i.inhrelid "
+        "WHERE parent.relname = :name"
+    ), {'name': METRICS_TABLE}).fetchall()
+
+    partitions = {}
+    for (name,) in rows:
+        match = _PARTITION_RE.match(name)
+        if match:
+            partitions[datetime.date(int(match.group(1)), int(match.group(2)), 1)] = name
+    return partitions
+
+
+def create_partition(session, day):
+    """Crear (si no existe) la partición del mes que contiene la fecha"""
+    start = month_start(day)
+    end = add_months(start, 1)
+    name = partition_name(start)
+    session.execute(text(
+        f'CREATE TABLE IF NOT EXISTS "{name}" PARTITION OF "{METRICS_TABLE}" '
+        f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+    ))
+    return name
+
+
+def ensure_partitions(session, start=None, months_ahead=None):
+    """Asegurar particiones desde el mes de start hasta months_ahead meses en el futuro"""
+    if months_ahead is None:
+        months_ahead = METRICS_PARTITIONS_AHEAD
+
+    today = datetime.date.today()
+    first = month_start(start or today)
+    last = add_months(month_start(today), months_ahead)
+
+    created = []
+    current = first
+    while current <= last:
+        created.append(create_partition(session, current))
+        current = add_months(current, 1)
+    return created
+
+
+def ensure_partition_for(session, day):
+    """
+    Asegurar la partición de una fecha antes de insertar.
+    Se consulta el catálogo cada vez (to_regclass es barato) en lugar de recordar los meses
+    en el proceso: un rollback deshace el CREATE y el cron de retención corre en otro proceso,
+    así que un registro local podría dar por existente una partición que ya no está.
+    """
+    if session.execute(text('SELECT to_regclass(:name)'), {'name': partition_name(day)}).scalar() is None:
+        create_partition(session, day)
+
+
+def drop_expired_partitions(session, retention_months=None):
+    """
+    Eliminar las particiones completamente fuera del período de retención.
+    Hace DROP TABLE de la partición en vez de DELETE fila por fila.
+    """
+    if retention_months is None:
+        retention_months = METRICS_RETENTION_MONTHS
+    if retention_months <= 0:
+        return []
+
+    cutoff = add_months(month_start(datetime.date.today()), -retention_months)
+    dropped = []
+    for start, name in sorted(list_partitions(session).items()):
+        # Solo se elimina si todo el mes quedó antes del corte
+        if add_months(start, 1) <= cutoff:
+            session.execute(text(f'DROP TABLE IF EXISTS "{name}"'))
+            dropped.append(name)
+    return dropped
+
+
+def migrate_to_partitioned(session, metrics_table):
+    """
+    Convertir una tabla ml_account_metrics común en particionada por mes.
+    metrics_table es MLAccountMetrics.__table__ (ya declarada con PARTITION BY).
+    Devuelve True si hubo que migrar.
+    """
+    exists = session.execute(text(
+        "SELECT to_regclass(:name) IS NOT NULL"
+    ), {'name': METRICS_TABLE}).scalar()
+    if not exists or is_partitioned(session):
+        return False
+
+    legacy = f'{METRICS_TABLE}_legacy'
+
+    # Renombrar la tabla vieja junto con sus constraints y secuencia para liberar los nombres
+    session.execute(text(f'ALTER TABLE "{METRICS_TABLE}" RENAME TO "{legacy}"'))
+    session.execute(text(f'ALTER TABLE "{legacy}" RENAME CONSTRAINT "_ml_account_date_uc" TO "_ml_account_date_uc_legacy"'))
+    session.execute(text(f'ALTER TABLE "{legacy}" RENAME CONSTRAINT "{METRICS_TABLE}_pkey" TO "{legacy}_pkey"'))
+    session.execute(text(f'ALTER SEQUENCE IF EXISTS "{METRICS_TABLE}_id_seq" RENAME TO "{legacy}_id_seq"'))
+
+    # Crear la tabla particionada y las particiones que cubren el historial
+    metrics_table.create(bind=session.connection())
+    oldest = session.execute(text(f'SELECT MIN(date) FROM "{legacy}"')).scalar()
+    ensure_partitions(session, start=oldest)
+
+    # Copiar solo las columnas que ya existían en la tabla vieja
+    legacy_columns = {row[0] for row in session.execute(text(
+        "SELECT column_name FROM information_schema.columns "
+        "WHERE table_schema = current_schema() AND table_name = :name"
+    ), {'name': legacy})}
+    columns = ', '.join(f'"{column.name}"' for column in metrics_table.columns if column.name in legacy_columns)
+    session.execute(text(
+        f'INSERT INTO "{METRICS_TABLE}" ({columns}) SELECT {columns} FROM "{legacy}"'
+    ))
+    session.execute(text(
+        f"SELECT setval(pg_get_serial_sequence('{METRICS_TABLE}', 'id'), "
+        f'COALESCE((SELECT MAX(id) FROM "{legacy}"), 0) + 1, false)'
+    ))
+    session.execute(text(f'DROP TABLE "{legacy}" CASCADE'))
+    return True
+
+
+def setup_partitions(session, metrics_table):
+    """Migrar si hace falta, crear particiones futuras y aplicar retención"""
+    migrated = migrate_to_partitioned(session, metrics_table)
+    created = ensure_partitions(session)
+    dropped = drop_expired_partitions(session)
+    session.commit()
+    return {'migrated': migrated, 'partitions': created, 'dropped': dropped}
+
+
+def main():
+    """Mantenimiento de particiones (pensado para cron diario)"""
+    sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+    import tracing
+    from app import app, db, MLAccountMetrics
+
+    with app.app_context(), tracing.continue_trace(tracing.environ_carrier(), 'cron metrics_partitions'):
+        result = setup_partitions(db.session, MLAccountMetrics.__table__)
+        if result['migrated']:
+            print(f"✅ {METRICS_TABLE} migrada a tabla particionada")
+        print(f"📅 Particiones vigentes: {', '.join(result['partitions'])}")
+        if result['dropped']:
+            print(f"🗑️  Particiones eliminadas por retención: {', '.join(result['dropped'])}")
+    tracing.flush()
+
+
+if __name__ == '__main__':
+    main()
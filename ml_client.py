@@ -0,0 +1,377 @@
+# ml_client.py - Cliente HTTP compartido para la API de Mercado Libre
+
+import hashlib
+import os
+import pickle
+import re
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from cache import MISSING, MemoryBackend
+
+try:
+    import redis
+except ImportError:  # redis es opcional, solo para single-flight entre workers
+    redis = None
+
+try:
+    import orjson
+except ImportError:  # orjson es opcional, sin él se usa el decoder de requests
+    orjson = None
+
+# Configuración del cliente ML
+ML_API_URL = os.getenv('ML_API_URL', 'https://api.mercadolibre.com')
+ML_API_TIMEOUT = float(os.getenv('ML_API_TIMEOUT', '10'))  # segundos
+ML_API_POOL_SIZE = int(os.getenv('ML_API_POOL_SIZE', '20'))
+ML_USER_AGENT = 'SmartSelling-App/1.0'
+
+# Single-flight entre procesos (opcional): vacío = solo dentro del proceso
+ML_SINGLEFLIGHT_REDIS_URL = os.getenv('ML_SINGLEFLIGHT_REDIS_URL', '')
+ML_SINGLEFLIGHT_LOCK_MS = int(os.getenv('ML_SINGLEFLIGHT_LOCK_MS', str(int(ML_API_TIMEOUT * 1000) + 1000)))
+
+# Peticiones condicionales (ETag / Last-Modified): cuánto se guarda el último cuerpo
+ML_CONDITIONAL_TTL = int(os.getenv('ML_CONDITIONAL_TTL', '86400'))  # segundos, 0 = desactivado
+ML_CONDITIONAL_MAX_ENTRIES = int(os.getenv('ML_CONDITIONAL_MAX_ENTRIES', '4096'))
+
+# Segmentos de path que son IDs (usuario, me, item MLA123...) y no forman parte de la familia
+_ID_SEGMENT_RE = re.compile(r'^(\d+|me|[A-Z]{3}\d+)$')
+
+
+def endpoint_family(url):
+    """
+    Familia de endpoint para métricas, sin IDs:
+    /users/123 -> users, /users/123/items/search -> items/search, /oauth/token -> oauth/token
+    """
+    segments = [segment for segment in urlsplit(url).path.strip('/').split('/')
+                if segment and not _ID_SEGMENT_RE.match(segment)]
+    if len(segments) > 1 and segments[0] == 'users':
+        segments = segments[1:]
+    return '/'.join(segments) or '/'
+
+
+class MLResponse:
+    """
+    Respuesta de ML ya leída y parseada. La misma instancia puede
+    compartirse entre varios llamadores: tratar data como solo lectura.
+    not_modified indica que ML respondió 304 y el cuerpo es el guardado.
+    """
+
+    __slots__ = ('status_code', 'data', 'text', 'headers', 'elapsed', 'size',
+                 'etag', 'last_modified', 'not_modified', 'latency_saved')
+
+    def __init__(self, status_code, data, text, headers, elapsed, size=0,
+                 etag=None, last_modified=None, not_modified=False, latency_saved=0.0):
+        self.status_code = status_code
+        self.data = data
+        self.text = text
+        self.headers = headers
+        self.elapsed = elapsed
+        self.size = size
+        self.etag = etag
+        self.last_modified = last_modified
+        self.not_modified = not_modified
+        self.latency_saved = latency_saved
+
+    @property
+    def ok(self):
+        return 200 <= self.status_code < 300
+
+    def json(self):
+        return self.data
+
+    @classmethod
+    def from_requests(cls, response):
+        try:
+            # orjson decodifica los bytes directo, sin pasar por response.text
+            data = orjson.loads(response.content) if orjson is not None else response.json()
+        except ValueError:  # orjson.JSONDecodeError también es ValueError
+            data = None
+        # El texto se guarda en los errores (los cuerpos JSON de OAuth traen el mensaje de ML)
+        # y si no es JSON; las respuestas OK cacheadas no duplican el cuerpo
+        ok = 200 <= response.status_code < 300
+        return cls(response.status_code, data, response.text if data is None or not ok else '',
+                   dict(response.headers), response.elapsed.total_seconds(),
+                   size=len(response.content),
+                   etag=response.headers.get('ETag'),
+                   last_modified=response.headers.get('Last-Modified'))
+
+    def revalidated(self, elapsed):
+        """Copia de una respuesta guardada, servida tras un 304"""
+        # Ahorro estimado contra la descarga completa original
+        return MLResponse(self.status_code, self.data, self.text, self.headers, elapsed,
+                          size=self.size, etag=self.etag, last_modified=self.last_modified,
+                          not_modified=True, latency_saved=max(self.elapsed - elapsed, 0.0))
+
+
+class ConditionalUsage:
+    """Acumulado de peticiones condicionales (por ciclo de refresco o global)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.not_modified = 0
+        self.bytes_saved = 0
+        self.latency_saved = 0.0
+
+    def add(self, response):
+        with self._lock:
+            self.requests += 1
+            if response.not_modified:
+                self.not_modified += 1
+                self.bytes_saved += response.size
+                self.latency_saved += response.latency_saved
+
+    @property
+    def all_not_modified(self):
+        return self.requests > 0 and self.not_modified == self.requests
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                'requests': self.requests,
+                'not_modified': self.not_modified,
+                'bytes_saved': self.bytes_saved,
+                'latency_saved_ms': round(self.latency_saved * 1000, 1)
+            }
+
+
+class _Call:
+    __slots__ = ('event', 'result', 'error')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Deduplicación de llamadas concurrentes idénticas dentro del proceso:
+    el primero ejecuta, los demás esperan y reciben el mismo resultado.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.deduplicated = 0
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                self.deduplicated += 1
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+
+
+class RedisSingleFlight:
+    """
+    Deduplicación entre workers con Redis: el que toma el lock ejecuta y publica el
+    resultado en un canal; los que llegan mientras la llamada está en curso se suscriben
+    y lo reciben. No queda nada guardado: una llamada posterior siempre va a ML. Si el
+    líder falla o muere (el lock expira), el que espera reintenta y puede tomar el lock.
+    """
+
+    WAIT_INTERVAL = 0.1
+
+    def __init__(self, url):
+        if redis is None:
+            raise RuntimeError('ML_SINGLEFLIGHT_REDIS_URL requires the redis package (pip install redis)')
+        self.client = redis.Redis.from_url(url)
+        self.deduplicated = 0
+
+    def do(self, key, fn):
+        lock_key = f'smartselling:ml-flight:lock:{key}'
+        channel = f'smartselling:ml-flight:done:{key}'
+
+        # Suscribirse antes de intentar el lock: así no se pierde la publicación de un
+        # líder que termina justo entre el intento fallido y la espera
+        pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(channel)
+        try:
+            while True:
+                if self.client.set(lock_key, b'1', nx=True, px=ML_SINGLEFLIGHT_LOCK_MS):
+                    try:
+                        result = fn()
+                        self.client.publish(channel, pickle.dumps(result))
+                        return result
+                    finally:
+                        self.client.delete(lock_key)
+
+                # Otro worker está haciendo la misma llamada
+                while True:
+                    message = pubsub.get_message(timeout=self.WAIT_INTERVAL)
+                    if message is not None:
+                        self.deduplicated += 1
+                        return pickle.loads(message['data'])
+                    if not self.client.exists(lock_key):
+                        break  # terminó sin publicar (error) o el lock expiró: reintentar
+        finally:
+            pubsub.close()
+
+
+class MLClient:
+    """Cliente para la API de ML con pool de conexiones, timeout y single-flight en GET"""
+
+    def __init__(self, base_url=ML_API_URL, timeout=ML_API_TIMEOUT, pool_size=ML_API_POOL_SIZE,
+                 singleflight_redis_url=ML_SINGLEFLIGHT_REDIS_URL, validators=None,
+                 conditional_ttl=ML_CONDITIONAL_TTL):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers['User-Agent'] = ML_USER_AGENT
+
+        self.local_flight = SingleFlight()
+        self.shared_flight = RedisSingleFlight(singleflight_redis_url) if singleflight_redis_url else None
+
+        # Último cuerpo + ETag/Last-Modified por recurso (backend de cache.py)
+        self.validators = validators if validators is not None else MemoryBackend(ML_CONDITIONAL_MAX_ENTRIES)
+        self.conditional_ttl = conditional_ttl
+        self.conditional_usage = ConditionalUsage()
+        self._trackers = threading.local()
+
+        # Callbacks observer(method, endpoint, status, elapsed) por cada llamada HTTP
+        self.observers = []
+
+    def url(self, path):
+        return path if path.startswith('http') else f'{self.base_url}{path}'
+
+    @staticmethod
+    def flight_key(url, params, access_token):
+        """Clave de deduplicación: URL, parámetros y hash del token (nunca el token en claro)"""
+        token_hash = hashlib.sha256((access_token or '').encode('utf-8')).hexdigest()
+        raw = f'{url}?{sorted((params or {}).items())}#{token_hash}'
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def _request(self, method, url, **kwargs):
+        """Llamada HTTP con timeout, notificando a los observers (status 'error' si falla)"""
+        started = time.perf_counter()
+        status = 'error'
+        try:
+            response = self.session.request(method, url, timeout=self.timeout, **kwargs)
+            status = response.status_code
+            return response
+        finally:
+            elapsed = time.perf_counter() - started
+            for observer in self.observers:
+                try:
+                    observer(method, endpoint_family(url), status, elapsed)
+                except Exception as e:
+                    print(f"ML client observer error: {e}")
+
+    def _cached_response(self, key):
+        if not self.conditional_ttl:
+            return None
+        try:
+            cached = self.validators.get(f'ml:validators:{key}')
+        except Exception as e:
+            print(f"ML validators get error: {e}")
+            return None
+        return None if cached is MISSING else cached
+
+    def _store_response(self, key, response):
+        if not self.conditional_ttl or response.status_code != 200:
+            return
+        if not (response.etag or response.last_modified):
+            return
+        try:
+            self.validators.set(f'ml:validators:{key}', response, self.conditional_ttl)
+        except Exception as e:
+            print(f"ML validators set error: {e}")
+
+    def _get(self, key, url, access_token, params):
+        headers = {'Authorization': f'Bearer {access_token}'} if access_token else {}
+
+        # Revalidar contra ML con los validadores de la última respuesta 200
+        cached = self._cached_response(key)
+        if cached is not None:
+            if cached.etag:
+                headers['If-None-Match'] = cached.etag
+            if cached.last_modified:
+                headers['If-Modified-Since'] = cached.last_modified
+
+        response = self._request('GET', url, headers=headers, params=params)
+        elapsed = response.elapsed.total_seconds()
+
+        if response.status_code == 304 and cached is not None:
+            # Sin cuerpo que descargar ni parsear: se reutiliza el guardado
+            result = cached.revalidated(elapsed)
+        else:
+            result = MLResponse.from_requests(response)
+            self._store_response(key, result)
+
+        self.conditional_usage.add(result)
+        return result
+
+    def get(self, path, access_token=None, params=None):
+        """GET deduplicado: llamadas idénticas en curso comparten una sola petición"""
+        url = self.url(path)
+        key = self.flight_key(url, params, access_token)
+
+        def call():
+            return self._get(key, url, access_token, params)
+
+        if self.shared_flight is not None:
+            response = self.local_flight.do(key, lambda: self.shared_flight.do(key, call))
+        else:
+            response = self.local_flight.do(key, call)
+
+        for usage in getattr(self._trackers, 'active', ()):
+            usage.add(response)
+        return response
+
+    @contextmanager
+    def track(self):
+        """
+        Medir las peticiones condicionales hechas por este hilo dentro del bloque:
+            with ml_client.track() as usage:
+                ...
+            usage.to_dict()  # requests, not_modified, bytes_saved, latency_saved_ms
+        """
+        usage = ConditionalUsage()
+        active = getattr(self._trackers, 'active', ())
+        self._trackers.active = active + (usage,)
+        try:
+            yield usage
+        finally:
+            self._trackers.active = active
+
+    def post(self, path, data=None, access_token=None):
+        """POST sin deduplicar (ej: oauth/token)"""
+        headers = {'Authorization': f'Bearer {access_token}'} if access_token else {}
+        response = self._request('POST', self.url(path), data=data, headers=headers)
+        return MLResponse.from_requests(response)
+
+    def stats(self):
+        return {
+            'deduplicated_local': self.local_flight.deduplicated,
+            'deduplicated_shared': self.shared_flight.deduplicated if self.shared_flight else 0,
+            'conditional': self.conditional_usage.to_dict()
+        }
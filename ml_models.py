@@ -0,0 +1,162 @@
+# ml_models.py - Recursos de la API de ML como objetos livianos (solo los campos que se usan)
+
+import datetime
+from dataclasses import asdict, dataclass, field
+from decimal import Decimal
+from typing import List, Optional
+
+# Los perfiles de /users/{id} traen dirección, teléfono, reputación de comprador, estado,
+# etc.; guardar el dict entero (en la caché o durante un refresh-all de 50 cuentas) cuesta
+# memoria sin motivo. Estas clases toman solo lo que lee la aplicación y, con slots,
+# cada instancia pesa una fracción del dict original.
+
+
+def parse_ml_datetime(value):
+    """Fecha ISO de ML (con zona horaria) a datetime UTC sin zona, como el resto de la base"""
+    parsed = datetime.datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def _decimal(value):
+    # str() primero: Decimal(float) arrastra el error binario del float
+    return Decimal(str(value or 0))
+
+
+@dataclass(slots=True)
+class Paging:
+    total: int = 0
+    offset: int = 0
+    limit: int = 0
+
+    @classmethod
+    def from_json(cls, data):
+        data = data or {}
+        return cls(int(data.get('total') or 0), int(data.get('offset') or 0), int(data.get('limit') or 0))
+
+
+@dataclass(slots=True)
+class UserProfile:
+    """Perfil de /users/{id}: datos de la cuenta y transacciones completadas"""
+    id: str
+    nickname: Optional[str] = None
+    first_name: Optional[str] = None
+    last_name: Optional[str] = None
+    email: Optional[str] = None
+    country_id: Optional[str] = None
+    site_id: Optional[str] = None
+    completed_transactions: int = 0
+
+    @classmethod
+    def from_json(cls, data):
+        transactions = (data.get('seller_reputation') or {}).get('transactions') or {}
+        return cls(
+            id=str(data.get('id', '')),
+            nickname=data.get('nickname'),
+            first_name=data.get('first_name'),
+            last_name=data.get('last_name'),
+            email=data.get('email'),
+            country_id=data.get('country_id'),
+            site_id=data.get('site_id'),
+            completed_transactions=int(transactions.get('completed') or 0)
+        )
+
+    def account_fields(self):
+        """Columnas ml_* de MLAccount con los datos que vinieron (los vacíos no pisan nada)"""
+        fields = {
+            'ml_nickname': self.nickname,
+            'ml_first_name': self.first_name,
+            'ml_last_name': self.last_name,
+            'ml_email': self.email,
+            'ml_country_id': self.country_id,
+            'ml_site_id': self.site_id
+        }
+        return {name: value for name, value in fields.items() if value is not None}
+
+    def apply_to(self, account):
+        """Actualizar los datos de una MLAccount existente"""
+        for name, value in self.account_fields().items():
+            setattr(account, name, value)
+
+    def to_dict(self):
+        return asdict(self)
+
+
+@dataclass(slots=True)
+class Item:
+    """Publicación (de /items o la versión reducida dentro de una orden)"""
+    id: str
+    title: Optional[str] = None
+    category_id: Optional[str] = None
+    price: Optional[Decimal] = None
+    currency_id: Optional[str] = None
+    available_quantity: Optional[int] = None
+    sold_quantity: Optional[int] = None
+    status: Optional[str] = None
+    date_created: Optional[datetime.datetime] = None
+
+    @classmethod
+    def from_json(cls, data):
+        price = data.get('price')
+        created = data.get('date_created')
+        return cls(
+            id=data['id'],
+            title=data.get('title'),
+            category_id=data.get('category_id'),
+            price=_decimal(price) if price is not None else None,
+            currency_id=data.get('currency_id'),
+            available_quantity=data.get('available_quantity'),
+            sold_quantity=data.get('sold_quantity'),
+            status=data.get('status'),
+            date_created=parse_ml_datetime(created) if created else None
+        )
+
+
+@dataclass(slots=True)
+class OrderLine:
+    item: Item
+    quantity: int
+    unit_price: Decimal
+
+
+@dataclass(slots=True)
+class Order:
+    """Orden de /orders/search con sus líneas (solo las que tienen publicación)"""
+    id: int
+    status: Optional[str]
+    date_created: datetime.datetime
+    total_amount: Decimal
+    currency_id: Optional[str] = None
+    buyer_id: Optional[int] = None
+    lines: List[OrderLine] = field(default_factory=list)
+
+    @classmethod
+    def from_json(cls, data):
+        lines = []
+        for line in data.get('order_items') or ():
+            item = line.get('item') or {}
+            if item.get('id'):
+                lines.append(OrderLine(Item(item['id'], title=item.get('title')),
+                                       int(line.get('quantity') or 0), _decimal(line.get('unit_price'))))
+        return cls(
+            id=int(data['id']),
+            status=data.get('status'),
+            date_created=parse_ml_datetime(data['date_created']),
+            total_amount=_decimal(data.get('total_amount')),
+            currency_id=data.get('currency_id'),
+            buyer_id=(data.get('buyer') or {}).get('id'),
+            lines=lines
+        )
+
+
+@dataclass(slots=True)
+class OrderSearch:
+    """Página de /orders/search"""
+    results: List[Order]
+    paging: Paging
+
+    @classmethod
+    def from_json(cls, data):
+        return cls([Order.from_json(order) for order in data.get('results') or () if order.get('id')],
+                   Paging.from_json(data.get('paging')))
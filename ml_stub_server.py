@@ -0,0 +1,483 @@
+#!/usr/bin/env python3
+"""
+API falsa de Mercado Libre para correr la app, tests y benchmarks sin red.
+Implementa los endpoints que usa SmartSelling (oauth/token, users, items/search,
+items multiget, orders/search, notificaciones) con datos generados a partir
+de una semilla, y permite inyectar latencia, errores 5xx y 429.
+
+Uso:
+    python ml_stub_server.py --port 8900 --latency-ms 80 --error-rate 0.02
+    ML_API_URL=http://localhost:8900 ML_AUTH_URL=http://localhost:8900/authorization python app.py
+
+Tokens válidos: APP_USR-stub-<user_id> (los entrega /oauth/token).
+La configuración se puede cambiar en caliente con POST /_stub/config.
+"""
+
+import argparse
+import datetime
+import hashlib
+import os
+import random
+import threading
+import time
+from urllib.parse import urlencode
+
+import requests
+from flask import Flask, jsonify, redirect, request
+
+# Valores por defecto (se pueden pisar por CLI o con POST /_stub/config)
+DEFAULT_CONFIG = {
+    'seed': 42,
+    'users': 50,                # vendedores disponibles (ids desde FIRST_USER_ID)
+    'items_per_user': 200,
+    'orders_per_user': 500,
+    'latency_ms': 0.0,          # latencia media agregada a cada respuesta
+    'jitter_ms': 0.0,           # desvío de la latencia
+    'error_rate': 0.0,          # fracción de respuestas 500/503
+    'throttle_rate': 0.0,       # fracción de respuestas 429 al azar
+    'rate_limit_rps': 0,        # 429 si un token supera N requests por segundo (0 = sin límite)
+    'notifications_url': '',    # callback al que se envían las notificaciones simuladas
+}
+
+FIRST_USER_ID = 100000
+TOKEN_PREFIX = 'APP_USR-stub-'
+TOKEN_EXPIRES_IN = 21600
+MULTIGET_MAX_IDS = 20
+SEARCH_MAX_LIMIT = 50
+
+
+class StubState:
+    """Datos falsos generados bajo demanda y contadores de la sesión"""
+
+    def __init__(self, config):
+        self.config = dict(config)
+        self.lock = threading.Lock()
+        self._sellers = {}
+        self._rate_windows = {}
+        self.notifications = []
+        self.requests = 0
+        self.injected = {'errors': 0, 'throttled': 0}
+
+    def user_ids(self):
+        return range(FIRST_USER_ID, FIRST_USER_ID + self.config['users'])
+
+    def seller(self, user_id):
+        """Perfil, items y órdenes de un vendedor (deterministas según la semilla)"""
+        with self.lock:
+            seller = self._sellers.get(user_id)
+            if seller is None:
+                seller = self._sellers[user_id] = self._generate_seller(user_id)
+            return seller
+
+    def _generate_seller(self, user_id):
+        rng = random.Random(self.config['seed'] * 1000003 + user_id)
+        now = datetime.datetime.utcnow().replace(microsecond=0)
+
+        items = []
+        for index in range(self.config['items_per_user']):
+            item_id = f'MLA{user_id}{index:05d}'
+            items.append({
+                'id': item_id,
+                'title': f'Producto {index} de {user_id}',
+                'seller_id': user_id,
+                'price': round(rng.uniform(500, 150000), 2),
+                'currency_id': 'ARS',
+                'available_quantity': rng.randint(0, 200),
+                'sold_quantity': rng.randint(0, 1000),
+                'status': 'active' if rng.random() < 0.85 else 'paused',
+                'category_id': f'MLA{rng.randint(1000, 1999)}',
+                'date_created': (now - datetime.timedelta(days=rng.randint(1, 700))).isoformat() + 'Z',
+                'last_updated': now.isoformat() + 'Z'
+            })
+
+        orders = []
+        for index in range(self.config['orders_per_user']):
+            item = rng.choice(items) if items else None
+            quantity = rng.randint(1, 3)
+            orders.append(self._order(user_id, index, item, quantity,
+                                      now - datetime.timedelta(minutes=rng.randint(1, 60 * 24 * 365))))
+        orders.sort(key=lambda order: order['date_created'], reverse=True)
+
+        profile = {
+            'id': user_id,
+            'nickname': f'STUBSELLER{user_id}',
+            'first_name': 'Vendedor',
+            'last_name': str(user_id),
+            'email': f'seller{user_id}@example.com',
+            'country_id': 'AR',
+            'site_id': 'MLA',
+            'registration_date': (now - datetime.timedelta(days=900)).isoformat() + 'Z',
+            'seller_reputation': {
+                'level_id': '5_green',
+                'transactions': {'completed': len(orders), 'canceled': rng.randint(0, 20), 'total': len(orders)}
+            }
+        }
+        return {'profile': profile, 'items': items, 'items_by_id': {item['id']: item for item in items},
+                'orders': orders, 'updated_at': now}
+
+    @staticmethod
+    def _order(user_id, index, item, quantity, created):
+        price = item['price'] if item else 1000.0
+        return {
+            'id': int(f'{user_id}{index:06d}'),
+            'status': 'paid',
+            'date_created': created.isoformat() + 'Z',
+            'date_closed': created.isoformat() + 'Z',
+            'last_updated': created.isoformat() + 'Z',
+            'total_amount': round(price * quantity, 2),
+            'currency_id': 'ARS',
+            'seller': {'id': user_id},
+            'buyer': {'id': 900000 + index % 5000},
+            'order_items': [{
+                'item': {'id': item['id'] if item else None, 'title': item['title'] if item else None},
+                'quantity': quantity,
+                'unit_price': price
+            }]
+        }
+
+    def add_sale(self, user_id):
+        """Simular una venta nueva: cambia el perfil (y su ETag) y genera una notificación"""
+        seller = self.seller(user_id)
+        with self.lock:
+            item = random.choice(seller['items']) if seller['items'] else None
+            order = self._order(user_id, len(seller['orders']), item, 1, datetime.datetime.utcnow())
+            seller['orders'].insert(0, order)
+            seller['profile']['seller_reputation']['transactions']['completed'] += 1
+            seller['profile']['seller_reputation']['transactions']['total'] += 1
+            seller['updated_at'] = datetime.datetime.utcnow().replace(microsecond=0)
+        self.notify(user_id, 'orders_v2', f'/orders/{order["id"]}')
+        return order
+
+    def cancel_order(self, user_id, order_id=None):
+        """Simular la cancelación de una orden pagada (la más vieja si no se indica)"""
+        seller = self.seller(user_id)
+        with self.lock:
+            paid = [order for order in seller['orders'] if order['status'] == 'paid'
+                    and (order_id is None or order['id'] == order_id)]
+            if not paid:
+                return None
+            order = paid[-1]
+            order['status'] = 'cancelled'
+            order['last_updated'] = datetime.datetime.utcnow().replace(microsecond=0).isoformat() + 'Z'
+        self.notify(user_id, 'orders_v2', f'/orders/{order["id"]}')
+        return order
+
+    def notify(self, user_id, topic, resource):
+        """Registrar una notificación y, si hay callback configurado, enviarla como ML"""
+        notification = {
+            'id': hashlib.sha1(f'{user_id}{topic}{resource}{time.time_ns()}'.encode()).hexdigest()[:24],
+            'resource': resource,
+            'user_id': user_id,
+            'topic': topic,
+            'application_id': 0,
+            'attempts': 1,
+            'sent': datetime.datetime.utcnow().isoformat() + 'Z',
+            'received': datetime.datetime.utcnow().isoformat() + 'Z'
+        }
+        with self.lock:
+            self.notifications.append(notification)
+            del self.notifications[:-1000]
+        url = self.config.get('notifications_url')
+        if url:
+            threading.Thread(target=self._deliver, args=(url, notification), daemon=True).start()
+        return notification
+
+    @staticmethod
+    def _deliver(url, notification):
+        try:
+            requests.post(url, json=notification, timeout=5)
+        except requests.exceptions.RequestException as e:
+            print(f"Stub notification delivery failed: {e}")
+
+    def over_rate_limit(self, token):
+        limit = self.config['rate_limit_rps']
+        if not limit:
+            return False
+        second = int(time.time())
+        with self.lock:
+            window_second, count = self._rate_windows.get(token, (second, 0))
+            if window_second != second:
+                window_second, count = second, 0
+            count += 1
+            self._rate_windows[token] = (window_second, count)
+        return count > limit
+
+
+def parse_date(value):
+    """Fecha ISO de ML (con Z o con offset) como datetime UTC sin zona"""
+    parsed = datetime.datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def user_id_from_token(token):
+    if not token or not token.startswith(TOKEN_PREFIX):
+        return None
+    try:
+        return int(token[len(TOKEN_PREFIX):].split('-')[0])
+    except ValueError:
+        return None
+
+
+def create_stub_app(config=None):
+    """App Flask del stub; config pisa los valores de DEFAULT_CONFIG"""
+    app = Flask(__name__)
+    state = StubState({**DEFAULT_CONFIG, **(config or {})})
+    app.config['STUB_STATE'] = state
+
+    def error(status, message, code=None):
+        return jsonify({'message': message, 'error': code or message, 'status': status, 'cause': []}), status
+
+    def current_user_id():
+        auth = request.headers.get('Authorization', '')
+        token = auth[len('Bearer '):] if auth.startswith('Bearer ') else request.args.get('access_token')
+        user_id = user_id_from_token(token)
+        return user_id if user_id in state.user_ids() else None
+
+    def conditional(payload, last_modified=None):
+        """Respuesta con ETag/Last-Modified; 304 si el cliente ya la tiene"""
+        response = jsonify(payload)
+        response.add_etag()
+        if last_modified:
+            response.last_modified = last_modified
+        return response.make_conditional(request)
+
+    @app.before_request
+    def inject_faults():
+        if request.path.startswith('/_stub') or request.path == '/authorization':
+            return None
+        config = state.config
+        with state.lock:
+            state.requests += 1
+
+        delay = random.gauss(config['latency_ms'], config['jitter_ms']) if config['jitter_ms'] else config['latency_ms']
+        if delay > 0:
+            time.sleep(delay / 1000)
+
+        token = request.headers.get('Authorization', request.remote_addr)
+        if state.over_rate_limit(token) or (config['throttle_rate'] and random.random() < config['throttle_rate']):
+            with state.lock:
+                state.injected['throttled'] += 1
+            response, status = error(429, 'Too many requests', 'too_many_requests')
+            response.headers['Retry-After'] = '1'
+            return response, status
+        if config['error_rate'] and random.random() < config['error_rate']:
+            with state.lock:
+                state.injected['errors'] += 1
+            return error(random.choice((500, 503)), 'Internal server error', 'internal_error')
+        return None
+
+    # ----- OAuth -----
+
+    @app.route('/authorization')
+    def authorization():
+        """Pantalla de autorización: redirige directo con un code para el primer vendedor"""
+        user_id = request.args.get('user_id', type=int) or FIRST_USER_ID
+        params = {'code': f'TG-stub-{user_id}'}
+        if request.args.get('state'):
+            params['state'] = request.args['state']
+        return redirect(f"{request.args.get('redirect_uri', '/')}?{urlencode(params)}")
+
+    @app.route('/oauth/token', methods=['POST'])
+    def oauth_token():
+        grant_type = request.form.get('grant_type') or (request.get_json(silent=True) or {}).get('grant_type')
+        if grant_type == 'authorization_code':
+            code = request.form.get('code', '')
+            try:
+                user_id = int(code.rsplit('-', 1)[-1])
+            except ValueError:
+                return error(400, 'invalid code', 'invalid_grant')
+        elif grant_type == 'refresh_token':
+            user_id = user_id_from_token(request.form.get('refresh_token', '').replace('TG-', 'APP_USR-', 1))
+        else:
+            return error(400, 'unsupported grant_type', 'unsupported_grant_type')
+
+        if user_id not in state.user_ids():
+            return error(400, 'invalid_grant', 'invalid_grant')
+        suffix = int(time.time())
+        return jsonify({
+            'access_token': f'{TOKEN_PREFIX}{user_id}-{suffix}',
+            'token_type': 'Bearer',
+            'expires_in': TOKEN_EXPIRES_IN,
+            'scope': 'offline_access read write',
+            'user_id': user_id,
+            'refresh_token': f'TG-stub-{user_id}-{suffix}'
+        })
+
+    # ----- Usuarios -----
+
+    @app.route('/users/me')
+    def users_me():
+        user_id = current_user_id()
+        if user_id is None:
+            return error(401, 'invalid access token', 'unauthorized')
+        seller = state.seller(user_id)
+        return conditional(seller['profile'], seller['updated_at'])
+
+    @app.route('/users/<int:user_id>')
+    def users_get(user_id):
+        if current_user_id() is None:
+            return error(401, 'invalid access token', 'unauthorized')
+        if user_id not in state.user_ids():
+            return error(404, f'User {user_id} not found', 'not_found')
+        seller = state.seller(user_id)
+        return conditional(seller['profile'], seller['updated_at'])
+
+    # ----- Items -----
+
+    @app.route('/users/<int:user_id>/items/search')
+    def items_search(user_id):
+        if current_user_id() != user_id:
+            return error(401 if current_user_id() is None else 403, 'forbidden', 'forbidden')
+        items = state.seller(user_id)['items']
+        status = request.args.get('status')
+        if status:
+            items = [item for item in items if item['status'] == status]
+        offset = request.args.get('offset', 0, type=int)
+        limit = min(request.args.get('limit', SEARCH_MAX_LIMIT, type=int), SEARCH_MAX_LIMIT)
+        return conditional({
+            'seller_id': str(user_id),
+            'results': [item['id'] for item in items[offset:offset + limit]],
+            'paging': {'limit': limit, 'offset': offset, 'total': len(items)}
+        })
+
+    def find_item(item_id):
+        try:
+            seller_id = int(item_id[3:-5])
+        except ValueError:
+            return None
+        if not item_id.startswith('MLA') or seller_id not in state.user_ids():
+            return None
+        return state.seller(seller_id)['items_by_id'].get(item_id)
+
+    @app.route('/items')
+    def items_multiget():
+        ids = [item_id for item_id in request.args.get('ids', '').split(',') if item_id]
+        if not ids or len(ids) > MULTIGET_MAX_IDS:
+            return error(400, f'ids must contain between 1 and {MULTIGET_MAX_IDS} items', 'bad_request')
+        results = []
+        for item_id in ids:
+            item = find_item(item_id)
+            results.append({'code': 200, 'body': item} if item else
+                           {'code': 404, 'body': {'message': f'Item {item_id} not found', 'error': 'not_found'}})
+        return jsonify(results)
+
+    @app.route('/items/<item_id>')
+    def items_get(item_id):
+        item = find_item(item_id)
+        if item is None:
+            return error(404, f'Item {item_id} not found', 'not_found')
+        return conditional(item)
+
+    # ----- Órdenes -----
+
+    @app.route('/orders/search')
+    def orders_search():
+        user_id = current_user_id()
+        if user_id is None:
+            return error(401, 'invalid access token', 'unauthorized')
+        if request.args.get('seller', type=int) != user_id:
+            return error(403, 'seller does not match the access token', 'forbidden')
+        orders = state.seller(user_id)['orders']
+        for name, field, keep in (
+            ('order.date_created.from', 'date_created', lambda value, limit: value >= limit),
+            ('order.date_created.to', 'date_created', lambda value, limit: value <= limit),
+            ('order.date_last_updated.from', 'last_updated', lambda value, limit: value >= limit),
+        ):
+            if request.args.get(name):
+                limit = parse_date(request.args[name])
+                orders = [order for order in orders if keep(parse_date(order[field]), limit)]
+        sort = request.args.get('sort', 'date_desc')
+        if sort == 'date_asc':
+            orders = orders[::-1]
+        offset = request.args.get('offset', 0, type=int)
+        limit = min(request.args.get('limit', SEARCH_MAX_LIMIT, type=int), SEARCH_MAX_LIMIT)
+        return jsonify({
+            'query': str(user_id),
+            'results': orders[offset:offset + limit],
+            'paging': {'total': len(orders), 'offset': offset, 'limit': limit},
+            'sort': {'id': sort, 'name': 'Date ascending' if sort == 'date_asc' else 'Date descending'}
+        })
+
+    # ----- Notificaciones -----
+
+    @app.route('/missed_feeds')
+    def missed_feeds():
+        with state.lock:
+            messages = list(state.notifications)
+        topic = request.args.get('topic')
+        if topic:
+            messages = [message for message in messages if message['topic'] == topic]
+        return jsonify({'messages': messages, 'total': len(messages)})
+
+    # ----- Control del stub -----
+
+    @app.route('/_stub/config', methods=['GET', 'POST'])
+    def stub_config():
+        if request.method == 'POST':
+            changes = request.get_json(silent=True) or {}
+            unknown = [key for key in changes if key not in DEFAULT_CONFIG]
+            if unknown:
+                return error(400, f'Unknown config keys: {", ".join(unknown)}')
+            with state.lock:
+                regenerate = any(key in changes for key in ('seed', 'items_per_user', 'orders_per_user'))
+                state.config.update(changes)
+                if regenerate:
+                    state._sellers.clear()
+        return jsonify(state.config)
+
+    @app.route('/_stub/users/<int:user_id>/sale', methods=['POST'])
+    def stub_sale(user_id):
+        if user_id not in state.user_ids():
+            return error(404, f'User {user_id} not found', 'not_found')
+        return jsonify(state.add_sale(user_id)), 201
+
+    @app.route('/_stub/stats')
+    def stub_stats():
+        with state.lock:
+            return jsonify({'requests': state.requests, **state.injected,
+                            'sellers_generated': len(state._sellers),
+                            'notifications': len(state.notifications)})
+
+    return app
+
+
+def start_stub_server(config=None, host='127.0.0.1', port=0):
+    """
+    Levantar el stub en un hilo (para tests y benchmarks).
+    Devuelve (base_url, server); server.shutdown() lo detiene.
+    """
+    from werkzeug.serving import WSGIRequestHandler, make_server
+
+    class QuietHandler(WSGIRequestHandler):
+        def log_request(self, *args, **kwargs):
+            pass
+
+    server = make_server(host, port, create_stub_app(config), threaded=True, request_handler=QuietHandler)
+    threading.Thread(target=server.serve_forever, name='ml-stub-server', daemon=True).start()
+    return f'http://{host}:{server.server_port}', server
+
+
+def access_token_for(user_id):
+    """Token válido para un vendedor del stub (sin pasar por OAuth)"""
+    return f'{TOKEN_PREFIX}{user_id}'
+
+
+def main():
+    parser = argparse.ArgumentParser(description='API falsa de Mercado Libre')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=int(os.getenv('ML_STUB_PORT', '8900')))
+    for key, default in DEFAULT_CONFIG.items():
+        parser.add_argument(f'--{key.replace("_", "-")}', type=type(default), default=default)
+    args = parser.parse_args()
+
+    config = {key: getattr(args, key) for key in DEFAULT_CONFIG}
+    print(f"🧪 ML stub en http://{args.host}:{args.port} ({config['users']} vendedores, "
+          f"latencia {config['latency_ms']}ms, errores {config['error_rate']:.0%}, 429 {config['throttle_rate']:.0%})")
+    print(f"   ML_API_URL=http://{args.host}:{args.port} ML_AUTH_URL=http://{args.host}:{args.port}/authorization")
+    create_stub_app(config).run(host=args.host, port=args.port, threaded=True)
+
+
+if __name__ == '__main__':
+    main()
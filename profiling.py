@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+Profiling opcional de requests en producción.
+Perfila una fracción de los requests (PROFILE_SAMPLE_RATE) o cualquiera que
+traiga un header X-Debug-Profile firmado, y guarda stacks colapsados
+compatibles con flamegraph.pl / speedscope en PROFILE_DIR.
+
+Generar un header firmado (válido por 10 minutos):
+    python profiling.py sign 600
+"""
+
+import cProfile
+import hashlib
+import hmac
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+
+from dotenv import load_dotenv
+from flask import g, request
+
+# Fracción de requests a perfilar (0 = solo los que traen el header firmado)
+PROFILE_SAMPLE_RATE = float(os.getenv('PROFILE_SAMPLE_RATE', '0'))
+# Secreto para X-Debug-Profile; vacío = el header no se acepta
+PROFILE_SECRET = os.getenv('PROFILE_SECRET', '')
+PROFILE_HEADER = 'X-Debug-Profile'
+# sampling (stacks cada PROFILE_INTERVAL_MS, bajo overhead) | cprofile (exacto, más caro)
+PROFILE_MODE = os.getenv('PROFILE_MODE', 'sampling')
+PROFILE_INTERVAL_MS = float(os.getenv('PROFILE_INTERVAL_MS', '5'))
+PROFILE_DIR = os.getenv('PROFILE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'profiles'))
+# Cantidad máxima de archivos: se borran los más viejos
+PROFILE_MAX_FILES = int(os.getenv('PROFILE_MAX_FILES', '200'))
+
+_SAFE_NAME_RE = re.compile(r'[^A-Za-z0-9_.-]+')
+
+
+class StackSampler:
+    """
+    Profiler por muestreo: un hilo lee periódicamente el stack del hilo
+    que atiende el request (sys._current_frames) y cuenta stacks iguales.
+    No instrumenta cada llamada, así que el overhead es casi nulo.
+    """
+
+    extension = 'collapsed'
+
+    def __init__(self, thread_id, interval=PROFILE_INTERVAL_MS / 1000):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='request-profiler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+                frame = frame.f_back
+            self.samples[';'.join(reversed(stack))] += 1
+
+    def write(self, path):
+        # Formato "stack;colapsado cuenta" de flamegraph.pl
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, count in self.samples.most_common():
+                f.write(f'{stack} {count}\n')
+
+
+class CProfiler:
+    """Profiler determinista (cProfile); salida .prof para snakeviz/flameprof"""
+
+    extension = 'prof'
+
+    def __init__(self, thread_id=None):
+        self.profile = cProfile.Profile()
+
+    def start(self):
+        self.profile.enable()
+
+    def stop(self):
+        self.profile.disable()
+
+    def write(self, path):
+        self.profile.dump_stats(path)
+
+
+def sign_profile_token(expires_at, secret=PROFILE_SECRET):
+    """Valor para X-Debug-Profile: <expira_unix>.<hmac>"""
+    signature = hmac.new(secret.encode('utf-8'), str(int(expires_at)).encode('utf-8'), hashlib.sha256).hexdigest()
+    return f'{int(expires_at)}.{signature}'
+
+
+def valid_profile_token(token, secret=PROFILE_SECRET):
+    """Verificar firma y vencimiento del header"""
+    if not secret or not token or '.' not in token:
+        return False
+    expires_at, _ = token.split('.', 1)
+    if not expires_at.isdigit() or int(expires_at) < time.time():
+        return False
+    return hmac.compare_digest(token, sign_profile_token(int(expires_at), secret))
+
+
+def should_profile():
+    if valid_profile_token(request.headers.get(PROFILE_HEADER)):
+        return True
+    return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+
+def enforce_retention(directory=PROFILE_DIR, max_files=PROFILE_MAX_FILES):
+    """Borrar los perfiles más viejos por encima del límite"""
+    files = [os.path.join(directory, name) for name in os.listdir(directory)]
+    files = sorted((path for path in files if os.path.isfile(path)), key=os.path.getmtime)
+    for path in files[:max(len(files) - max_files, 0)]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def _before_request():
+    if not should_profile():
+        return
+    profiler_class = CProfiler if PROFILE_MODE == 'cprofile' else StackSampler
+    profiler = profiler_class(threading.get_ident())
+    try:
+        profiler.start()
+    except ValueError as e:
+        # cProfile admite un solo profiler activo a la vez
+        print(f"Request profiling skipped: {e}")
+        return
+    g._profiler = (profiler, time.perf_counter())
+
+
+def _teardown_request(exc):
+    state = g.pop('_profiler', None)
+    if state is None:
+        return
+    profiler, started = state
+    profiler.stop()
+
+    elapsed_ms = int((time.perf_counter() - started) * 1000)
+    route = request.url_rule.rule if request.url_rule is not None else request.path
+    name = _SAFE_NAME_RE.sub('_', f'{request.method}_{route}').strip('_')
+    filename = f'{time.strftime("%Y%m%dT%H%M%S")}_{elapsed_ms}ms_{name}_{os.getpid()}.{profiler.extension}'
+
+    try:
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        profiler.write(os.path.join(PROFILE_DIR, filename))
+        enforce_retention()
+    except OSError as e:
+        print(f"Error writing profile {filename}: {e}")
+
+
+def init_profiling(app):
+    """Registrar el profiling de requests (no hace nada si no está configurado)"""
+    if PROFILE_SAMPLE_RATE <= 0 and not PROFILE_SECRET:
+        return
+    app.before_request(_before_request)
+    app.teardown_request(_teardown_request)
+    print(f"🔬 Request profiling enabled ({PROFILE_MODE}, rate={PROFILE_SAMPLE_RATE}, dir={PROFILE_DIR})")
+
+
+def main():
+    load_dotenv()
+    secret = os.getenv('PROFILE_SECRET', '')
+    if len(sys.argv) >= 2 and sys.argv[1] == 'sign':
+        if not secret:
+            sys.exit('PROFILE_SECRET is not set')
+        ttl = int(sys.argv[2]) if len(sys.argv) > 2 else 600
+        print(f'{PROFILE_HEADER}: {sign_profile_token(time.time() + ttl, secret)}')
+    else:
+        print(__doc__)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,140 @@
+# query_counter.py - Conteo de queries SQL por request y detección de N+1
+
+import contextvars
+import os
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from flask import g, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Headers X-DB-Queries / X-DB-Time (por defecto solo en desarrollo)
+SQL_QUERY_HEADERS = os.getenv('SQL_QUERY_HEADERS', '1' if os.getenv('FLASK_ENV') == 'development' else '0') == '1'
+# Loguear requests que superen cualquiera de estos umbrales
+SQL_SLOW_REQUEST_QUERIES = int(os.getenv('SQL_SLOW_REQUEST_QUERIES', '30'))
+SQL_SLOW_REQUEST_MS = float(os.getenv('SQL_SLOW_REQUEST_MS', '500'))
+# Un mismo statement repetido más de N veces en un request = sospecha de N+1
+SQL_NPLUS1_THRESHOLD = int(os.getenv('SQL_NPLUS1_THRESHOLD', '5'))
+# En tests: convertir la sospecha de N+1 en error (respuesta 500)
+SQL_NPLUS1_RAISE = os.getenv('SQL_NPLUS1_RAISE', '0') == '1'
+
+# Contadores activos en el contexto actual (request o bloque track_queries)
+_active = contextvars.ContextVar('query_counter_active', default=())
+
+
+class NPlusOneError(AssertionError):
+    """Statement idéntico ejecutado más veces que el umbral"""
+
+
+class QueryStats:
+    """Queries ejecutadas y tiempo de base acumulado"""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.statements = Counter()
+
+    def record(self, statement, elapsed):
+        self.count += 1
+        self.duration += elapsed
+        # El SQL ya viene parametrizado: mismo texto = misma consulta con otros valores
+        self.statements[statement] += 1
+
+    def repeated(self, threshold=None):
+        """Statements ejecutados más de threshold veces, del más repetido al menos"""
+        if threshold is None:
+            threshold = SQL_NPLUS1_THRESHOLD
+        return [(statement, times) for statement, times in self.statements.most_common() if times > threshold]
+
+    def check(self, threshold=None):
+        """Lanzar NPlusOneError si hay statements repetidos"""
+        repeated = self.repeated(threshold)
+        if repeated:
+            statement, times = repeated[0]
+            raise NPlusOneError(f'Possible N+1: statement executed {times} times: {_shorten(statement)}')
+
+    @property
+    def duration_ms(self):
+        return round(self.duration * 1000, 2)
+
+
+def _shorten(statement, limit=200):
+    statement = ' '.join(statement.split())
+    return statement if len(statement) <= limit else statement[:limit] + '...'
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _active.get():
+        conn.info.setdefault('query_counter_start', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    active = _active.get()
+    starts = conn.info.get('query_counter_start')
+    if not active or not starts:
+        return
+    elapsed = time.perf_counter() - starts.pop()
+    for stats in active:
+        stats.record(statement, elapsed)
+
+
+@contextmanager
+def track_queries(max_repeats=None):
+    """
+    Contar las queries del bloque. Con max_repeats, falla si algún statement
+    se repite más veces (para tests):
+        with track_queries(max_repeats=1) as stats:
+            client.get('/ml-accounts', headers=...)
+        assert stats.count <= 3
+    """
+    stats = QueryStats()
+    token = _active.set(_active.get() + (stats,))
+    try:
+        yield stats
+    finally:
+        _active.reset(token)
+    if max_repeats is not None:
+        stats.check(max_repeats)
+
+
+def _before_request():
+    stats = QueryStats()
+    g._query_stats = stats
+    g._query_stats_token = _active.set(_active.get() + (stats,))
+
+
+def _after_request(response):
+    stats = getattr(g, '_query_stats', None)
+    if stats is None:
+        return response
+
+    if SQL_QUERY_HEADERS:
+        response.headers['X-DB-Queries'] = str(stats.count)
+        response.headers['X-DB-Time'] = f'{stats.duration_ms}ms'
+
+    if stats.count > SQL_SLOW_REQUEST_QUERIES or stats.duration_ms > SQL_SLOW_REQUEST_MS:
+        print(f"⚠️  {request.method} {request.path}: {stats.count} queries, {stats.duration_ms}ms en la base")
+
+    repeated = stats.repeated()
+    for statement, times in repeated:
+        print(f"⚠️  Posible N+1 en {request.method} {request.path}: {times}x {_shorten(statement)}")
+    if repeated and SQL_NPLUS1_RAISE:
+        stats.check()
+    return response
+
+
+def _teardown_request(exc):
+    token = g.pop('_query_stats_token', None)
+    if token is not None:
+        _active.reset(token)
+
+
+def init_query_counter(app):
+    """Registrar el conteo de queries por request"""
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.teardown_request(_teardown_request)
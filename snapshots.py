@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+"""
+Snapshots Parquet de métricas diarias y órdenes para análisis offline
+Escribe archivos Parquet particionados por mes y por grupo de cuentas
+(estilo Hive: metrics/month=2025-01/bucket=007/part-<corrida>.parquet) y en cada
+corrida agrega solo las filas nuevas o modificadas desde la marca de agua anterior.
+
+Pensado para cron (idealmente con DB_* apuntando a una réplica):
+    python snapshots.py run              # todas las tablas
+    python snapshots.py run metrics      # solo métricas
+    python snapshots.py compact          # unir los archivos de cada partición
+    python snapshots.py status
+
+Lectura desde Python (filtros aplicados sobre particiones y estadísticas de Parquet):
+    from snapshots import read_snapshot
+    table = read_snapshot('metrics', account_ids=[12, 15], date_from=date(2025, 1, 1))
+"""
+
+import datetime
+import json
+import os
+import sys
+
+from dotenv import load_dotenv
+from sqlalchemy import text
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:  # está en requirements.txt; sin él la app arranca igual, solo fallan los snapshots
+    pa = None
+
+# .env antes de leer la configuración (también la de exports): como cron este módulo
+# se ejecuta sin pasar por app.py
+load_dotenv()
+
+from exports import iter_batches
+
+SNAPSHOT_DIR = os.getenv('SNAPSHOT_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'snapshots'))
+# Grupos de cuentas por mes (ml_account_id % SNAPSHOT_ACCOUNT_BUCKETS): un directorio
+# por cuenta generaría millones de archivos diminutos con 100k cuentas
+SNAPSHOT_ACCOUNT_BUCKETS = int(os.getenv('SNAPSHOT_ACCOUNT_BUCKETS', '64'))
+# Margen para no perder filas de transacciones todavía abiertas al tomar la marca de agua
+SNAPSHOT_LAG_SECONDS = int(os.getenv('SNAPSHOT_LAG_SECONDS', '300'))
+SNAPSHOT_COMPRESSION = os.getenv('SNAPSHOT_COMPRESSION', 'zstd')
+
+WATERMARKS_FILE = '_watermarks.json'
+
+# Tablas exportadas: columnas (expresión SQL, nombre, tipo), columna de fecha para
+# particionar, columna de marca de agua y clave para quedarse con la última versión
+DATASETS = {
+    'metrics': {
+        'table': 'ml_account_metrics',
+        'columns': (
+            ('ml_account_id', 'ml_account_id', 'int64'),
+            ('date', 'date', 'date'),
+            ('daily_sales::float8', 'daily_sales', 'float64'),
+            ('daily_orders', 'daily_orders', 'int64'),
+            ('daily_views', 'daily_views', 'int64'),
+            ('daily_questions', 'daily_questions', 'int64'),
+            ('updated_at', 'updated_at', 'timestamp'),
+        ),
+        'date_column': 'date',
+        'watermark_column': 'updated_at',
+        'key': ('ml_account_id', 'date'),
+    },
+    'orders': {
+        'table': 'ml_orders',
+        'columns': (
+            ('ml_account_id', 'ml_account_id', 'int64'),
+            ('ml_order_id', 'ml_order_id', 'int64'),
+            ('status', 'status', 'string'),
+            ('total_amount::float8', 'total_amount', 'float64'),
+            ('currency_id', 'currency_id', 'string'),
+            ('buyer_id', 'buyer_id', 'int64'),
+            ('date_created', 'date_created', 'timestamp'),
+            ('created_at', 'created_at', 'timestamp'),
+            ('updated_at', 'updated_at', 'timestamp'),
+        ),
+        'date_column': 'date_created',
+        # Los cambios de estado actualizan updated_at: la corrida siguiente los vuelve a exportar
+        'watermark_column': 'updated_at',
+        'key': ('ml_order_id',),
+    },
+}
+
+
+def require_pyarrow():
+    if pa is None:
+        raise RuntimeError('pyarrow is required for Parquet snapshots (pip install -r requirements.txt)')
+
+
+def _arrow_type(name):
+    return {
+        'int64': pa.int64(),
+        'float64': pa.float64(),
+        'string': pa.string(),
+        'date': pa.date32(),
+        'timestamp': pa.timestamp('us'),
+    }[name]
+
+
+def dataset_schema(name):
+    return pa.schema([(column, _arrow_type(kind)) for _, column, kind in DATASETS[name]['columns']])
+
+
+def partition_path(directory, name, day, bucket):
+    return os.path.join(directory, name, f'month={day.year:04d}-{day.month:02d}', f'bucket={bucket:03d}')
+
+
+def load_watermarks(directory=SNAPSHOT_DIR):
+    path = os.path.join(directory, WATERMARKS_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_watermarks(watermarks, directory=SNAPSHOT_DIR):
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, WATERMARKS_FILE)
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(watermarks, f, indent=2)
+    os.replace(path + '.tmp', path)
+
+
+def write_table(table, directory, filename):
+    """Escribir un archivo Parquet de forma atómica (nunca queda un archivo a medias)"""
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, filename)
+    pq.write_table(table, path + '.tmp', compression=SNAPSHOT_COMPRESSION)
+    os.replace(path + '.tmp', path)
+    return path
+
+
+def snapshot_dataset(session, name, directory=SNAPSHOT_DIR, now=None):
+    """
+    Exportar las filas de la tabla con marca de agua en (anterior, ahora - lag].
+    Cada partición (mes, grupo de cuentas) tocada recibe un archivo nuevo.
+    """
+    require_pyarrow()
+    config = DATASETS[name]
+    schema = dataset_schema(name)
+    watermarks = load_watermarks(directory)
+    since = watermarks.get(name)
+    until = (now or datetime.datetime.utcnow()) - datetime.timedelta(seconds=SNAPSHOT_LAG_SECONDS)
+    run_id = until.strftime('%Y%m%dT%H%M%S')
+
+    select_list = ', '.join(f'{expression} AS {column}' for expression, column, _ in config['columns'])
+    date_column, watermark_column = config['date_column'], config['watermark_column']
+    conditions = [f'{watermark_column} <= :until']
+    params = {'until': until, 'buckets': SNAPSHOT_ACCOUNT_BUCKETS}
+    if since:
+        conditions.append(f'{watermark_column} > :since')
+        params['since'] = datetime.datetime.fromisoformat(since)
+    # Orden de particiones: cada (mes, grupo) llega contiguo y se escribe apenas se completa
+    statement = text(
+        f"SELECT {select_list} FROM {config['table']} WHERE {' AND '.join(conditions)} "
+        f"ORDER BY date_trunc('month', {date_column}), ml_account_id % :buckets, ml_account_id, {date_column}"
+    ).bindparams(**params)
+
+    columns = [column for _, column, _ in config['columns']]
+    date_index = columns.index(date_column)
+    files, rows_written = [], 0
+    current, rows = None, []
+
+    def flush():
+        if not rows:
+            return 0
+        day, bucket = current
+        table = pa.Table.from_pydict(
+            {column: [row[index] for row in rows] for index, column in enumerate(columns)}, schema=schema)
+        files.append(write_table(table, partition_path(directory, name, day, bucket), f'part-{run_id}.parquet'))
+        return len(rows)
+
+    for batch in iter_batches(session, statement):
+        for row in batch:
+            day = row[date_index]
+            key = (datetime.date(day.year, day.month, 1), row[0] % SNAPSHOT_ACCOUNT_BUCKETS)
+            if key != current:
+                rows_written += flush()
+                current, rows = key, []
+            rows.append(row)
+    rows_written += flush()
+
+    # La marca de agua avanza solo cuando todos los archivos quedaron escritos
+    watermarks[name] = until.isoformat()
+    save_watermarks(watermarks, directory)
+    return {'dataset': name, 'since': since, 'until': watermarks[name], 'rows': rows_written, 'files': len(files)}
+
+
+def latest_versions(table, key, version_column):
+    """Quedarse con la última versión de cada clave (las corridas incrementales repiten filas modificadas)"""
+    if table.num_rows == 0:
+        return table
+    sort_keys = [(column, 'ascending') for column in key] + [(version_column, 'descending')]
+    table = table.sort_by(sort_keys)
+    keys = list(zip(*(table[column].to_pylist() for column in key)))
+    mask = [index == 0 or keys[index] != keys[index - 1] for index in range(len(keys))]
+    return table.filter(pa.array(mask))
+
+
+def read_snapshot(name, account_ids=None, date_from=None, date_to=None, columns=None, directory=SNAPSHOT_DIR):
+    """
+    Leer un snapshot como pyarrow.Table (ya sin versiones repetidas).
+    Los filtros descartan directorios de mes/grupo y row groups sin leerlos.
+    """
+    require_pyarrow()
+    config = DATASETS[name]
+    path = os.path.join(directory, name)
+    schema = dataset_schema(name)
+    if not os.path.isdir(path):
+        return schema.empty_table()
+
+    partitions = pa.schema([('month', pa.string()), ('bucket', pa.int32())])
+    dataset = ds.dataset(path, format='parquet', schema=pa.unify_schemas([schema, partitions]),
+                         partitioning=ds.partitioning(partitions, flavor='hive'))
+    date_field = ds.field(config['date_column'])
+    is_date = schema.field(config['date_column']).type == pa.date32()
+
+    condition = None
+    filters = []
+    if account_ids is not None:
+        account_ids = list(account_ids)
+        filters.append(ds.field('bucket').isin(sorted({account_id % SNAPSHOT_ACCOUNT_BUCKETS for account_id in account_ids})))
+        filters.append(ds.field('ml_account_id').isin(account_ids))
+    if date_from is not None:
+        filters.append(ds.field('month') >= f'{date_from.year:04d}-{date_from.month:02d}')
+        filters.append(date_field >= (date_from if is_date else datetime.datetime.combine(date_from, datetime.time())))
+    if date_to is not None:
+        filters.append(ds.field('month') <= f'{date_to.year:04d}-{date_to.month:02d}')
+        if is_date:
+            filters.append(date_field <= date_to)
+        else:
+            filters.append(date_field < datetime.datetime.combine(date_to + datetime.timedelta(days=1), datetime.time()))
+    for expression in filters:
+        condition = expression if condition is None else condition & expression
+
+    table = dataset.to_table(columns=schema.names, filter=condition)
+    table = latest_versions(table, config['key'], config['watermark_column'])
+    return table.select(columns) if columns else table
+
+
+def compact_dataset(name, directory=SNAPSHOT_DIR):
+    """Unir los archivos de cada partición en uno solo, sin versiones repetidas"""
+    require_pyarrow()
+    config = DATASETS[name]
+    root = os.path.join(directory, name)
+    compacted = 0
+    if not os.path.isdir(root):
+        return compacted
+    for current, _, filenames in os.walk(root):
+        parts = sorted(filename for filename in filenames if filename.endswith('.parquet'))
+        if len(parts) < 2:
+            continue
+        paths = [os.path.join(current, filename) for filename in parts]
+        table = pa.concat_tables([pq.read_table(path, schema=dataset_schema(name)) for path in paths])
+        table = latest_versions(table, config['key'], config['watermark_column'])
+        # El archivo compactado conserva el nombre de la última corrida
+        write_table(table.sort_by([(column, 'ascending') for column in config['key']]), current, parts[-1])
+        for path in paths[:-1]:
+            os.remove(path)
+        compacted += 1
+    return compacted
+
+
+def main():
+    """Snapshots para cron: run [dataset...] | compact | status"""
+    command = sys.argv[1] if len(sys.argv) > 1 else 'run'
+    names = sys.argv[2:] or list(DATASETS)
+
+    if command == 'status':
+        for name, watermark in sorted(load_watermarks().items()):
+            print(f'{name:<10} hasta {watermark}')
+        return
+    if command == 'compact':
+        for name in names:
+            print(f'🗜️  {name}: {compact_dataset(name)} particiones compactadas')
+        return
+    if command != 'run':
+        print(__doc__)
+        return
+
+    sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+    import tracing
+    from app import app, db
+
+    with app.app_context(), tracing.continue_trace(tracing.environ_carrier(), 'cron snapshots.run'):
+        for name in names:
+            with tracing.span('snapshots.dataset', dataset=name):
+                result = snapshot_dataset(db.session, name)
+                db.session.rollback()
+            print(f"📦 {name}: {result['rows']} filas en {result['files']} archivos "
+                  f"({result['since'] or 'inicio'} -> {result['until']})")
+    tracing.flush()
+
+
+if __name__ == '__main__':
+    main()
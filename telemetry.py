@@ -0,0 +1,251 @@
+# telemetry.py - Métricas en formato texto de Prometheus (sin dependencias externas)
+
+import os
+import threading
+import time
+
+from flask import g, request
+
+# Buckets de latencia (segundos), los mismos que usa prometheus_client por defecto
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 7.5, 10.0)
+
+# Si está definido, /metrics exige "Authorization: Bearer <METRICS_TOKEN>"
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs.extend(f'{name}="{_escape(value)}"' for name, value in extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    """Base: una familia de series identificadas por sus labels"""
+
+    type_name = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f'{self.name} expects labels {self.labelnames}, got {tuple(labels)}')
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def header(self):
+        return [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.type_name}']
+
+
+class Counter(_Metric):
+    type_name = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return self.header() + [
+            f'{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}' for key, value in items
+        ]
+
+
+class Gauge(_Metric):
+    type_name = 'gauge'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    render = Counter.render
+
+
+class Histogram(_Metric):
+    type_name = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                # [cuenta por bucket..., suma, total]
+                series = self._values[key] = [0] * len(self.buckets) + [0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[index] += 1
+                    break
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        with self._lock:
+            items = sorted((key, list(series)) for key, series in self._values.items())
+        lines = self.header()
+        for key, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, [('le', _format_value(float(bound)))])
+                lines.append(f'{self.name}_bucket{labels} {cumulative}')
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f'{self.name}_sum{labels} {_format_value(series[-2])}')
+            lines.append(f'{self.name}_count{labels} {series[-1]}')
+        return lines
+
+
+class Registry:
+    """Conjunto de métricas más collectors que se evalúan al momento de exponer"""
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def add_collector(self, collector):
+        """collector() -> lista de Gauges ya actualizados (se llama en cada scrape)"""
+        self._collectors.append(collector)
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for collector in self._collectors:
+            try:
+                for metric in collector():
+                    lines.extend(metric.render())
+            except Exception as e:
+                print(f"Metrics collector error: {e}")
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+# HTTP entrante
+http_request_duration = registry.histogram(
+    'smartselling_http_request_duration_seconds', 'Latencia de requests HTTP por ruta', ('method', 'route'))
+http_requests_total = registry.counter(
+    'smartselling_http_requests_total', 'Requests HTTP por ruta y código de estado', ('method', 'route', 'status'))
+http_requests_in_flight = registry.gauge(
+    'smartselling_http_requests_in_flight', 'Requests HTTP en curso', ('method', 'route'))
+
+# Llamadas salientes a la API de ML
+ml_api_request_duration = registry.histogram(
+    'smartselling_ml_api_request_duration_seconds', 'Latencia de llamadas a la API de ML por familia de endpoint',
+    ('method', 'endpoint'))
+ml_api_requests_total = registry.counter(
+    'smartselling_ml_api_requests_total', 'Llamadas a la API de ML por familia de endpoint y estado',
+    ('method', 'endpoint', 'status'))
+
+
+def _route_label():
+    # La regla (ej: /ml-accounts/<int:account_id>) y no la URL, para acotar la cardinalidad
+    return request.url_rule.rule if request.url_rule is not None else '<unmatched>'
+
+
+def _before_request():
+    g._telemetry = {'start': time.perf_counter(), 'method': request.method, 'route': _route_label(), 'done': False}
+    http_requests_in_flight.inc(method=request.method, route=g._telemetry['route'])
+
+
+def _record(status):
+    state = g._telemetry
+    state['done'] = True
+    http_request_duration.observe(time.perf_counter() - state['start'], method=state['method'], route=state['route'])
+    http_requests_total.inc(method=state['method'], route=state['route'], status=status)
+
+
+def _after_request(response):
+    if getattr(g, '_telemetry', None) is not None:
+        _record(response.status_code)
+    return response
+
+
+def _teardown_request(exc):
+    state = getattr(g, '_telemetry', None)
+    if state is None:
+        return
+    if not state['done']:
+        # Excepción no manejada: after_request no se ejecutó
+        _record(500)
+    http_requests_in_flight.dec(method=state['method'], route=state['route'])
+
+
+def init_telemetry(app):
+    """Registrar los hooks que miden cada request"""
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.teardown_request(_teardown_request)
+
+
+def observe_ml_request(method, endpoint, status, elapsed):
+    """Observer para MLClient: una muestra por llamada HTTP a ML"""
+    ml_api_request_duration.observe(elapsed, method=method, endpoint=endpoint)
+    ml_api_requests_total.inc(method=method, endpoint=endpoint, status=status)
+
+
+def db_pool_collector(get_engine):
+    """Collector con el estado del pool de conexiones de SQLAlchemy"""
+    pool_gauge = Gauge('smartselling_db_pool_connections', 'Conexiones del pool de la base por estado', ('state',))
+    pool_size = Gauge('smartselling_db_pool_size', 'Tamaño configurado del pool de la base')
+
+    def collect():
+        pool = get_engine().pool
+        pool_size.set(pool.size() if hasattr(pool, 'size') else 0)
+        for state in ('checkedin', 'checkedout', 'overflow'):
+            if hasattr(pool, state):
+                pool_gauge.set(getattr(pool, state)(), state=state)
+        return [pool_size, pool_gauge]
+
+    return collect
+
+
+def authorized(req):
+    """True si el scrape puede ver /metrics"""
+    if not METRICS_TOKEN:
+        return True
+    return req.headers.get('Authorization', '') == f'Bearer {METRICS_TOKEN}'
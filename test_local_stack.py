@@ -0,0 +1,359 @@
+#!/usr/bin/env python3
+"""
+Pruebas de comportamiento sin servidor ni red: la app corre en proceso con el cliente de
+test de Flask, contra el PostgreSQL de DB_* y la API de ML falsa (ml_stub_server.py).
+Cubre alta masiva, cantidad de queries (N+1), paginación keyset, ETag/304, rollups,
+totales combinados, user_data de /metrics y velocidad de publicaciones.
+
+    DB_HOST=localhost DB_NAME=smartselling_test python test_local_stack.py
+
+Crea un usuario y cuentas nuevas en cada corrida y las borra al final.
+"""
+
+import datetime
+import os
+import random
+import sys
+import time
+
+from dotenv import load_dotenv
+
+import ml_stub_server
+
+# Cargar variables de entorno
+load_dotenv()
+
+# Vendedores del stub: rango amplio para que cada corrida use cuentas ML nuevas
+STUB_CONFIG = {'users': 1000000, 'items_per_user': 30, 'orders_per_user': 120}
+ACCOUNTS = 3
+HISTORY_DAYS = 45
+
+# Queries máximas por request: auth + ETag + vista. Un N+1 las haría crecer con las cuentas o las filas
+MAX_QUERIES = {'ml-accounts': 6, 'daily-metrics': 8}
+# Ningún statement se puede repetir dentro de un request
+MAX_REPEATS = 1
+
+USER_DATA_FIELDS = {'id', 'nickname', 'first_name', 'last_name', 'email', 'country_id', 'site_id',
+                    'completed_transactions'}
+
+
+class SmartSellingStackTest:
+    def __init__(self):
+        self.stub_url, self.stub_server = ml_stub_server.start_stub_server(STUB_CONFIG)
+        self.stub = self.stub_server.app.config['STUB_STATE']
+
+        # app.py lee la URL de ML y el flag de N+1 al importarse
+        os.environ['ML_API_URL'] = self.stub_url
+        os.environ['SQL_NPLUS1_RAISE'] = '1'
+        import app as smartselling
+        from query_counter import track_queries
+
+        self.smartselling = smartselling
+        self.track_queries = track_queries
+        self.client = smartselling.app.test_client()
+        self.test_username = f"stack_user_{int(time.time())}"
+        self.test_password = "TestPass123!"
+
+        first = random.randrange(ml_stub_server.FIRST_USER_ID, ml_stub_server.FIRST_USER_ID + STUB_CONFIG['users'] - 10)
+        self.ml_user_ids = [first + index for index in range(ACCOUNTS + 1)]
+        self.accounts = {}  # ml_user_id -> id de ml_accounts
+        self.history_from = None
+
+    def log(self, message, level="INFO"):
+        """Log con formato"""
+        timestamp = time.strftime("%H:%M:%S")
+        print(f"[{timestamp}] {level}: {message}")
+
+    def get(self, path, **kwargs):
+        response = self.client.get(path, **kwargs)
+        assert response.status_code in (200, 304), f"GET {path}: {response.status_code} {response.get_data(as_text=True)[:200]}"
+        return response
+
+    def post(self, path, json=None):
+        response = self.client.post(path, json=json)
+        assert response.status_code == 200, f"POST {path}: {response.status_code} {response.get_data(as_text=True)[:200]}"
+        return response.get_json()
+
+    def daily_metrics(self, account_id, date_from):
+        rows = self.get(f"/ml-accounts/{account_id}/daily-metrics?from={date_from}&limit=1000").get_json()['metrics']
+        return {row['date']: row for row in rows}
+
+    def combined_metrics(self, date_from):
+        return self.get(f"/ml-accounts/combined-metrics?from={date_from}").get_json()
+
+    def test_database(self):
+        """Tablas, particiones y triggers en la base de DB_*"""
+        with self.smartselling.app.app_context():
+            self.smartselling.setup_database()
+        self.log(f"✅ Base lista ({self.smartselling.app.config['SQLALCHEMY_DATABASE_URI'].split('@')[-1]})", "SUCCESS")
+        return True
+
+    def test_user_registration(self):
+        """Registro y login (el token queda en la cookie del cliente)"""
+        credentials = {"username": self.test_username, "password": self.test_password}
+        response = self.client.post("/register", json=credentials)
+        assert response.status_code in (200, 201), f"register: {response.status_code}"
+        self.post("/login", json=credentials)
+        self.log(f"✅ Usuario {self.test_username} registrado", "SUCCESS")
+        return True
+
+    def test_bulk_onboarding(self):
+        """Alta masiva: creadas, re-vinculada como updated y token de otra cuenta rechazado"""
+        entries = [{'user_id': ml_user_id, 'access_token': ml_stub_server.access_token_for(ml_user_id),
+                    'alias': f'Cuenta {index}'} for index, ml_user_id in enumerate(self.ml_user_ids[:ACCOUNTS])]
+        intruder = {'user_id': self.ml_user_ids[ACCOUNTS],
+                    'access_token': ml_stub_server.access_token_for(self.ml_user_ids[0])}
+
+        result = self.post("/ml-accounts/bulk", json={'accounts': entries + [intruder]})
+        statuses = [item['status'] for item in result['results']]
+        assert statuses == ['created'] * ACCOUNTS + ['error'], f"statuses: {statuses}"
+        assert result['results'][-1]['message'] == 'Token belongs to another Mercado Libre account'
+        self.accounts = {int(item['ml_user_id']): item['account']['id'] for item in result['results'][:ACCOUNTS]}
+
+        result = self.post("/ml-accounts/bulk", json={'accounts': entries[:1]})
+        assert [item['status'] for item in result['results']] == ['updated'], result
+        self.log(f"✅ {ACCOUNTS} cuentas creadas, re-vinculación y token ajeno correctos", "SUCCESS")
+        return True
+
+    def test_refresh_metrics(self):
+        """Historial por upsert_daily_metrics (rollups y triggers) + refresco real contra el stub"""
+        today = datetime.date.today()
+        # Desde un lunes: el rango coincide con períodos semanales completos
+        self.history_from = today - datetime.timedelta(days=HISTORY_DAYS + today.weekday())
+        app = self.smartselling
+        with app.app.app_context():
+            for account in app.MLAccount.query.filter(app.MLAccount.id.in_(self.accounts.values())):
+                rng = random.Random(account.id)
+                day = self.history_from
+                while day < today:
+                    if rng.random() < 0.9:  # algunos días sin fila
+                        app.upsert_daily_metrics(account, day, sales=round(rng.uniform(0, 50000), 2),
+                                                 orders=rng.randint(0, 20), views=rng.randint(0, 500),
+                                                 questions=rng.randint(0, 10))
+                    day += datetime.timedelta(days=1)
+            app.db.session.commit()
+
+        for account_id in self.accounts.values():
+            result = self.post(f"/ml-accounts/{account_id}/refresh-metrics")
+            assert not result.get('not_modified'), result
+        self.log(f"✅ {HISTORY_DAYS}+ días de historial y refresco de {len(self.accounts)} cuentas", "SUCCESS")
+        return True
+
+    def test_query_counts(self):
+        """/ml-accounts y /daily-metrics con un número acotado de queries y sin statements repetidos"""
+        with self.track_queries(max_repeats=MAX_REPEATS) as stats:
+            self.get("/ml-accounts")
+        assert stats.count <= MAX_QUERIES['ml-accounts'], f"/ml-accounts: {stats.count} queries"
+        self.log(f"   /ml-accounts: {stats.count} queries")
+
+        account_id = next(iter(self.accounts.values()))
+        with self.track_queries(max_repeats=MAX_REPEATS) as stats:
+            self.get(f"/ml-accounts/{account_id}/daily-metrics?from={self.history_from}&limit=1000")
+        assert stats.count <= MAX_QUERIES['daily-metrics'], f"/daily-metrics: {stats.count} queries"
+        self.log(f"   /daily-metrics: {stats.count} queries")
+        self.log("✅ Sin N+1", "SUCCESS")
+        return True
+
+    def test_keyset_pagination(self):
+        """Recorrer /daily-metrics con next_cursor: mismas filas que una sola página, sin repetir"""
+        account_id = next(iter(self.accounts.values()))
+        expected = list(self.daily_metrics(account_id, self.history_from))
+
+        dates, cursor, pages = [], None, 0
+        while True:
+            path = f"/ml-accounts/{account_id}/daily-metrics?from={self.history_from}&limit=7&fields=date"
+            page = self.get(path + (f"&cursor={cursor}" if cursor else "")).get_json()
+            dates += [row['date'] for row in page['metrics']]
+            pages += 1
+            cursor = page['next_cursor']
+            if not cursor:
+                break
+
+        assert dates == expected, "las páginas no coinciden con la consulta completa"
+        assert dates == sorted(set(dates), reverse=True), "fechas repetidas o fuera de orden"
+        assert pages == -(-len(expected) // 7), f"{pages} páginas para {len(expected)} filas"
+        self.log(f"✅ {len(dates)} filas en {pages} páginas", "SUCCESS")
+        return True
+
+    def test_etag(self):
+        """304 con el mismo ETag (con sufijo de codificación) que trae el 200"""
+        account_id = next(iter(self.accounts.values()))
+        path = f"/ml-accounts/{account_id}/daily-metrics?from={self.history_from}&limit=1000"
+
+        plain = self.get(path)
+        gzipped = self.get(path, headers={'Accept-Encoding': 'gzip'})
+        assert gzipped.headers.get('Content-Encoding') == 'gzip'
+        assert gzipped.headers['ETag'] == plain.headers['ETag'][:-1] + '-gzip"', gzipped.headers['ETag']
+
+        for etag, encoding in ((plain.headers['ETag'], 'identity'), (gzipped.headers['ETag'], 'gzip')):
+            cached = self.get(path, headers={'If-None-Match': etag, 'Accept-Encoding': encoding})
+            assert cached.status_code == 304, f"{encoding}: {cached.status_code}"
+            assert cached.headers['ETag'] == etag, f"{encoding}: 304 con ETag {cached.headers['ETag']}"
+
+        etag = self.get("/ml-accounts").headers['ETag']
+        assert self.get("/ml-accounts", headers={'If-None-Match': etag}).status_code == 304
+        self.client.put(f"/ml-accounts/{account_id}", json={'account_alias': 'Renombrada'})
+        changed = self.get("/ml-accounts", headers={'If-None-Match': etag})
+        assert changed.status_code == 200, "el ETag no cambió después de editar la cuenta"
+        self.log("✅ 304 con ETag identity y gzip; 200 después de un cambio", "SUCCESS")
+        return True
+
+    def test_rollups(self):
+        """Series semanales (rollups por cuenta y por usuario) = suma de la serie diaria"""
+        today = datetime.date.today()
+        account_ids = [None] + list(self.accounts.values())
+        for account_id in account_ids:
+            query = f"from={self.history_from}&to={today}" + (f"&account_id={account_id}" if account_id else "")
+            daily = self.get(f"/analytics/series?granularity=day&{query}").get_json()['series']
+            weekly = self.get(f"/analytics/series?granularity=week&{query}").get_json()['series']
+            for field in ('sales', 'orders', 'views', 'questions'):
+                expected = round(sum(row[field] for row in daily), 2)
+                actual = round(sum(row[field] for row in weekly), 2)
+                assert expected == actual, f"account {account_id} {field}: semanal {actual} != diaria {expected}"
+        self.log(f"✅ Rollups semanales consistentes ({len(account_ids)} series)", "SUCCESS")
+        return True
+
+    def test_combined_metrics(self):
+        """user_daily_metrics = suma de las cuentas activas, también al desactivar y reactivar"""
+        per_account = {account_id: self.daily_metrics(account_id, self.history_from)
+                       for account_id in self.accounts.values()}
+
+        def expected(active):
+            days = {}
+            for account_id in active:
+                for date, row in per_account[account_id].items():
+                    day = days.setdefault(date, {'sales': 0.0, 'orders': 0, 'accounts': 0})
+                    day['sales'] = round(day['sales'] + float(row['daily_sales']), 2)
+                    day['orders'] += row['daily_orders']
+                    day['accounts'] += 1
+            return days
+
+        def actual():
+            return {day['date']: {'sales': round(day['sales'], 2), 'orders': day['orders'],
+                                  'accounts': day['accounts']}
+                    for day in self.combined_metrics(self.history_from)['days']}
+
+        all_accounts = list(self.accounts.values())
+        assert actual() == expected(all_accounts), "combined-metrics no coincide con las cuentas"
+
+        inactive = all_accounts[0]
+        self.client.put(f"/ml-accounts/{inactive}", json={'is_active': False})
+        assert actual() == expected(all_accounts[1:]), "la cuenta desactivada sigue sumando"
+
+        self.client.put(f"/ml-accounts/{inactive}", json={'is_active': True})
+        assert actual() == expected(all_accounts), "la cuenta reactivada no volvió a sumar"
+        self.log("✅ Totales combinados al día con altas, bajas y reactivaciones", "SUCCESS")
+        return True
+
+    def test_metrics_user_data(self):
+        """/metrics devuelve user_data como UserProfile.to_dict() (8 campos)"""
+        ml_user_id, account_id = next(iter(self.accounts.items()))
+        metrics = self.get(f"/ml-accounts/{account_id}/metrics").get_json()['metrics']
+        user_data = metrics['user_data']
+        assert set(user_data) == USER_DATA_FIELDS, f"campos: {sorted(user_data)}"
+        assert user_data['id'] == str(ml_user_id)
+        self.log("✅ user_data con los 8 campos de UserProfile", "SUCCESS")
+        return True
+
+    def test_item_velocity(self):
+        """sync-orders llena el índice de top-items y una cancelación resta sus unidades"""
+        ml_user_id, account_id = next(iter(self.accounts.items()))
+        result = self.post(f"/ml-accounts/{account_id}/sync-orders")
+        assert result['orders_created'] > 0 and result['complete'], result
+
+        def units_90d():
+            items = self.get(f"/ml-accounts/{account_id}/top-items?window=90&sort=units&limit=100").get_json()['items']
+            assert [item['units_90d'] for item in items] == sorted((item['units_90d'] for item in items), reverse=True)
+            return {item['ml_item_id']: item['units_90d'] for item in items}
+
+        before = units_90d()
+        assert before, "top-items vacío después de sincronizar"
+
+        # La orden pagada más nueva está dentro de la ventana de 90 días
+        newest = next(order for order in self.stub.seller(ml_user_id)['orders'] if order['status'] == 'paid')
+        item_id = newest['order_items'][0]['item']['id']
+        self.stub.cancel_order(ml_user_id, newest['id'])
+
+        result = self.post(f"/ml-accounts/{account_id}/sync-orders")
+        assert result['orders_updated'] >= 1, result
+        after = units_90d()
+        assert after.get(item_id, 0) == before[item_id] - newest['order_items'][0]['quantity'], \
+            f"{item_id}: {before[item_id]} -> {after.get(item_id, 0)}"
+        self.log(f"✅ {len(before)} publicaciones en top-items; cancelación descontada", "SUCCESS")
+        return True
+
+    def test_cleanup(self):
+        """Borrar las cuentas: combined-metrics queda vacío"""
+        for account_id in self.accounts.values():
+            response = self.client.delete(f"/ml-accounts/{account_id}")
+            assert response.status_code == 200, f"delete {account_id}: {response.status_code} {response.get_json()}"
+        assert self.combined_metrics(self.history_from)['days'] == [], "quedaron totales de cuentas borradas"
+        self.log("✅ Cuentas borradas", "SUCCESS")
+        return True
+
+    def run_all_tests(self):
+        """Ejecutar toda la suite de pruebas"""
+        self.log("🚀 Pruebas en proceso: app + PostgreSQL + stub de ML", "START")
+        self.log(f"🎯 Stub ML: {self.stub_url}")
+        print("=" * 80)
+
+        tests = [
+            ("Base de datos", self.test_database),
+            ("Registro usuario", self.test_user_registration),
+            ("Alta masiva", self.test_bulk_onboarding),
+            ("Refresco métricas", self.test_refresh_metrics),
+            ("Queries (N+1)", self.test_query_counts),
+            ("Paginación keyset", self.test_keyset_pagination),
+            ("ETag / 304", self.test_etag),
+            ("Rollups", self.test_rollups),
+            ("Totales combinados", self.test_combined_metrics),
+            ("user_data de /metrics", self.test_metrics_user_data),
+            ("Velocidad de items", self.test_item_velocity),
+            ("Limpieza", self.test_cleanup),
+        ]
+
+        results = []
+
+        for test_name, test_func in tests:
+            self.log(f"\n🧪 Ejecutando: {test_name}")
+            try:
+                result = test_func()
+                status = "✅ PASS" if result else "❌ FAIL"
+                results.append((test_name, status, None))
+            except AssertionError as e:
+                results.append((test_name, "❌ FAIL", str(e)))
+                self.log(f"❌ {e}", "ERROR")
+            except Exception as e:
+                results.append((test_name, "💥 ERROR", f"{type(e).__name__}: {e}"))
+                self.log(f"💥 ERROR: {type(e).__name__}: {e}", "ERROR")
+
+        # Resumen final
+        print("\n" + "=" * 80)
+        self.log("📊 RESUMEN DE PRUEBAS:", "SUMMARY")
+
+        passed = 0
+        for test_name, status, error in results:
+            print(f"   {test_name:<25} {status}")
+            if error:
+                print(f"      Error: {error}")
+            if "✅" in status:
+                passed += 1
+
+        total = len(results)
+        print(f"\n🎯 RESULTADO FINAL: {passed}/{total} pruebas exitosas")
+        self.stub_server.shutdown()
+        return passed == total
+
+
+def main():
+    """Función principal"""
+    print("🔧 SmartSelling - Pruebas en proceso")
+    print(f"📅 {time.strftime('%Y-%m-%d %H:%M:%S')}")
+    print()
+
+    test_suite = SmartSellingStackTest()
+    sys.exit(0 if test_suite.run_all_tests() else 1)
+
+
+if __name__ == "__main__":
+    main()
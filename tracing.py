@@ -0,0 +1,352 @@
+# tracing.py - Spans de tiempo compatibles con OpenTelemetry (W3C traceparent + export OTLP/JSON)
+
+import contextvars
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+import requests
+from flask import g, request
+
+# none | file | otlp
+TRACING_EXPORTER = os.getenv('TRACING_EXPORTER', 'none')
+TRACING_FILE = os.getenv('TRACING_FILE', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'traces.jsonl'))
+# Collector OTLP/HTTP (ej: http://localhost:4318/v1/traces)
+TRACING_OTLP_ENDPOINT = os.getenv('TRACING_OTLP_ENDPOINT', 'http://localhost:4318/v1/traces')
+# Fracción de trazas nuevas que se exportan (las que llegan con traceparent respetan su flag)
+TRACING_SAMPLE_RATE = float(os.getenv('TRACING_SAMPLE_RATE', '1.0'))
+TRACING_SERVICE_NAME = os.getenv('TRACING_SERVICE_NAME', 'smartselling-api')
+
+BATCH_SIZE = 256
+FLUSH_INTERVAL = 2.0  # segundos
+QUEUE_SIZE = 10000
+
+# Códigos de estado y tipos de span de OTLP
+STATUS_UNSET, STATUS_OK, STATUS_ERROR = 0, 1, 2
+KIND_INTERNAL, KIND_SERVER, KIND_CLIENT = 1, 2, 3
+
+_current_span = contextvars.ContextVar('current_span', default=None)
+
+
+def _new_id(bits):
+    return f'{random.getrandbits(bits):0{bits // 4}x}'
+
+
+class Span:
+    """Un tramo con nombre, atributos y duración dentro de una traza"""
+
+    __slots__ = ('name', 'trace_id', 'span_id', 'parent_id', 'sampled', 'kind',
+                 'start_ns', 'end_ns', 'attributes', 'status', 'status_message')
+
+    def __init__(self, name, parent=None, trace_id=None, parent_id=None, sampled=None,
+                 kind=KIND_INTERNAL, attributes=None, start_ns=None):
+        self.name = name
+        if parent is not None:
+            trace_id, parent_id, sampled = parent.trace_id, parent.span_id, parent.sampled
+        self.trace_id = trace_id or _new_id(128)
+        self.span_id = _new_id(64)
+        self.parent_id = parent_id
+        self.sampled = sampled if sampled is not None else random.random() < TRACING_SAMPLE_RATE
+        self.kind = kind
+        self.start_ns = start_ns or time.time_ns()
+        self.end_ns = None
+        self.attributes = dict(attributes or {})
+        self.status = STATUS_UNSET
+        self.status_message = ''
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+    def set_error(self, exc):
+        self.status = STATUS_ERROR
+        self.status_message = str(exc)[:500]
+
+    def end(self, end_ns=None):
+        if self.end_ns is not None:
+            return
+        self.end_ns = end_ns or time.time_ns()
+        if self.sampled:
+            _exporter.submit(self)
+
+    @property
+    def traceparent(self):
+        return f'00-{self.trace_id}-{self.span_id}-{"01" if self.sampled else "00"}'
+
+    def to_otlp(self):
+        span = {
+            'traceId': self.trace_id,
+            'spanId': self.span_id,
+            'name': self.name,
+            'kind': self.kind,
+            'startTimeUnixNano': str(self.start_ns),
+            'endTimeUnixNano': str(self.end_ns),
+            'attributes': [_otlp_attribute(key, value) for key, value in self.attributes.items()],
+            'status': {'code': self.status, 'message': self.status_message} if self.status_message
+                      else {'code': self.status}
+        }
+        if self.parent_id:
+            span['parentSpanId'] = self.parent_id
+        return span
+
+
+def _otlp_attribute(key, value):
+    if isinstance(value, bool):
+        typed = {'boolValue': value}
+    elif isinstance(value, int):
+        typed = {'intValue': str(value)}
+    elif isinstance(value, float):
+        typed = {'doubleValue': value}
+    else:
+        typed = {'stringValue': str(value)}
+    return {'key': key, 'value': typed}
+
+
+def parse_traceparent(header):
+    """W3C traceparent -> (trace_id, parent_span_id, sampled) o None si es inválido"""
+    parts = (header or '').strip().split('-')
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    try:
+        flags = int(parts[3], 16)
+        int(parts[1], 16), int(parts[2], 16)
+    except ValueError:
+        return None
+    if parts[1] == '0' * 32 or parts[2] == '0' * 16:
+        return None
+    return parts[1], parts[2], bool(flags & 1)
+
+
+def current_span():
+    return _current_span.get()
+
+
+def current_trace_id():
+    span = _current_span.get()
+    return span.trace_id if span is not None else None
+
+
+@contextmanager
+def span(name, kind=KIND_INTERNAL, **attributes):
+    """
+    Medir un bloque como span hijo del span actual:
+        with tracing.span('db.commit'):
+            db.session.commit()
+    """
+    current = Span(name, parent=_current_span.get(), kind=kind, attributes=attributes)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except Exception as e:
+        current.set_error(e)
+        raise
+    finally:
+        _current_span.reset(token)
+        current.end()
+
+
+def traced(name=None):
+    """Decorador: cada llamada a la función es un span"""
+    def decorator(f):
+        span_name = name or f.__name__
+
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            with span(span_name):
+                return f(*args, **kwargs)
+        return decorated
+    return decorator
+
+
+def record_span(name, start_ns, end_ns, kind=KIND_INTERNAL, error=None, **attributes):
+    """Registrar un span ya terminado (ej: desde un observer que recibe la duración)"""
+    finished = Span(name, parent=_current_span.get(), kind=kind, attributes=attributes, start_ns=start_ns)
+    if error:
+        finished.set_error(error)
+    finished.end(end_ns)
+    return finished
+
+
+def inject():
+    """Contexto de traza serializable para pasar a otro hilo, proceso o job"""
+    current = _current_span.get()
+    return {'traceparent': current.traceparent} if current is not None else {}
+
+
+@contextmanager
+def continue_trace(carrier, name, **attributes):
+    """Abrir un span que continúa la traza recibida con inject()"""
+    parsed = parse_traceparent((carrier or {}).get('traceparent'))
+    trace_id, parent_id, sampled = parsed if parsed else (None, None, None)
+    current = Span(name, trace_id=trace_id, parent_id=parent_id, sampled=sampled, attributes=attributes)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except Exception as e:
+        current.set_error(e)
+        raise
+    finally:
+        _current_span.reset(token)
+        current.end()
+
+
+def environ_carrier():
+    """Contexto recibido en la variable TRACEPARENT (cron o scripts lanzados por otro proceso)"""
+    return {'traceparent': os.getenv('TRACEPARENT')}
+
+
+def flush(timeout=FLUSH_INTERVAL * 2):
+    """Esperar a que se exporten los spans pendientes (antes de que termine un proceso corto)"""
+    _exporter.flush(timeout)
+
+
+def log(message):
+    """print() con el trace_id actual, para cruzar logs con trazas"""
+    trace_id = current_trace_id()
+    print(f'[trace={trace_id}] {message}' if trace_id else message)
+
+
+class TraceIdFilter(logging.Filter):
+    """Agrega record.trace_id a los logs del módulo logging (werkzeug, gunicorn, ...)"""
+
+    def filter(self, record):
+        record.trace_id = current_trace_id() or '-'
+        return True
+
+
+class _NullExporter:
+    def submit(self, finished):
+        pass
+
+    def flush(self, timeout):
+        pass
+
+
+class _BatchExporter:
+    """Cola + hilo que exporta spans en lotes (formato OTLP/JSON)"""
+
+    def __init__(self, export):
+        self._export = export
+        self._queue = queue.Queue(maxsize=QUEUE_SIZE)
+        self._thread = threading.Thread(target=self._run, name='trace-exporter', daemon=True)
+        self._thread.start()
+        self.dropped = 0
+
+    def submit(self, finished):
+        try:
+            self._queue.put_nowait(finished)
+        except queue.Full:
+            self.dropped += 1
+
+    def flush(self, timeout):
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.05)
+
+    def _run(self):
+        while True:
+            batch = []
+            deadline = time.monotonic() + FLUSH_INTERVAL
+            while len(batch) < BATCH_SIZE:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+            if batch:
+                try:
+                    self._export(otlp_payload(batch))
+                except Exception as e:
+                    print(f"Trace export error ({len(batch)} spans dropped): {e}")
+                finally:
+                    for _ in batch:
+                        self._queue.task_done()
+
+
+def otlp_payload(spans):
+    """Lote de spans en el formato JSON de OTLP (ExportTraceServiceRequest)"""
+    return {
+        'resourceSpans': [{
+            'resource': {'attributes': [_otlp_attribute('service.name', TRACING_SERVICE_NAME)]},
+            'scopeSpans': [{
+                'scope': {'name': 'smartselling.tracing'},
+                'spans': [finished.to_otlp() for finished in spans]
+            }]
+        }]
+    }
+
+
+def _export_file(payload):
+    # Una línea por lote: compatible con el receiver otlpjsonfile del collector
+    with open(TRACING_FILE, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(payload, separators=(',', ':')) + '\n')
+
+
+def _export_otlp(payload):
+    response = requests.post(TRACING_OTLP_ENDPOINT, json=payload, timeout=5)
+    response.raise_for_status()
+
+
+def _create_exporter():
+    if TRACING_EXPORTER == 'file':
+        return _BatchExporter(_export_file)
+    if TRACING_EXPORTER == 'otlp':
+        return _BatchExporter(_export_otlp)
+    return _NullExporter()
+
+
+_exporter = _create_exporter()
+
+
+def _before_request():
+    parsed = parse_traceparent(request.headers.get('traceparent'))
+    trace_id, parent_id, sampled = parsed if parsed else (None, None, None)
+    route = request.url_rule.rule if request.url_rule is not None else '<unmatched>'
+    root = Span(f'{request.method} {route}', trace_id=trace_id, parent_id=parent_id, sampled=sampled,
+                kind=KIND_SERVER, attributes={'http.method': request.method, 'http.route': route})
+    g._trace_root = (root, _current_span.set(root))
+
+
+def _after_request(response):
+    state = getattr(g, '_trace_root', None)
+    if state is not None:
+        root = state[0]
+        root.set_attribute('http.status_code', response.status_code)
+        if response.status_code >= 500:
+            root.status = STATUS_ERROR
+        response.headers['X-Trace-Id'] = root.trace_id
+    return response
+
+
+def _teardown_request(exc):
+    state = g.pop('_trace_root', None)
+    if state is None:
+        return
+    root, token = state
+    if exc is not None:
+        root.set_error(exc)
+    _current_span.reset(token)
+    root.end()
+
+
+def init_tracing(app):
+    """Span raíz por request, X-Trace-Id en la respuesta y trace_id en los logs"""
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.teardown_request(_teardown_request)
+    app.logger.addFilter(TraceIdFilter())
+
+
+def observe_ml_request(method, endpoint, status, elapsed):
+    """Observer para MLClient: un span CLIENT por cada llamada HTTP a ML"""
+    end_ns = time.time_ns()
+    record_span(f'ML {method} {endpoint}', end_ns - int(elapsed * 1e9), end_ns, kind=KIND_CLIENT,
+                error='request failed' if status == 'error' else None,
+                **{'http.method': method, 'http.route': endpoint, 'http.status_code': status})